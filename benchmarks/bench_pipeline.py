@@ -0,0 +1,139 @@
+"""
+Benchmarks for the label pipeline.
+
+Run with ``python -m pytest benchmarks`` (requires pytest-benchmark); set
+LABEL_MAKER_BENCH_LARGE=1 to include the 50k item catalog. Besides timings,
+every run records labels per second, the peak RSS of the process and, for PDF
+output, the bytes per label in the benchmark's ``extra_info``, so they show up
+in saved results and can be compared between runs.
+"""
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from reportlab.pdfgen import canvas
+
+from python_label_maker import db
+from python_label_maker import image_cache
+from python_label_maker import label_maker
+from python_label_maker import prefetch
+from python_label_maker import snapshot
+from python_label_maker.plan import get_plan
+
+from conftest import IMAGE_COUNT, make_catalog, peak_rss_megabytes
+
+
+def record_throughput(benchmark, labels, pdf_path=None):
+    # No timings to report under --benchmark-disable
+    if benchmark.stats is None:
+        return
+    benchmark.extra_info['labels_per_second'] = round(labels / benchmark.stats.stats.mean, 1)
+    benchmark.extra_info['peak_rss_mb'] = round(peak_rss_megabytes(), 1)
+    if pdf_path:
+        benchmark.extra_info['pdf_bytes_per_label'] = round(os.path.getsize(pdf_path) / labels)
+
+
+def test_insert_item(benchmark, workspace):
+    # One transaction per row, so a fixed 1000 items instead of every catalog size
+    items = make_catalog(1000, 'http://127.0.0.1')
+
+    def insert():
+        for item in items:
+            db.insert_item(item['name'], item['description'], item['company_img'], item['item_img'], item['manufacturer'])
+
+    benchmark(insert)
+    record_throughput(benchmark, len(items))
+
+
+def test_upsert_items(benchmark, workspace, catalog):
+    benchmark(db.upsert_items, catalog)
+    record_throughput(benchmark, len(catalog))
+
+
+def test_get_cached_items(benchmark, workspace, catalog):
+    db.upsert_items(catalog)
+    items = benchmark(db.get_cached_items)
+    assert len(items) == len(catalog)
+    record_throughput(benchmark, len(catalog))
+
+
+def test_iter_items(benchmark, workspace, catalog):
+    db.upsert_items(catalog)
+    count = benchmark(lambda: sum(1 for _ in db.iter_items(page_size=workspace['db']['page_size'])))
+    assert count == len(catalog)
+    record_throughput(benchmark, len(catalog))
+
+
+def test_write_snapshot(benchmark, workspace, catalog, tmp_path):
+    db.upsert_items(catalog)
+    benchmark(snapshot.write_snapshot, str(tmp_path / 'items.snap'))
+    record_throughput(benchmark, len(catalog))
+
+
+def test_iter_snapshot(benchmark, workspace, catalog, tmp_path):
+    db.upsert_items(catalog)
+    path = str(tmp_path / 'items.snap')
+    snapshot.write_snapshot(path)
+    items = snapshot.Snapshot(path)
+    # Read the fields a label needs, as test_iter_items pays for them when building dicts
+    count = benchmark(lambda: sum(1 for item in items if item['name'] and item.get('item_img')))
+    assert count == len(catalog)
+    record_throughput(benchmark, len(catalog))
+    items.close()
+
+
+@pytest.mark.parametrize('derivative', ['cold', 'warm'])
+def test_process_image(benchmark, workspace, warm_cache, image_server, derivative):
+    image_plan = get_plan(workspace).image
+    url = f"{image_server}/0.png"
+
+    def setup():
+        if derivative == 'cold':
+            shutil.rmtree(warm_cache.derivative_directory, ignore_errors=True)
+
+    def process():
+        return label_maker.process_image(url, image_plan.max_width, image_plan.max_height, dpi=image_plan.dpi)
+
+    process()
+    path, _, _ = benchmark.pedantic(process, setup=setup, rounds=20)
+    assert path is not None
+
+
+def test_prefetch_images(benchmark, workspace, image_server):
+    items = [{'item_img': f"{image_server}/{i}.png"} for i in range(IMAGE_COUNT)]
+
+    def setup():
+        # Every round downloads and prepares every image again
+        image_cache._default_cache = image_cache.cache_from_config(workspace)
+        shutil.rmtree(workspace['image_cache']['directory'], ignore_errors=True)
+        shutil.rmtree(workspace['image_cache']['derivative_directory'], ignore_errors=True)
+
+    images = benchmark.pedantic(lambda: prefetch.prefetch_images(items, workspace), setup=setup, rounds=3)
+    assert all(path for path, _, _ in images.values())
+
+
+def test_draw_label(benchmark, workspace, warm_cache, image_server, tmp_path):
+    label_plan = get_plan(workspace)
+    label_maker.register_fonts(workspace['fonts'])
+    # Drawing a label does not depend on the catalog size, so ten pages of labels are enough
+    items = make_catalog(label_plan.labels_per_page * 10, image_server)
+    images = prefetch.prefetch_images(items, workspace)
+    c = canvas.Canvas(str(tmp_path / 'draw.pdf'), pagesize=label_plan.page_size)
+
+    def draw():
+        for item, (x, y) in zip(items, label_plan.slots * 10):
+            label_maker.draw_label(c, x, y, label_plan, item, images)
+
+    benchmark(draw)
+    record_throughput(benchmark, len(items))
+
+
+def test_create_label_pdf(benchmark, workspace, warm_cache, catalog):
+    # The warm-up round prepares the image derivatives, measured rounds reuse them
+    filename = benchmark.pedantic(
+        label_maker.create_label_pdf, args=(workspace, catalog), rounds=3 if len(catalog) < 50000 else 1, warmup_rounds=1
+    )
+    record_throughput(benchmark, len(catalog), filename)
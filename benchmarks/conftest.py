@@ -0,0 +1,119 @@
+"""
+Fixtures for the label pipeline benchmarks.
+
+Catalogs of synthetic items point at product images served by a local HTTP
+server, and every benchmark runs against its own database, image cache and
+output directory, so results do not depend on the network or on local state.
+"""
+import functools
+import http.server
+import os
+import random
+import resource
+import threading
+
+import pytest
+from PIL import Image
+
+from python_label_maker import db
+from python_label_maker import file_utils
+from python_label_maker import image_cache
+
+# Distinct product images shared by the items of a catalog
+IMAGE_COUNT = 50
+CATALOG_SIZES = [10, 1000]
+# The 50k catalog takes minutes, so it only runs when asked for
+if os.environ.get('LABEL_MAKER_BENCH_LARGE'):
+    CATALOG_SIZES.append(50000)
+
+WORDS = (
+    'LED', 'recessed', 'downlight', 'wall', 'sconce', 'pendant', 'track', 'head', 'brushed', 'nickel',
+    'matte', 'black', 'white', 'dimmable', '3000K', '4000K', 'wet', 'location', 'rated', 'driver',
+    'trim', 'lens', 'adjustable', 'beam', 'outdoor', 'indoor', 'linear', 'strip', 'module', 'kit',
+)
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def peak_rss_megabytes():
+    """
+    Return the peak resident set size of the process so far, in megabytes.
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+def make_catalog(size, base_url):
+    """
+    Build a reproducible catalog of synthetic items.
+
+    Args:
+        size (int): The number of items.
+        base_url (str): The URL the product images are served from.
+
+    Returns:
+        list: The item dictionaries.
+    """
+    rng = random.Random(size)
+    return [
+        {
+            'name': f"BENCH-{i:05d}",
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 30))),
+            'company_img': None,
+            'item_img': f"{base_url}/{i % IMAGE_COUNT}.png",
+            'manufacturer': 'LUMIEN LIGHTING' if i % 2 else 'WAC',
+        }
+        for i in range(size)
+    ]
+
+
+@pytest.fixture(scope='session')
+def image_server(tmp_path_factory):
+    """Serve IMAGE_COUNT photographic 1200x900 PNGs from a local HTTP server and yield its base URL."""
+    directory = tmp_path_factory.mktemp('images')
+    for i in range(IMAGE_COUNT):
+        img = Image.frombytes('RGB', (1200, 900), random.Random(i).randbytes(1200 * 900 * 3))
+        img.save(directory / f"{i}.png")
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=str(directory)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Point the database, image cache and output at a temporary directory and return the configuration."""
+    monkeypatch.setattr(db, 'db_file', str(tmp_path / 'db.sqlite'))
+    db.close_connection()
+    db.create_database_and_table()
+
+    config = file_utils.load_config()
+    config['image_cache']['directory'] = str(tmp_path / 'items')
+    config['image_cache']['derivative_directory'] = str(tmp_path / 'derivatives')
+    config['output']['directory'] = str(tmp_path / 'pdfs')
+    config['output']['filename'] = str(tmp_path / 'pdfs' / 'labels.pdf')
+    os.makedirs(config['output']['directory'])
+    monkeypatch.setattr(image_cache, '_default_cache', image_cache.cache_from_config(config))
+
+    yield config
+    db.close_connection()
+
+
+@pytest.fixture
+def warm_cache(workspace, image_server):
+    """Download every product image into the workspace's image cache."""
+    cache = image_cache.get_default_cache()
+    for i in range(IMAGE_COUNT):
+        cache.get(f"{image_server}/{i}.png")
+    return cache
+
+
+@pytest.fixture(params=CATALOG_SIZES, ids=lambda size: f"{size}_items")
+def catalog(request, image_server):
+    return make_catalog(request.param, image_server)
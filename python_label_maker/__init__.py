@@ -1,5 +1,14 @@
-from . import label_maker
-from . import get_items
-from . import db
-from . import file_utils
-__all__ = ['label_maker', 'get_items', 'db', 'file_utils']
+import importlib
+
+__all__ = ['label_maker', 'get_items', 'db', 'file_utils', 'image_cache', 'prefetch', 'assets', 'render', 'manifest', 'text_layout', 'plan', 'formats', 'zpl', 'fonts', 'derivatives', 'metrics', 'http_client', 'barcodes', 'service', 'snapshot']
+
+
+def __getattr__(name):
+    # Submodules are imported on first access, so importing the package does not load ReportLab or NetSuite
+    if name in __all__:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
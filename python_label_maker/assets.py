@@ -0,0 +1,92 @@
+"""
+Memoized logo assets shared by every label of a run.
+
+Each manufacturer logo is decoded and resized once per (logo, target size) and
+embedded in a PDF as a single form XObject that every label references, so a
+long run decodes the logo once and the document holds one copy of it.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+
+
+def logo_path(item, directory, default):
+    """
+    Resolve the logo file for an item's manufacturer.
+
+    Looks for ``<manufacturer first word>.png`` or ``.jpg`` in the logo directory
+    and falls back to the default logo.
+
+    Args:
+        item (dict): The item dictionary containing the product information.
+        directory (str): The directory holding the manufacturer logos.
+        default (str): The file name of the default logo.
+
+    Returns:
+        str: The path to the logo, or None if no logo file exists.
+    """
+    manufacturer = (item.get('manufacturer') or '').split()
+    candidates = []
+    if manufacturer:
+        company_name = manufacturer[0].lower()
+        candidates += [f"{company_name}.png", f"{company_name}.jpg"]
+    candidates.append(default)
+
+    for filename in candidates:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@lru_cache(maxsize=64)
+def load_logo(path, mtime, target_width):
+    """
+    Decode a logo and resize it to the target width, once per (logo, size).
+
+    Args:
+        path (str): The path to the logo file.
+        mtime (float): The file's modification time, so edited logos are reloaded.
+        target_width (float): The width the logo is drawn at, in points.
+
+    Returns:
+        tuple: The ImageReader for the resized logo and its width and height in points.
+    """
+    with Image.open(path) as img:
+        aspect_ratio = img.height / img.width
+        width = target_width
+        height = width * aspect_ratio
+        resized = img.resize((int(width), int(height)), Image.LANCZOS)
+    return ImageReader(resized), width, height
+
+
+def draw_logo(c, path, x, y, target_width):
+    """
+    Draw a logo through a form XObject that is defined once per document.
+
+    Args:
+        c (canvas.Canvas): The ReportLab canvas object.
+        path (str): The path to the logo file.
+        x (float): The x-coordinate of the logo's bottom-left corner.
+        y (float): The y-coordinate of the logo's bottom-left corner.
+        target_width (float): The width to draw the logo at, in points.
+
+    Returns:
+        tuple: The drawn width and height in points.
+    """
+    mtime = os.path.getmtime(path)
+    reader, width, height = load_logo(path, mtime, target_width)
+    form_name = 'logo_' + hashlib.sha1(f"{path}:{mtime}:{target_width}".encode()).hexdigest()[:16]
+    if not c.hasForm(form_name):
+        c.beginForm(form_name, upperx=width, uppery=height)
+        c.drawImage(reader, 0, 0, width=width, height=height)
+        c.endForm()
+
+    c.saveState()
+    c.translate(x, y)
+    c.doForm(form_name)
+    c.restoreState()
+    return width, height
@@ -0,0 +1,141 @@
+"""
+Vector barcodes for labels.
+
+A value is encoded once per symbology: ``encode`` turns it into the bars or
+modules of the symbol as plain ReportLab shapes at one unit per module, and
+keeps them in an LRU cache, so reprints and multi-copy runs skip re-encoding.
+On a PDF canvas each symbol becomes a form XObject that is defined once per
+document and then placed by reference, scaled to the barcode box. The bars
+stay vector paths, so they are sharp at any print resolution.
+"""
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+
+from reportlab.graphics import renderPDF
+from reportlab.graphics.barcode import createBarcodeDrawing
+from loguru import logger
+
+from . import metrics
+
+# Symbology name in the configuration -> ReportLab barcode name
+SYMBOLOGIES = {
+    'code128': 'Code128',
+    'qr': 'QR',
+}
+
+# Quiet zone on each side of the symbol, in modules
+QUIET_MODULES = {
+    'code128': 10,
+    'qr': 4,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Symbol:
+    """An encoded barcode at one unit per module, quiet zones included."""
+    drawing: object
+    width: float
+    height: float
+    modules: int
+
+
+@lru_cache(maxsize=4096)
+def encode(symbology, value):
+    """
+    Encode a value as a barcode symbol, once per (symbology, value).
+
+    Args:
+        symbology (str): 'code128' or 'qr'.
+        value (str): The value to encode.
+
+    Returns:
+        Symbol: The symbol geometry.
+
+    Raises:
+        ValueError: If the symbology is unknown or cannot encode the value.
+    """
+    if symbology not in SYMBOLOGIES:
+        raise ValueError(f"Unknown barcode symbology '{symbology}'")
+    quiet = QUIET_MODULES[symbology]
+    if symbology == 'qr':
+        drawing = createBarcodeDrawing('QR', value=value, barBorder=quiet, barWidth=1, barHeight=1)
+        widget = drawing.contents[0]
+        shapes = widget.draw()
+        modules = widget.qr.getModuleCount()
+        # Scale the unit square to one unit per module
+        size = modules + 2 * quiet
+        drawing.transform = (size, 0, 0, size, 0, 0)
+        width = height = size
+    else:
+        drawing = createBarcodeDrawing(
+            'Code128', value=value, barWidth=1, barHeight=1, humanReadable=False, lquiet=quiet, rquiet=quiet,
+        )
+        widget = drawing.contents[0]
+        shapes = widget.draw()
+        width, height = drawing.width, 1
+        modules = int(width) - 2 * quiet
+
+    # Keep the expanded shapes, so drawing the symbol does not encode the value again
+    drawing.contents[0] = shapes
+    metrics.increment('barcodes.encoded')
+    return Symbol(drawing, width, height, modules)
+
+
+def barcode_value(item, field):
+    """
+    Return the value to encode for an item, or None if the item has none.
+
+    Args:
+        item (dict): The item dictionary containing the product information.
+        field (str): The item field holding the value, e.g. 'netsuite_id'.
+
+    Returns:
+        str: The value as text.
+    """
+    value = item.get(field)
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+def draw_barcode(c, symbology, value, x, y, width, height):
+    """
+    Draw a barcode through a form XObject that is defined once per document.
+
+    Code 128 symbols are stretched to fill the box; QR codes are drawn as the
+    largest square that fits, aligned to the box's bottom-left corner.
+
+    Args:
+        c (canvas.Canvas): The ReportLab canvas object.
+        symbology (str): 'code128' or 'qr'.
+        value (str): The value to encode.
+        x (float): The x-coordinate of the box's bottom-left corner.
+        y (float): The y-coordinate of the box's bottom-left corner.
+        width (float): The box width in points.
+        height (float): The box height in points.
+
+    Returns:
+        bool: True if the barcode was drawn, False if the value cannot be encoded.
+    """
+    try:
+        symbol = encode(symbology, value)
+    except ValueError as e:
+        logger.warning(f"Skipping barcode for '{value}': {e}")
+        metrics.increment('barcodes.failed')
+        return False
+
+    if symbology == 'qr':
+        width = height = min(width, height)
+    form_name = 'barcode_' + hashlib.sha1(f"{symbology}:{value}:{width}:{height}".encode()).hexdigest()[:16]
+    if not c.hasForm(form_name):
+        c.beginForm(form_name, upperx=width, uppery=height)
+        c.scale(width / symbol.width, height / symbol.height)
+        renderPDF.draw(symbol.drawing, c, 0, 0)
+        c.endForm()
+
+    c.saveState()
+    c.translate(x, y)
+    c.doForm(form_name)
+    c.restoreState()
+    return True
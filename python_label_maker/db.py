@@ -1,76 +1,404 @@
 import sqlite3
+import json
 import os
+import re
+import threading
 from loguru import logger
-from icecream import ic
+from . import metrics
 # Database file name
 db_file = "db.sqlite"
 
+# Long-lived connection shared by the write path
+_connection = None
+_connection_key = None
+_connection_lock = threading.RLock()
+
+# Whether the SQLite build supports the items_fts full-text index
+fts_enabled = True
+
+# Columns every items table must have; older databases are migrated in place
+ITEM_COLUMNS = {
+    'description': 'TEXT',
+    'company_img': 'TEXT',
+    'item_img': 'TEXT',
+    'manufacturer': 'TEXT',
+    'netsuite_id': 'INTEGER',
+    'last_modified': 'TEXT',
+    'stale': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+def get_connection():
+    """
+    Return the process-wide SQLite connection, opening it on first use.
+
+    The connection runs in WAL mode so readers are not blocked by bulk writes,
+    and is reopened if ``db_file`` changes or the process has forked. Opening
+    it creates or migrates the tables, so nothing happens at import time.
+
+    Returns:
+        sqlite3.Connection: The shared connection.
+    """
+    global _connection, _connection_key
+    with _connection_lock:
+        key = (db_file, os.getpid())
+        if _connection is None or _connection_key != key:
+            _connection = sqlite3.connect(db_file, check_same_thread=False)
+            _connection.execute('PRAGMA journal_mode=WAL')
+            _connection.execute('PRAGMA synchronous=NORMAL')
+            _connection_key = key
+            _create_schema(_connection)
+        return _connection
+
+def close_connection():
+    """
+    Close the shared connection if it is open.
+    """
+    global _connection, _connection_key
+    with _connection_lock:
+        if _connection is not None and _connection_key[1] == os.getpid():
+            _connection.close()
+        _connection = None
+        _connection_key = None
+
 def create_database_and_table():
-    # Check if the database file already exists
-    db_exists = os.path.exists(db_file)
+    """
+    Open the database, creating or migrating its tables.
 
-    # Connect to the database
-    conn = sqlite3.connect(db_file)
-    # Create a cursor object to execute SQL commands
-    cursor = conn.cursor()
-    # Create the 'items' table if it doesn't exist
-    create_table_sql = '''
-    CREATE TABLE IF NOT EXISTS items (
-        id INTEGER PRIMARY KEY,
-        name TEXT NOT NULL,
-        description TEXT,
-        company TEXT,
-        item_img TEXT,
-        manufacturer TEXT
-    )
-    '''
+    The tables are also created on first use of the database, so calling this
+    is only needed to open it up front.
+    """
+    get_connection()
 
-    # Execute the SQL command
-    cursor.execute(create_table_sql)
+def _create_schema(conn):
+    with _connection_lock:
+        # Create the 'items' table if it doesn't exist
+        create_table_sql = '''
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT,
+            company_img TEXT,
+            item_img TEXT,
+            manufacturer TEXT,
+            netsuite_id INTEGER,
+            last_modified TEXT,
+            stale INTEGER NOT NULL DEFAULT 0
+        )
+        '''
+        conn.execute(create_table_sql)
 
-    # Commit the changes and close the connection
-    conn.commit()
-    conn.close()
+        # Per-manufacturer high-water marks for incremental NetSuite syncs
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            manufacturer TEXT PRIMARY KEY,
+            last_modified TEXT,
+            synced_at TEXT
+        )
+        ''')
+
+        # Add columns missing from databases created by older versions
+        existing_columns = {row[1] for row in conn.execute('PRAGMA table_info(items)')}
+        for column, column_type in ITEM_COLUMNS.items():
+            if column not in existing_columns:
+                conn.execute(f'ALTER TABLE items ADD COLUMN {column} {column_type}')
+
+        # Names are unique; keep the oldest row of any duplicates before indexing. Once the
+        # index exists no duplicates can be written, so only older databases pay for the scan
+        has_name_index = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_items_name'").fetchone()
+        if not has_name_index:
+            conn.execute('DELETE FROM items WHERE id NOT IN (SELECT MIN(id) FROM items GROUP BY name)')
+            conn.execute('CREATE UNIQUE INDEX idx_items_name ON items (name)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_items_netsuite_id ON items (netsuite_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_items_manufacturer ON items (manufacturer)')
+        _create_search_index(conn)
+        conn.commit()
 
     # Print a message about what was done
     logger.info(f"Connected to database from: {db_file}")
-    
+
+def _create_search_index(conn):
+    """
+    Create the full-text index over item names and descriptions.
+
+    ``items_fts`` is an external-content FTS5 table: it stores only the index
+    and triggers keep it in step with every insert, update and delete on
+    ``items``. An existing cache is indexed once when the table is created.
+    Without FTS5 in the SQLite build, searches fall back to LIKE scans.
+    """
+    global fts_enabled
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'").fetchone()
+    if not exists:
+        try:
+            conn.execute('''
+            CREATE VIRTUAL TABLE items_fts USING fts5(
+                name, description, content='items', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full-text search unavailable, falling back to LIKE: {e}")
+            fts_enabled = False
+            return
+        conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+    conn.executescript('''
+    CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF name, description ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO items_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+    END;
+    ''')
+    fts_enabled = True
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query that matches items containing every word.
+
+    Each word is quoted, so punctuation in SKUs is not read as query syntax,
+    and matched as a prefix, so 'down' finds 'downlight'.
+
+    Args:
+        text (str): The search text, e.g. 'led downlight'.
+
+    Returns:
+        str: The FTS5 query, or None if the text holds no words.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def _search_filter(text):
+    # SQL condition and parameters selecting the items that match a search
+    if fts_enabled:
+        query = fts_query(text)
+        if query is None:
+            return '1', []
+        return 'id IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?)', [query]
+    words = re.findall(r'\w+', text)
+    conditions = ['(name LIKE ? OR description LIKE ?)'] * len(words)
+    params = [pattern for word in words for pattern in (f'%{word}%', f'%{word}%')]
+    return ' AND '.join(conditions) or '1', params
+
+def search_items(text, manufacturer=None, limit=50, include_stale=False):
+    """
+    Return the cached items best matching a search, most relevant first.
+
+    Args:
+        text (str): The search text, matched against item names and descriptions.
+        manufacturer (str): Only return items from this manufacturer.
+        limit (int): The maximum number of items to return.
+        include_stale (bool): Also return items that were deleted or deactivated in NetSuite.
+
+    Returns:
+        list: The matching item dictionaries.
+    """
+    conn = get_connection()
+    query = fts_query(text)
+    if query is None:
+        return []
+    filters, params = [], []
+    if not include_stale:
+        filters.append('items.stale = 0')
+    if manufacturer:
+        filters.append('items.manufacturer = ?')
+        params.append(manufacturer)
+    where = ''.join(f' AND {f}' for f in filters)
+    if fts_enabled:
+        # bm25 ranks name matches above description matches
+        search_sql = (
+            'SELECT items.* FROM items_fts JOIN items ON items.id = items_fts.rowid '
+            f'WHERE items_fts MATCH ?{where} ORDER BY bm25(items_fts, 10.0, 1.0) LIMIT ?'
+        )
+        params = [query, *params, limit]
+    else:
+        condition, search_params = _search_filter(text)
+        search_sql = f'SELECT * FROM items WHERE {condition}{where} ORDER BY name LIMIT ?'
+        params = [*search_params, *params, limit]
+    with _connection_lock, metrics.span('db.search'):
+        cursor = conn.execute(search_sql, params)
+        column_names = [description[0] for description in cursor.description]
+        items = [dict(zip(column_names, row)) for row in cursor]
+    metrics.increment('db.rows_read', len(items))
+    return items
+
+def upsert_items(items):
+    """
+    Insert or update many items in a single transaction. Written rows are no
+    longer stale.
+
+    Args:
+        items (iterable): Item dictionaries with ``name``, ``description``,
+            ``company_img``, ``item_img`` and ``manufacturer`` keys, and optionally
+            the NetSuite ``netsuite_id`` and ``last_modified`` values.
+
+    Returns:
+        int: The number of rows written.
+    """
+    upsert_sql = '''
+    INSERT INTO items (name, description, company_img, item_img, manufacturer, netsuite_id, last_modified, stale)
+    VALUES (:name, :description, :company_img, :item_img, :manufacturer, :netsuite_id, :last_modified, 0)
+    ON CONFLICT (name) DO UPDATE SET
+        description = excluded.description,
+        company_img = excluded.company_img,
+        item_img = excluded.item_img,
+        manufacturer = excluded.manufacturer,
+        netsuite_id = COALESCE(excluded.netsuite_id, items.netsuite_id),
+        last_modified = COALESCE(excluded.last_modified, items.last_modified),
+        stale = 0
+    '''
+    columns = ('name', 'description', 'company_img', 'item_img', 'manufacturer', 'netsuite_id', 'last_modified')
+    rows = [
+        {column: item.get(column) for column in columns}
+        for item in items if item.get('name')
+    ]
+    if not rows:
+        return 0
+
+    conn = get_connection()
+    with _connection_lock, metrics.span('db.upsert'):
+        try:
+            with conn:
+                conn.executemany(upsert_sql, rows)
+            metrics.increment('db.rows_upserted', len(rows))
+            logger.info(f"Upserted {len(rows)} items")
+            return len(rows)
+        except sqlite3.Error as e:
+            logger.error(f"Database Error: {e}")
+            return 0
+
 def insert_item(name, description, company_img_url, item_img_url, manufacturer):
     if not name:
-        ic("Error: Name cannot be empty")
+        logger.error("Error: Name cannot be empty")
         return
 
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
+    upsert_items([{
+        'name': name,
+        'description': description,
+        'company_img': company_img_url,
+        'item_img': item_img_url,
+        'manufacturer': manufacturer,
+    }])
 
-    try:
-        # Ensure the table exists
-        create_database_and_table()
-
-        # Check if an item with the same name already exists
-        check_sql = 'SELECT id FROM items WHERE name = ?'
-        cursor.execute(check_sql, (name,))
-        existing_item = cursor.fetchone()
-
-        if existing_item:
-            logger.info(f"Item '{name}' exists. Skipped.")
-        else:
-            insert_sql = '''
-            INSERT INTO items (name, description, company_img, item_img, manufacturer)
-            VALUES (?, ?, ?, ?, ?)
-            '''
-            cursor.execute(insert_sql, (name, description, company_img_url, item_img_url, manufacturer))
-            conn.commit()
-            logger.info(f"Inserted item: {name}")
-
-    except sqlite3.IntegrityError as e:
-        logger.error(f"Integrity Error: {e}")
-    except sqlite3.Error as e:
-        logger.error(f"Database Error: {e}")
-    finally:
-        conn.close()
+def mark_stale(netsuite_ids):
+    """
+    Flag items that were deleted or deactivated in NetSuite as stale.
+
+    Stale rows stay in the cache but are skipped by iter_items.
+
+    Args:
+        netsuite_ids (iterable): The NetSuite internal ids of the affected items.
+
+    Returns:
+        int: The number of rows marked stale.
+    """
+    ids = [(int(netsuite_id),) for netsuite_id in netsuite_ids]
+    if not ids:
+        return 0
+
+    conn = get_connection()
+    with _connection_lock:
+        try:
+            with conn:
+                cursor = conn.executemany('UPDATE items SET stale = 1 WHERE netsuite_id = ? AND stale = 0', ids)
+            if cursor.rowcount:
+                logger.info(f"Marked {cursor.rowcount} items as stale")
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Database Error: {e}")
+            return 0
+
+def get_netsuite_ids(manufacturer):
+    """
+    Return the NetSuite ids of the live cached items of a manufacturer.
+
+    Args:
+        manufacturer (str): The manufacturer name as stored in NetSuite.
+
+    Returns:
+        list: The NetSuite internal ids.
+    """
+    conn = get_connection()
+    with _connection_lock:
+        rows = conn.execute(
+            'SELECT netsuite_id FROM items WHERE manufacturer = ? AND netsuite_id IS NOT NULL AND stale = 0',
+            (manufacturer,),
+        ).fetchall()
+    return [row[0] for row in rows]
+
+def get_items_by_netsuite_ids(netsuite_ids):
+    """
+    Return the live cached items with the given NetSuite ids.
+
+    Args:
+        netsuite_ids (list): The NetSuite internal ids.
+
+    Returns:
+        list: The item dictionaries in the order of ``netsuite_ids``; ids that are
+              not cached are left out.
+    """
+    netsuite_ids = list(dict.fromkeys(netsuite_ids))
+    if not netsuite_ids:
+        return []
+    conn = get_connection()
+    items = {}
+    with _connection_lock:
+        with metrics.span('db.fetch_ids'):
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(netsuite_ids), 500):
+                batch = netsuite_ids[start:start + 500]
+                cursor = conn.execute(
+                    f'SELECT * FROM items WHERE stale = 0 AND netsuite_id IN ({", ".join("?" * len(batch))})',
+                    batch,
+                )
+                column_names = [description[0] for description in cursor.description]
+                for row in cursor:
+                    item = dict(zip(column_names, row))
+                    items[item['netsuite_id']] = item
+    metrics.increment('db.rows_read', len(items))
+    return [items[netsuite_id] for netsuite_id in netsuite_ids if netsuite_id in items]
+
+def get_watermark(manufacturer):
+    """
+    Return the lastModifiedDate high-water mark of the last sync for a manufacturer.
+
+    Args:
+        manufacturer (str): The manufacturer name as stored in NetSuite.
+
+    Returns:
+        str: The watermark as 'YYYY-MM-DD HH24:MI:SS', or None if it was never synced.
+    """
+    conn = get_connection()
+    with _connection_lock:
+        row = conn.execute('SELECT last_modified FROM sync_state WHERE manufacturer = ?', (manufacturer,)).fetchone()
+    return row[0] if row else None
+
+def set_watermark(manufacturer, last_modified):
+    """
+    Store the lastModifiedDate high-water mark for a manufacturer.
+
+    Args:
+        manufacturer (str): The manufacturer name as stored in NetSuite.
+        last_modified (str): The newest lastModifiedDate seen, as 'YYYY-MM-DD HH24:MI:SS'.
+    """
+    upsert_sql = '''
+    INSERT INTO sync_state (manufacturer, last_modified, synced_at)
+    VALUES (?, ?, datetime('now'))
+    ON CONFLICT (manufacturer) DO UPDATE SET
+        last_modified = excluded.last_modified,
+        synced_at = excluded.synced_at
+    '''
+    conn = get_connection()
+    with _connection_lock:
+        with conn:
+            conn.execute(upsert_sql, (manufacturer, last_modified))
 
 def get_cached_items():
+    get_connection()  # Make sure the tables exist
     conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
 
@@ -78,11 +406,12 @@ def get_cached_items():
         # SQL query to select all records from the items table
         select_all_sql = 'SELECT * FROM items'
         
-        # Execute the query
-        cursor.execute(select_all_sql)
-        
-        # Fetch all records
-        rows = cursor.fetchall()
+        with metrics.span('db.fetch_all'):
+            # Execute the query
+            cursor.execute(select_all_sql)
+            
+            # Fetch all records
+            rows = cursor.fetchall()
         
         # Get column names
         column_names = [description[0] for description in cursor.description]
@@ -94,14 +423,107 @@ def get_cached_items():
         return items
 
     except sqlite3.Error as e:
-        ic(f"Database Error: {e}")
+        logger.error(f"Database Error: {e}")
         return []
 
     finally:
         conn.close()
 
-# Create the database and table
-create_database_and_table()
+def iter_items(page_size=500, **filters):
+    """
+    Lazily yield cached items one page at a time using keyset pagination.
+
+    Only one page of rows is held in memory at a time, so large catalogs can be
+    streamed straight into the render pipeline.
+
+    Args:
+        page_size (int): Number of rows fetched per query.
+        **filters: The filters of iter_item_pages.
+
+    Yields:
+        dict: The next item, in id order.
+
+    Raises:
+        sqlite3.Error: If a page could not be read.
+    """
+    for column_names, rows in iter_item_pages(page_size, **filters):
+        for row in rows:
+            yield dict(zip(column_names, row))
+
+def iter_item_pages(page_size=500, manufacturer=None, name_from=None, name_to=None, include_stale=False, search=None, names=None):
+    """
+    Lazily yield pages of cached item rows as tuples, using keyset pagination.
+
+    This is the row source of iter_items for callers that do not need a dict
+    per row, such as the columnar snapshot writer.
+
+    Args:
+        page_size (int): Number of rows fetched per query.
+        manufacturer (str): Only yield items from this manufacturer.
+        name_from (str): Only yield items whose name sorts at or after this value.
+        name_to (str): Only yield items whose name sorts at or before this value.
+        include_stale (bool): Also yield items that were deleted or deactivated in NetSuite.
+        search (str): Only yield items whose name or description contains every word
+            of this text, looked up in the full-text index.
+        names (list): Only yield items with these names (SKUs).
+
+    Yields:
+        tuple: The column names and the list of row tuples of the next page, in id order.
+
+    Raises:
+        sqlite3.Error: If a page could not be read, so a partial catalog is never
+            mistaken for the whole one.
+    """
+    get_connection()  # Make sure the tables exist
+    filters = []
+    params = []
+    if not include_stale:
+        filters.append('stale = 0')
+    if manufacturer:
+        filters.append('manufacturer = ?')
+        params.append(manufacturer)
+    if name_from:
+        filters.append('name >= ?')
+        params.append(name_from)
+    if name_to:
+        filters.append('name <= ?')
+        params.append(name_to)
+    if search:
+        condition, search_params = _search_filter(search)
+        filters.append(condition)
+        params += search_params
+    if names is not None:
+        # One JSON parameter instead of one per name, so long SKU lists stay within SQLite's limits
+        filters.append('name IN (SELECT value FROM json_each(?))')
+        params.append(json.dumps(list(names)))
+    where = ''.join(f' AND {f}' for f in filters)
+    select_page_sql = f'SELECT * FROM items WHERE id > ?{where} ORDER BY id LIMIT ?'
+
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+
+    try:
+        last_id = -1
+        while True:
+            # Resume after the last id seen instead of using OFFSET
+            with metrics.span('db.fetch_page'):
+                cursor.execute(select_page_sql, [last_id, *params, page_size])
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            metrics.increment('db.rows_read', len(rows))
+
+            column_names = [description[0] for description in cursor.description]
+            id_index = column_names.index('id')
+            yield column_names, rows
+            last_id = rows[-1][id_index]
+
+    except sqlite3.Error as e:
+        logger.error(f"Database Error: {e}")
+        raise
+
+    finally:
+        conn.close()
 # Example usage of the insert_item function
 # insert_item(
 #     name="Sample Item",
@@ -0,0 +1,134 @@
+"""
+Print-ready derivatives of product images.
+
+Each cached product image is prepared once per printed size: scaled to the exact
+pixel dimensions the label prints it at for the configured DPI, flattened onto
+white, and encoded as PNG when it is flat artwork (few distinct colors) or as
+JPEG otherwise. Derivatives are named after the source image's content hash and
+their pixel size, so they are found again without decoding the source, and
+ReportLab embeds the prepared JPEGs in the PDF as they are.
+"""
+import os
+from pathlib import Path
+
+from PIL import Image
+
+# Images with at most this many distinct colors are saved losslessly as PNG
+MAX_PNG_COLORS = 256
+EXTENSIONS = ('.jpg', '.png')
+
+
+def display_size(image_size, max_width, max_height):
+    """
+    Return the size an image is drawn at on the label.
+
+    Args:
+        image_size (tuple): The source image's width and height in pixels.
+        max_width (float): The maximum width in points.
+        max_height (float): The maximum height in points.
+
+    Returns:
+        tuple: The width and height in points.
+    """
+    img_width, img_height = image_size
+    aspect = img_height / float(img_width)
+
+    new_width = min(max_width, img_width)
+    new_height = new_width * aspect
+
+    if new_height > max_height:
+        new_height = max_height
+        new_width = new_height / aspect
+    return new_width, new_height
+
+
+def pixel_size(image_size, width, height, dpi):
+    """
+    Return the pixel size needed to print a drawn size at a DPI, never upscaling the source.
+
+    Args:
+        image_size (tuple): The source image's width and height in pixels.
+        width (float): The drawn width in points.
+        height (float): The drawn height in points.
+        dpi (int): The print resolution in dots per inch.
+
+    Returns:
+        tuple: The width and height in pixels.
+    """
+    scale = min(dpi / 72, image_size[0] / width, image_size[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def find_derivative(directory, digest, size):
+    """
+    Return the path of an existing derivative, if any.
+
+    Args:
+        directory (str | Path): The derivative directory.
+        digest (str): The content hash of the source image.
+        size (tuple): The derivative's width and height in pixels.
+
+    Returns:
+        str: The path to the derivative, or None.
+    """
+    stem = Path(directory) / digest[:2] / f"{digest}_{size[0]}x{size[1]}"
+    for extension in EXTENSIONS:
+        path = stem.with_suffix(extension)
+        if path.exists():
+            return str(path)
+    return None
+
+
+def write_derivative(img, directory, digest, size, jpeg_quality=85):
+    """
+    Scale, flatten and encode a derivative of a source image.
+
+    Args:
+        img (PIL.Image.Image): The source image.
+        directory (str | Path): The derivative directory.
+        digest (str): The content hash of the source image.
+        size (tuple): The derivative's width and height in pixels.
+        jpeg_quality (int): The JPEG quality for photographic images.
+
+    Returns:
+        str: The path to the derivative.
+    """
+    img = img.convert('RGBA')
+    if img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+
+    # Labels are printed on white, so transparency is flattened onto white
+    flattened = Image.new('RGB', img.size, (255, 255, 255))
+    flattened.paste(img, mask=img.getchannel('A'))
+
+    flat_artwork = flattened.getcolors(MAX_PNG_COLORS) is not None
+    extension = '.png' if flat_artwork else '.jpg'
+    path = Path(directory) / digest[:2] / f"{digest}_{size[0]}x{size[1]}{extension}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write under a temporary name so concurrent writers never expose a partial file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{id(img)}.tmp")
+    if flat_artwork:
+        flattened.save(tmp_path, 'PNG', optimize=True)
+    else:
+        flattened.save(tmp_path, 'JPEG', quality=jpeg_quality, optimize=True)
+    os.replace(tmp_path, path)
+    return str(path)
+
+
+def delete_derivatives(directory, digest):
+    """
+    Delete every derivative of a source image, e.g. after it was evicted from the image cache.
+
+    Args:
+        directory (str | Path): The derivative directory.
+        digest (str): The content hash of the source image.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    deleted = 0
+    for path in (Path(directory) / digest[:2]).glob(f"{digest}_*"):
+        path.unlink(missing_ok=True)
+        deleted += 1
+    return deleted
@@ -0,0 +1,146 @@
+"""
+Process-wide font registration with an on-disk cache of parsed fonts.
+
+Every font in the ``fonts`` section of the configuration is registered with
+ReportLab under its configured name exactly once per process, no matter how
+many sheets, formats or worker initializers ask for it. Parsing a TrueType file
+is the expensive part, so parsed fonts are pickled to ``font_cache.directory``
+keyed by the font's name, the file's path, size and modification time and the
+ReportLab version, and later processes load them from there instead of parsing
+the file.
+"""
+import copy
+import functools
+import hashlib
+import operator
+import os
+import pickle
+import threading
+from weakref import WeakKeyDictionary
+
+import reportlab
+from loguru import logger
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace
+
+from . import file_utils
+
+_lock = threading.Lock()
+# Font name -> path of every font registered through this module
+_registered = {}
+
+
+def font_path(font):
+    """
+    Return the absolute path of a configured font file.
+
+    Args:
+        font (dict): A font configuration with ``name`` and ``file``.
+
+    Returns:
+        str: The path to the font file.
+    """
+    return os.path.join(file_utils.BASE_DIR, font['file'])
+
+
+def _cache_file(name, path, cache_directory):
+    stat = os.stat(path)
+    key = f"{name}:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{reportlab.Version}"
+    return os.path.join(cache_directory, hashlib.sha1(key.encode()).hexdigest() + '.pickle')
+
+
+def _font_state(font):
+    # Everything but the per-document state and the face's unpicklable scale function
+    state = {key: value for key, value in vars(font).items() if key != 'state'}
+    face = copy.copy(font.face)
+    del face._pdfScale
+    state['face'] = vars(face)
+    return state
+
+
+def _font_from_state(state):
+    face = TTFontFace.__new__(TTFontFace)
+    face.__dict__.update(state['face'])
+    face._pdfScale = functools.partial(operator.mul, 1000 / face.unitsPerEm)
+    font = TTFont.__new__(TTFont)
+    font.__dict__.update(state, face=face)
+    font.state = WeakKeyDictionary()
+    return font
+
+
+def load_font(name, path, cache_directory=None):
+    """
+    Load a TrueType font, from the parsed-font cache when possible.
+
+    Args:
+        name (str): The name to give the font.
+        path (str): The path to the TrueType file.
+        cache_directory (str): Directory of parsed fonts. Without it the file is always parsed.
+
+    Returns:
+        TTFont: The font, ready to be registered.
+    """
+    if not cache_directory:
+        return TTFont(name, path)
+
+    cache_file = _cache_file(name, path, cache_directory)
+    try:
+        with open(cache_file, 'rb') as f:
+            return _font_from_state(pickle.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable font cache {cache_file}: {str(e)}")
+
+    font = TTFont(name, path)
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        tmp_path = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(_font_state(font), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not write font cache {cache_file}: {str(e)}")
+    return font
+
+
+def register_fonts(fonts, cache_directory=None):
+    """
+    Register the configured fonts under their configured names, once per process.
+
+    Fonts registered earlier through this function, or with ReportLab directly,
+    are not loaded again.
+
+    Args:
+        fonts (dict): The ``fonts`` configuration section, e.g. ``{'primary': {'name': ..., 'file': ...}}``.
+        cache_directory (str): Directory of parsed fonts, see load_font.
+    """
+    with _lock:
+        registered = None
+        for font in fonts.values():
+            name = font['name']
+            path = font_path(font)
+            if _registered.get(name) == path:
+                continue
+            if name in _registered:
+                logger.warning(f"Font {name} is already registered from {_registered[name]}; ignoring {path}")
+                continue
+            if registered is None:
+                registered = set(pdfmetrics.getRegisteredFontNames())
+            if name not in registered:
+                pdfmetrics.registerFont(load_font(name, path, cache_directory))
+            _registered[name] = path
+
+
+def cache_directory(config):
+    """
+    Return the parsed-font cache directory configured in ``font_cache.directory``.
+
+    Args:
+        config (dict): The configuration dictionary.
+
+    Returns:
+        str: The directory, or None if the cache is disabled.
+    """
+    directory = config.get('font_cache', {}).get('directory')
+    return directory and os.path.join(file_utils.BASE_DIR, directory)
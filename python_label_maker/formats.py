@@ -0,0 +1,179 @@
+"""
+Registry of label stock formats.
+
+Each format describes a sheet (or roll) of labels in inches: page size, label
+size, grid and margins, plus content settings for labels too small for the
+default text sizes. ``apply_format`` overlays a format onto the page, label,
+layout and content sections of a configuration, and the compiled plan for each format
+is cached by ``plan.get_plan``, so one process can render several formats
+without reloading the configuration or registering fonts again.
+"""
+import copy
+import os
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True, slots=True)
+class LabelFormat:
+    """
+    Geometry of a label stock, in inches.
+
+    ``content`` maps content sections (e.g. 'description') to the settings that
+    replace the configured ones on this stock.
+    """
+    name: str
+    description: str
+    page_width: float
+    page_height: float
+    label_width: float
+    label_height: float
+    columns: int
+    rows: int
+    left_margin: float = 0
+    top_margin: float = 0
+    horizontal_spacing: float = 0
+    vertical_spacing: float = 0
+    corner_radius: float = 0
+    kind: str = 'sheet'
+    content: dict = field(default_factory=dict)
+
+    def sections(self):
+        """
+        Return the page, label and layout configuration sections for this format.
+
+        Returns:
+            dict: The configuration sections keyed by section name.
+        """
+        bottom_margin = self.page_height - self.top_margin - self.rows * self.label_height - (self.rows - 1) * self.vertical_spacing
+        right_margin = self.page_width - self.left_margin - self.columns * self.label_width - (self.columns - 1) * self.horizontal_spacing
+        return {
+            'page': {
+                'size': 'custom' if self.kind == 'roll' else 'letter',
+                'width': self.page_width,
+                'height': self.page_height,
+                'units': 'inches',
+            },
+            'label': {
+                'width': self.label_width,
+                'height': self.label_height,
+                'corner_radius': self.corner_radius,
+                'units': 'inches',
+            },
+            'layout': {
+                'labels_per_sheet': self.columns * self.rows,
+                'columns': self.columns,
+                'rows': self.rows,
+                'horizontal_spacing': self.horizontal_spacing,
+                'vertical_spacing': self.vertical_spacing,
+                'top_margin': self.top_margin,
+                'bottom_margin': round(bottom_margin, 5),
+                'left_margin': self.left_margin,
+                'right_margin': round(right_margin, 5),
+                'units': 'inches',
+            },
+        }
+
+
+FORMATS = {}
+
+
+def register_format(label_format):
+    """
+    Add a label format to the registry, replacing any format with the same name.
+
+    Args:
+        label_format (LabelFormat): The format to register.
+
+    Returns:
+        LabelFormat: The registered format.
+    """
+    FORMATS[label_format.name.upper()] = label_format
+    return label_format
+
+
+def get_format(name):
+    """
+    Look up a registered label format by name (case-insensitive).
+
+    Args:
+        name (str): The format name, e.g. 'OL125' or 'AVERY5160'.
+
+    Returns:
+        LabelFormat: The format.
+
+    Raises:
+        ValueError: If no format with that name is registered.
+    """
+    try:
+        return FORMATS[name.upper()]
+    except KeyError:
+        raise ValueError(f"Unknown label format '{name}'. Available formats: {', '.join(sorted(FORMATS))}") from None
+
+
+def apply_format(config, name):
+    """
+    Return a copy of the configuration with a format's page, label and layout sections
+    and its content settings.
+
+    The single-document output file is named after the format, e.g. ``labels_avery5160.pdf``.
+
+    Args:
+        config (dict): The configuration dictionary.
+        name (str): The format name.
+
+    Returns:
+        dict: The configuration for the format.
+    """
+    label_format = get_format(name)
+    format_config = copy.deepcopy(config)
+    format_config['label_format'] = label_format.name
+    format_config.update(label_format.sections())
+    for section, settings in label_format.content.items():
+        format_config['content'][section] = dict(format_config['content'].get(section, {}), **settings)
+    output = format_config['output']
+    output['filename'] = os.path.join(os.path.dirname(output['filename']), f"labels_{label_format.name.lower()}.pdf")
+    return format_config
+
+
+# Text sizes for labels about an inch tall, where the defaults leave no room for the description
+SMALL_LABEL_CONTENT = {
+    'product_code': {'size': 12},
+    'description': {'size': 7, 'min_size': 5, 'line_spacing': 1, 'vertical_padding': 0.02, 'horizontal_padding': 0.1},
+}
+
+# Sheet stock on US letter paper
+register_format(LabelFormat(
+    'OL125', 'OnlineLabels OL125, 4" x 2", 10 per sheet',
+    8.5, 11, 4, 2, columns=2, rows=5,
+    left_margin=0.18, top_margin=0.5, horizontal_spacing=0.14, corner_radius=0.17188,
+))
+register_format(LabelFormat(
+    'AVERY5163', 'Avery 5163 shipping, 4" x 2", 10 per sheet',
+    8.5, 11, 4, 2, columns=2, rows=5,
+    left_margin=0.15625, top_margin=0.5, horizontal_spacing=0.1875, corner_radius=0.125,
+))
+register_format(LabelFormat(
+    'AVERY5164', 'Avery 5164 shipping, 4" x 3.33", 6 per sheet',
+    8.5, 11, 4, 3.33333, columns=2, rows=3,
+    left_margin=0.15625, top_margin=0.5, horizontal_spacing=0.1875, corner_radius=0.125,
+))
+register_format(LabelFormat(
+    'AVERY5160', 'Avery 5160 address, 2.625" x 1", 30 per sheet',
+    8.5, 11, 2.625, 1, columns=3, rows=10,
+    left_margin=0.1875, top_margin=0.5, horizontal_spacing=0.125, corner_radius=0.0625,
+    content=SMALL_LABEL_CONTENT,
+))
+
+# Roll stock for thermal printers, one label per page
+register_format(LabelFormat(
+    'ZEBRA_4X6', 'Zebra thermal roll, 4" x 6"',
+    4, 6, 4, 6, columns=1, rows=1, kind='roll',
+))
+register_format(LabelFormat(
+    'ZEBRA_4X2', 'Zebra thermal roll, 4" x 2"',
+    4, 2, 4, 2, columns=1, rows=1, kind='roll',
+))
+register_format(LabelFormat(
+    'DYMO_30252', 'DYMO 30252 address roll, 3.5" x 1.125"',
+    3.5, 1.125, 3.5, 1.125, columns=1, rows=1, kind='roll', content=SMALL_LABEL_CONTENT,
+))
@@ -1,24 +1,38 @@
 import os
 import json
-from netsuite import NetSuite, Config, TokenAuth
-from typing import List
-from pydantic import BaseModel
 import asyncio
 import pprint
 import re
 import base64
-from icecream import ic
-from PIL import Image
+import threading
 from io import BytesIO
 import requests
-from .db import insert_item
+from .db import upsert_items, mark_stale, get_watermark, set_watermark, get_netsuite_ids
+from . import file_utils
+from . import metrics
+from . import http_client
 from loguru import logger
 
+class SyncError(RuntimeError):
+    """Raised when a sync could not fetch or cache every change; the watermark is left in place."""
+
 def load_config():
     with open('data/config.json', 'r') as f:
         return json.load(f)
 
-config = load_config()
+_config = None
+
+def get_config():
+    """
+    Return the configuration, loading it on first use.
+
+    Returns:
+        dict: The configuration data.
+    """
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config
 
 def extract_file_id(url):
     # Use regex to extract the value of the 'id' parameter
@@ -41,28 +55,61 @@ def create_image_from_bytes(image_bytes):
     image_stream = BytesIO(image_bytes)
 
     # Open the image using Pillow (PIL)
+    from PIL import Image
     image = Image.open(image_stream)
     return image
 
-# Fetch TokenAuth parameters from environment variables
-consumer_key = os.getenv("NETSUITE_CONSUMER_KEY")
-consumer_secret = os.getenv("NETSUITE_CONSUMER_SECRET")
-token_id = os.getenv("NETSUITE_TOKEN_ID")
-token_secret = os.getenv("NETSUITE_TOKEN_SECRET")
-account = os.getenv("NETSUITE_ACCOUNT")
-
-# Ensure all necessary environment variables are available
-if not all([consumer_key, consumer_secret, token_id, token_secret]):
-    raise EnvironmentError("One or more NetSuite TokenAuth environment variables are not set.")
-
-# Configuring NetSuite with TokenAuth sourced from environment variables
-ns_config = Config(
-    account="7313488_SB1",  # Ensure this matches your actual NetSuite account ID
-    auth=TokenAuth(consumer_key=consumer_key, consumer_secret=consumer_secret, token_id=token_id, token_secret=token_secret),
-)
-ns = NetSuite(ns_config)
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Return the NetSuite client, creating it on first use.
+
+    The netsuite package is only imported here, so render-only runs neither pay
+    for it nor need credentials.
+
+    Returns:
+        NetSuite: The client.
+
+    Raises:
+        EnvironmentError: If a NetSuite TokenAuth environment variable is not set.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from netsuite import NetSuite, Config, TokenAuth
+
+            # Fetch TokenAuth parameters from environment variables
+            consumer_key = os.getenv("NETSUITE_CONSUMER_KEY")
+            consumer_secret = os.getenv("NETSUITE_CONSUMER_SECRET")
+            token_id = os.getenv("NETSUITE_TOKEN_ID")
+            token_secret = os.getenv("NETSUITE_TOKEN_SECRET")
+
+            # Ensure all necessary environment variables are available
+            if not all([consumer_key, consumer_secret, token_id, token_secret]):
+                raise EnvironmentError("One or more NetSuite TokenAuth environment variables are not set.")
+
+            # Configuring NetSuite with TokenAuth sourced from environment variables
+            ns_config = Config(
+                account="7313488_SB1",  # Ensure this matches your actual NetSuite account ID
+                auth=TokenAuth(consumer_key=consumer_key, consumer_secret=consumer_secret, token_id=token_id, token_secret=token_secret),
+            )
+            _client = NetSuite(ns_config)
+        return _client
+
+def __getattr__(name):
+    # Older callers read these as module attributes
+    if name == 'config':
+        return get_config()
+    if name == 'ns':
+        return get_client()
+    if name == 'account':
+        return os.getenv("NETSUITE_ACCOUNT")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 async def process_data(query: dict):
+    ns = get_client()
     try:
         restlet_response = await ns.restlet.post(script_id=1171, deploy=1, body=query)
         return restlet_response
@@ -101,54 +148,338 @@ def to_snake_case(text: str) -> str:
     # Convert to lowercase and remove any consecutive underscores
     return re.sub(r'_+', '_', snake_case.lower()).strip('_')
 
-async def get_items():
+# Format used for lastModifiedDate watermarks, sortable as plain text
+WATERMARK_FORMAT = 'YYYY-MM-DD HH24:MI:SS'
+
+ITEM_COLUMNS_SQL = (
+    "item.id AS id, item.itemid AS name, item.displayName AS display_name, "
+    "item.purchasedescription as description, item.manufacturer AS manufacturer, "
+    "item.custitem_jls_item_image_url AS item_img, item.isinactive AS is_inactive, "
+    f"TO_CHAR(item.lastmodifieddate, '{WATERMARK_FORMAT}') AS last_modified"
+)
+
+def items_filter(manufacturer, since=None):
+    """
+    Build the WHERE clause and parameters selecting a manufacturer's items.
+
+    Args:
+        manufacturer (str): The manufacturer name as stored in NetSuite.
+        since (str): Only select items modified at or after this watermark.
+
+    Returns:
+        tuple: The WHERE clause and its parameters.
+    """
+    where = "item.manufacturer = ?"
+    params = [manufacturer]
+    if since:
+        # The watermark has one-second resolution: items modified in the same second as the
+        # newest item of the last sync may have been committed after it read, so that second
+        # is read again. Upserting an unchanged item again is harmless.
+        where += f" AND item.lastmodifieddate >= TO_DATE(?, '{WATERMARK_FORMAT}')"
+        params.append(since)
+    return where, params
+
+def build_bounds_query(manufacturer, since=None):
+    """
+    Build the SuiteQL query for the number and id range of a manufacturer's items.
+
+    Args:
+        manufacturer (str): The manufacturer name as stored in NetSuite.
+        since (str): Only select items modified at or after this watermark.
+
+    Returns:
+        dict: The queryRun RESTlet payload.
+    """
+    where, params = items_filter(manufacturer, since)
+    return {
+        "procedure": "queryRun",
+        "query": f"SELECT COUNT(*) AS total, MIN(item.id) AS first_id, MAX(item.id) AS last_id FROM item WHERE {where}",
+        "params": params,
+    }
+
+def build_items_query(manufacturer, since=None, after_id=None, last_id=None, limit=None):
+    """
+    Build the SuiteQL query for a manufacturer's items.
+
+    Pages are selected by key rather than by offset: the items with an id
+    after ``after_id`` and up to ``last_id``, ordered by id, at most ``limit``
+    of them. Items modified while a sync runs do not shift the following
+    pages, so no item is skipped.
+
+    Args:
+        manufacturer (str): The manufacturer name as stored in NetSuite.
+        since (str): Only select items modified at or after this watermark.
+        after_id (int): Only select items with a larger id, e.g. the last id of the previous page.
+        last_id (int): Only select items up to this id.
+        limit (int): The maximum number of items selected.
+
+    Returns:
+        dict: The queryRun RESTlet payload.
+    """
+    where, params = items_filter(manufacturer, since)
+    if after_id is not None:
+        where += " AND item.id > ?"
+        params.append(after_id)
+    if last_id is not None:
+        where += " AND item.id <= ?"
+        params.append(last_id)
+    query = f"SELECT {ITEM_COLUMNS_SQL} FROM item WHERE {where}"
+    if limit is not None:
+        query = f"SELECT * FROM ({query} ORDER BY item.id) WHERE ROWNUM <= ?"
+        params.append(limit)
+    return {
+        "procedure": "queryRun",
+        "query": query,
+        "params": params,
+    }
+
+def id_ranges(first_id, last_id, count):
+    """
+    Split the ids from ``first_id`` to ``last_id`` into contiguous ranges.
+
+    Args:
+        first_id (int): The smallest id.
+        last_id (int): The largest id.
+        count (int): The number of ranges.
+
+    Returns:
+        list: (after_id, last_id) tuples, each selecting the ids after after_id up to last_id.
+    """
+    step = -(-(last_id - first_id + 1) // max(count, 1))
+    return [(start - 1, min(start + step - 1, last_id)) for start in range(first_id, last_id + 1, step)]
+
+async def get_deleted_item_ids(since):
+    """
+    Return the ids of inventory items deleted in NetSuite at or after a watermark.
+
+    Args:
+        since (str): The watermark to look for deletions from.
+
+    Returns:
+        list: The NetSuite internal ids of the deleted items.
+
+    Raises:
+        SyncError: If the RESTlet call failed.
+    """
+    query = {
+        "procedure": "queryRun",
+        "query": f"SELECT deletedrecord.recordid AS id FROM deletedrecord WHERE deletedrecord.recordtype = 'inventoryitem' AND deletedrecord.deleteddate >= TO_DATE(?, '{WATERMARK_FORMAT}')",
+        "params": [since],
+    }
+    deleted = await process_data(query)
+    if deleted is None:
+        raise SyncError(f"Failed to fetch items deleted since {since}")
+    return [record['id'] for record in deleted.get('records', []) if record.get('id')]
+
+def download_logo(url, path):
+    """
+    Download a manufacturer logo into the logo directory.
+
+    The logo is written to a temporary file and renamed into place, so a
+    failed download never leaves a truncated logo behind.
+
+    Args:
+        url (str): The URL of the logo.
+        path (str): The file to save the logo to.
+
+    Returns:
+        bool: True if the logo was saved.
+    """
+    try:
+        response = http_client.get_default_client().get(url)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error(f"Failed to download logo {url}: {e}")
+        return False
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(response.content)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved logo {url} to {path}")
+    return True
+
+# Logo URL per company, the first word of the manufacturer name in lowercase
+COMPANY_LOGO_LINKS = {
+    "lumien": "https://i.imgur.com/cxcXM5J.png"
+}
+
+def company_name(manufacturer):
+    # Extract the first word from the manufacturer and lowercase it
+    return manufacturer.split()[0].lower() if manufacturer and manufacturer.strip() else None
+
+def ensure_logo(manufacturer):
+    """
+    Download a manufacturer's logo into the logo directory unless it is already there.
+
+    Args:
+        manufacturer (str): The manufacturer name as stored in NetSuite.
+
+    Returns:
+        bool: True if the logo is in the logo directory.
+    """
+    name = company_name(manufacturer)
+    logo_url = COMPANY_LOGO_LINKS.get(name)
+    if not logo_url:
+        return False
+    directory = os.path.join(file_utils.BASE_DIR, get_config()['content']['logo']['directory'])
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.png")
+    return os.path.exists(path) or download_logo(logo_url, path)
+
+def records_to_rows(records):
+    """
+    Convert NetSuite item records into item cache rows.
+
+    Args:
+        records (list): The records returned by the items query.
+
+    Returns:
+        list: The item dictionaries to upsert into the cache.
+    """
+    rows = []
+    for item in records:
+        image = item.get('item_img')
+        name = item.get('name')
+        description = item.get('description')
+        display_name = item.get('display_name')
+        item_name = display_name if display_name else name
+        manufacturer = item.get('manufacturer')
+        if item_name and image:
+            image_url = f"https://{os.getenv('NETSUITE_ACCOUNT')}.app.netsuite.com{image}"
+            company = company_name(manufacturer)
+            # Check if the company name exists in the logo links
+            if company in COMPANY_LOGO_LINKS:
+                company_logo_url = COMPANY_LOGO_LINKS[company]
+                if company_logo_url and display_name:
+                    rows.append({
+                        'name': display_name,
+                        'description': description,
+                        'company_img': company_logo_url,
+                        'item_img': image_url,
+                        'manufacturer': manufacturer,
+                        'netsuite_id': item.get('id'),
+                        'last_modified': item.get('last_modified'),
+                    })
+            else:
+                logger.info(f"No logo URL found for {company}")
+    return rows
+
+async def sync_manufacturer(manufacturer, full=False, semaphore=None):
+    """
+    Sync one manufacturer's items into the cache.
+
+    The items' id span is split into ranges of about ``netsuite.page_size`` items
+    that are fetched concurrently, with at most ``semaphore`` RESTlet calls in
+    flight. Each range is read in keyset pages ordered by id, and every page is
+    written to the cache as soon as it arrives.
+
+    Incremental syncs only ask NetSuite for items modified since the stored
+    watermark and mark items deleted or deactivated since then as stale. A full
+    sync fetches every item and marks cached items NetSuite no longer returns as stale.
+
+    The watermark only advances once every page was fetched and written to the
+    cache and the deletions were fetched; otherwise it stays where it was, so the
+    next sync asks for the same changes again.
+
+    Args:
+        manufacturer (str): The manufacturer name as stored in NetSuite.
+        full (bool): Ignore the watermark and fetch every item.
+        semaphore (asyncio.Semaphore): Limits concurrent RESTlet calls across manufacturers.
+
+    Raises:
+        SyncError: If a query failed or a page could not be written to the cache.
+    """
+    config = get_config()
+    semaphore = semaphore or asyncio.Semaphore(config['netsuite']['concurrency'])
+    page_size = config['netsuite']['page_size']
+    since = None if full else get_watermark(manufacturer)
+    logger.info(f"Syncing {manufacturer} items " + (f"modified since {since}" if since else "(full)"))
+    # Once per manufacturer, on a thread so the download does not block the other syncs
+    await asyncio.to_thread(ensure_logo, manufacturer)
+
+    async def fetch(query):
+        async with semaphore:
+            with metrics.span('netsuite.request'):
+                return await process_data(query)
+
+    bounds = await fetch(build_bounds_query(manufacturer, since))
+    if bounds is None:
+        raise SyncError(f"Failed to count {manufacturer} items. Watermark left at {since}")
+    bounds = (bounds.get('records') or [{}])[0]
+    total = int(bounds.get('total') or 0)
+
+    returned_ids = set()
+    stale_ids = []
+    modified = []
+    failed_pages = 0
+
+    async def sync_range(after_id, last_id):
+        # Keyset pages of one id range, each cached as soon as it arrives
+        nonlocal failed_pages
+        while True:
+            items = await fetch(build_items_query(manufacturer, since, after_id, last_id, page_size))
+            records = None if items is None else items.get('records') or []
+            if records is not None:
+                metrics.increment('netsuite.records_fetched', len(records))
+                # Caches the page in a single transaction
+                rows = records_to_rows(records)
+                if upsert_items(rows) != len(rows):
+                    records = None
+            if records is None:
+                # The range's remaining pages start after this one
+                failed_pages += 1
+                metrics.increment('netsuite.pages_failed')
+                return
+
+            # Deactivated items are stale
+            stale_ids.extend(record['id'] for record in records if record.get('is_inactive') == 'T')
+            returned_ids.update(int(record['id']) for record in records if record.get('id'))
+            modified.extend(record['last_modified'] for record in records if record.get('last_modified'))
+            if len(records) < page_size:
+                return
+            after_id = max(int(record['id']) for record in records)
+
+    if total:
+        # About one page per range, fetched concurrently; ranges holding more items are paged further
+        ranges = id_ranges(int(bounds['first_id']), int(bounds['last_id']), -(-total // page_size))
+        await asyncio.gather(*(sync_range(after_id, last_id) for after_id, last_id in ranges))
+
+    if failed_pages:
+        # Pages that failed may hold rows older than the newest one seen
+        mark_stale(stale_ids)
+        raise SyncError(f"{failed_pages} page(s) of {manufacturer} failed. Watermark left at {since}")
+
+    # Deleted items are stale too
+    if since:
+        async with semaphore:
+            stale_ids += await get_deleted_item_ids(since)
+    else:
+        stale_ids += [netsuite_id for netsuite_id in get_netsuite_ids(manufacturer) if netsuite_id not in returned_ids]
+    mark_stale(stale_ids)
+
+    if modified:
+        set_watermark(manufacturer, max(modified))
+    logger.info(f"Synced {len(returned_ids)} changed {manufacturer} items")
+
+async def get_items(full=False):
+    config = get_config()
     limit_results = ""
     if config['debug']['limit_netsuite_fetch_results']:
         limit_results = "FETCH FIRST 5 ROWS ONLY;"
         logger.warning(f"LIMIT RESULTS = {limit_results}")
         return
     
-    vendors = ["LUMIEN LIGHTING", "WAC"]
-    query = {
-        "procedure": "queryRun",
-        "query": f"SELECT item.id AS id, item.itemid AS name, item.displayName AS display_name, item.purchasedescription as description, item.manufacturer AS manufacturer, item.custitem_jls_item_image_url AS item_img FROM item WHERE item.manufacturer = ? {limit_results}",
-        "params": [vendors[1]],
-    }
-    items = await process_data(query)
-    # Ensure the path is correct and exists
-    item_image_directory = os.path.join('input', 'images', 'items')
-    os.makedirs(item_image_directory, exist_ok=True)
-    company_image_directory = os.path.join('input', 'images', 'companies')
-    os.makedirs(company_image_directory, exist_ok=True)
-    records = items.get('records')
-    if records:
-        for item in records:
-            image = item.get('item_img')
-            name = item.get('name')
-            description = item.get('description')
-            display_name = item.get('display_name')
-            item_name = display_name if display_name else name
-            manufacturer = item.get('manufacturer')
-            if item_name and image:
-                image_url = f"https://{account}.app.netsuite.com{image}"
-                # Extract the first word from the manufacturer and lowercase it
-                company_name = manufacturer.split()[0].lower()
-                # Check if there is a file with the company name in the company image directory
-                company_image_path = os.path.join(company_image_directory, f"{company_name}.png")                
-                company_logo_links = {
-                    "lumien": "https://i.imgur.com/cxcXM5J.png"
-                }
-                # Check if the company name exists in manufacturer_logo_links
-                if company_name in company_logo_links:
-                    company_logo_url = company_logo_links[company_name]                                     
-                    if company_logo_url and display_name:
-                    # Caches the item
-                        insert_item(
-                            name=display_name,
-                            description=description,
-                            company_img_url=company_logo_url,
-                            item_img_url=image_url,
-                            manufacturer=manufacturer
-                        )                         
-                else:
-                    logger.info(f"No logo URL found for {company_name}")
\ No newline at end of file
+    # One semaphore bounds the RESTlet calls of every manufacturer
+    semaphore = asyncio.Semaphore(config['netsuite']['concurrency'])
+    manufacturers = config['netsuite']['manufacturers']
+    with metrics.span('netsuite.sync'):
+        # A failed manufacturer does not stop the others
+        results = await asyncio.gather(*(
+            sync_manufacturer(manufacturer, full=full, semaphore=semaphore)
+            for manufacturer in manufacturers
+        ), return_exceptions=True)
+    failed = [(manufacturer, result) for manufacturer, result in zip(manufacturers, results) if isinstance(result, Exception)]
+    for manufacturer, error in failed:
+        logger.error(f"Sync of {manufacturer} failed: {error}")
+    if failed:
+        raise SyncError(f"Sync failed for {', '.join(manufacturer for manufacturer, _ in failed)}")
@@ -0,0 +1,228 @@
+"""
+Shared HTTP client for image and logo downloads.
+
+One pooled ``requests.Session`` is reused for every request, so connections
+are kept alive between downloads. Requests to the same host are capped by a
+per-host semaphore (NetSuite throttles concurrent requests to the account's
+file cabinet). Connection errors, timeouts and 429/5xx responses are retried
+with jittered exponential backoff, and a host that keeps failing trips a
+circuit breaker, so later requests fail fast instead of each waiting out its
+retries.
+"""
+import fnmatch
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+
+from . import file_utils
+from . import metrics
+
+# Responses that are worth retrying
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without sending a request while a host's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures of one host.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    requests are refused for ``reset_timeout`` seconds. Then one trial request
+    is let through: success closes the breaker, failure opens it again.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_timeout (float): Seconds the breaker stays open.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Return True if a request may be sent.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: let one trial request through and hold the others back
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class HttpClient:
+    """
+    Pooled HTTP client with per-host limits, retries and circuit breaking.
+
+    ``get`` takes the same arguments as ``requests.Session.get``, so the client
+    can stand in for a session.
+
+    Args:
+        pool_size (int): Connections kept alive per host.
+        per_host_limit (int): Requests in flight per host, unless host_limits says otherwise.
+        host_limits (dict): Limits for hosts matching glob patterns, e.g. ``{'*.netsuite.com': 2}``.
+        retries (int): Retries after the first attempt.
+        backoff (float): Base delay in seconds; attempt n waits up to backoff * 2**n.
+        max_backoff (float): Upper bound of a single delay in seconds.
+        timeout (float): Default request timeout in seconds.
+        failure_threshold (int): Consecutive failed requests that open a host's circuit breaker.
+        reset_timeout (float): Seconds a host's circuit breaker stays open.
+        session (requests.Session): The session to send requests with.
+    """
+
+    def __init__(self, pool_size=8, per_host_limit=8, host_limits=None, retries=3, backoff=0.5,
+                 max_backoff=10, timeout=10, failure_threshold=5, reset_timeout=30, session=None):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.per_host_limit = per_host_limit
+        self.host_limits = host_limits or {}
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._breakers = {}
+
+    def _host_state(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                limit = next(
+                    (limit for pattern, limit in self.host_limits.items() if fnmatch.fnmatch(host, pattern)),
+                    self.per_host_limit,
+                )
+                self._semaphores[host] = threading.BoundedSemaphore(limit)
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._semaphores[host], self._breakers[host]
+
+    def _delay(self, attempt, response=None):
+        # Honour the server's Retry-After on throttling, otherwise use full jitter
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        """
+        Send a GET request, retrying transient failures.
+
+        Args:
+            url (str): The URL to fetch.
+            headers (dict): Request headers.
+            timeout (float): Request timeout in seconds. Defaults to the client's timeout.
+            **kwargs: Further arguments for ``requests.Session.get``.
+
+        Returns:
+            requests.Response: The response. After the last retry this may still be
+                a 429 or 5xx response, for the caller's ``raise_for_status``.
+
+        Raises:
+            CircuitOpenError: If the host's circuit breaker is open.
+            requests.RequestException: If the last attempt failed without a response.
+        """
+        host = urlsplit(url).netloc
+        semaphore, breaker = self._host_state(host)
+        if not breaker.allow():
+            metrics.increment('http.circuit_open')
+            raise CircuitOpenError(f"Circuit breaker open for {host}")
+
+        for attempt in range(self.retries + 1):
+            response = error = None
+            with semaphore:
+                try:
+                    response = self.session.get(url, headers=headers, timeout=timeout or self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                breaker.success()
+                return response
+            if attempt == self.retries:
+                break
+            delay = self._delay(attempt, response)
+            metrics.increment('http.retries')
+            logger.debug(f"Retrying {url} in {delay:.2f}s after {error or response.status_code}")
+            time.sleep(delay)
+
+        breaker.failure()
+        metrics.increment('http.failures')
+        if response is not None:
+            return response
+        raise error
+
+
+def client_from_config(config):
+    """
+    Build an HttpClient from the ``http`` section of the configuration.
+
+    Args:
+        config (dict): The configuration dictionary.
+
+    Returns:
+        HttpClient: The configured client.
+    """
+    http_config = config.get('http', {})
+    # Keep enough pooled connections for every prefetch worker
+    pool_size = http_config.get('pool_size', config.get('prefetch', {}).get('max_workers', 8))
+    return HttpClient(
+        pool_size=pool_size,
+        per_host_limit=http_config.get('per_host_limit', pool_size),
+        host_limits=http_config.get('host_limits'),
+        retries=http_config.get('retries', 3),
+        backoff=http_config.get('backoff_seconds', 0.5),
+        max_backoff=http_config.get('max_backoff_seconds', 10),
+        timeout=http_config.get('timeout', 10),
+        failure_threshold=http_config.get('failure_threshold', 5),
+        reset_timeout=http_config.get('reset_seconds', 30),
+    )
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client(config=None):
+    """
+    Return the process-wide HTTP client, creating it from the configuration on first use.
+
+    Args:
+        config (dict): The configuration to build the client from. Defaults to data/config.json.
+
+    Returns:
+        HttpClient: The shared client.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = client_from_config(config or file_utils.load_config())
+        return _default_client
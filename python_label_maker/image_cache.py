@@ -0,0 +1,413 @@
+"""
+Persistent, content-addressed cache for product images.
+
+Image bytes are stored once per unique content hash under ``blobs/`` and an
+``index.json`` maps each source URL to its blob together with the validators
+(ETag / Last-Modified) returned by the server. Entries are revalidated with
+conditional requests once they are older than ``max_age`` and the least
+recently used blobs are evicted, together with their print derivatives, when
+the cache grows past ``max_bytes``.
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+from loguru import logger
+
+from . import derivatives
+from . import file_utils
+from . import http_client
+from . import metrics
+
+INDEX_FILENAME = 'index.json'
+BLOB_DIRNAME = 'blobs'
+
+# Fraction of max_bytes the cache is trimmed to once it goes over budget
+EVICT_TO = 0.9
+
+
+class ImageCache:
+    """
+    On-disk image cache keyed by URL plus ETag/Last-Modified.
+
+    Index changes are kept in memory and written to ``index.json`` every
+    ``flush_every`` new entries, by an explicit ``flush()`` at the end of a
+    render, and at exit. Disk I/O happens outside the lock, so concurrent
+    downloads do not wait on each other.
+
+    Args:
+        directory (str | Path): Root directory of the cache.
+        max_bytes (int): Upper bound for the total size of cached blobs.
+        max_age (float): Seconds an entry is served without revalidation.
+        offline (bool): When True, never touch the network and serve cached bytes only.
+        session (HttpClient | requests.Session): Client used for downloads. Defaults to a
+            new HttpClient with retries and per-host limits.
+        timeout (float): Request timeout in seconds.
+        derivative_directory (str | Path): Where print-ready derivatives of the cached
+            images are stored. Defaults to a ``derivatives`` directory next to the cache.
+        flush_every (int): Number of new entries after which the index is written to disk.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_age=86400,
+                 offline=False, session=None, timeout=10, derivative_directory=None,
+                 flush_every=500):
+        self.directory = Path(directory)
+        self.derivative_directory = Path(derivative_directory or self.directory.parent / 'derivatives')
+        self.blob_directory = self.directory / BLOB_DIRNAME
+        self.index_path = self.directory / INDEX_FILENAME
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.offline = offline
+        self.session = session or http_client.HttpClient(timeout=timeout)
+        self.timeout = timeout
+        self.flush_every = flush_every
+        self._lock = threading.RLock()
+        # Serializes flushes, which read and write the index without holding _lock
+        self._flush_lock = threading.Lock()
+        self._removed = set()
+        self._dirty = False
+        self._pending = 0
+        # Number of URLs per blob digest and the running size of the unique blobs
+        self._references = {}
+        self._total_bytes = 0
+        self.blob_directory.mkdir(parents=True, exist_ok=True)
+        self._index = {}
+        for url, entry in self._read_index().items():
+            self._add(url, entry)
+
+    def get(self, url):
+        """
+        Return the bytes for an image URL, downloading or revalidating as needed.
+
+        Args:
+            url (str): The URL of the image.
+
+        Returns:
+            bytes: The image content, or None if it is not cached in offline mode.
+
+        Raises:
+            requests.RequestException: If the download fails and no cached copy exists.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            entry = dict(entry) if entry else None
+        data = self._read_blob(entry) if entry else None
+        if entry and data is None:
+            # The blob vanished from disk; forget the entry and refetch
+            with self._lock:
+                current = self._index.get(url)
+                if current and current['digest'] == entry['digest']:
+                    self._forget(url)
+            entry = None
+
+        if self.offline:
+            if data is not None:
+                self._touch(url)
+            metrics.increment('image_cache.hits' if data is not None else 'image_cache.misses')
+            return data
+
+        if data is not None and time.time() - entry['fetched_at'] < self.max_age:
+            self._touch(url)
+            metrics.increment('image_cache.hits')
+            return data
+        metrics.increment('image_cache.revalidations' if data is not None else 'image_cache.misses')
+
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            with metrics.span('image.download'):
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and data is not None:
+                with self._lock:
+                    current = self._index.get(url)
+                    if current:
+                        current['fetched_at'] = time.time()
+                    self._touch(url)
+                return data
+            response.raise_for_status()
+        except requests.RequestException as e:
+            metrics.increment('image.downloads_failed')
+            if data is not None:
+                logger.warning(f"Serving stale cached image for {url}: {str(e)}")
+                self._touch(url)
+                return data
+            raise
+
+        metrics.increment('image.bytes_downloaded', len(response.content))
+        self.put(url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.content
+
+    def put(self, url, data, etag=None, last_modified=None):
+        """
+        Store image bytes for a URL and evict old blobs if the cache is over budget.
+
+        Args:
+            url (str): The URL the bytes were downloaded from.
+            data (bytes): The image content.
+            etag (str): The ETag response header, if any.
+            last_modified (str): The Last-Modified response header, if any.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not blob_path.exists():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob_path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+
+        now = time.time()
+        with self._lock:
+            replaced = self._add(url, {
+                'digest': digest,
+                'size': len(data),
+                'etag': etag,
+                'last_modified': last_modified,
+                'fetched_at': now,
+                'accessed_at': now,
+            })
+            self._removed.discard(url)
+            self._dirty = True
+            self._pending += 1
+            evicted = self._evict()
+            flush = self._pending >= self.flush_every
+        # A blob no URL references anymore, because its URL now has other content, goes too
+        self._delete_blobs(evicted + [replaced] if replaced else evicted)
+        if flush:
+            self.flush()
+
+    def entry(self, url):
+        """
+        Return the index entry (digest, validators, timestamps) for a URL.
+
+        Args:
+            url (str): The URL of the image.
+
+        Returns:
+            dict: A copy of the index entry, or None if the URL is not cached.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            return dict(entry) if entry else None
+
+    def is_fresh(self, url):
+        """
+        Return True if a URL is cached and would be served without revalidation.
+
+        Args:
+            url (str): The URL of the image.
+
+        Returns:
+            bool: False if the URL is not cached or its entry is older than ``max_age``.
+                  Every cached entry is fresh in offline mode.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            return bool(entry) and (self.offline or time.time() - entry['fetched_at'] < self.max_age)
+
+    def path(self, url):
+        """
+        Return the path of the cached file holding a URL's image.
+
+        Args:
+            url (str): The URL of the image.
+
+        Returns:
+            Path: The content-addressed blob, or None if the URL is not cached.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            return self._blob_path(entry['digest']) if entry else None
+
+    def total_bytes(self):
+        """
+        Return the size of all unique blobs referenced by the index.
+        """
+        return self._total_bytes
+
+    def flush(self):
+        """
+        Write pending index changes to disk, merging with entries written by other processes.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                index = {url: dict(entry) for url, entry in self._index.items()}
+                removed = self._removed
+                self._removed = set()
+                self._dirty = False
+                self._pending = 0
+
+            try:
+                on_disk = self._read_index()
+                for url in removed:
+                    on_disk.pop(url, None)
+                for url, entry in index.items():
+                    current = on_disk.get(url)
+                    if not current or current['fetched_at'] <= entry['fetched_at']:
+                        on_disk[url] = entry
+
+                tmp_path = self.index_path.with_suffix(f'.{os.getpid()}.tmp')
+                with open(tmp_path, 'w') as f:
+                    json.dump(on_disk, f)
+                os.replace(tmp_path, self.index_path)
+            except Exception:
+                with self._lock:
+                    # Keep the changes pending for the next flush
+                    self._removed |= removed - set(self._index)
+                    self._dirty = True
+                raise
+
+            with self._lock:
+                # Adopt entries written by other processes, unless forgotten here meanwhile
+                for url, entry in on_disk.items():
+                    if url not in self._index and url not in self._removed:
+                        self._add(url, entry)
+
+    def _add(self, url, entry):
+        # Replace the entry for a URL, keeping the blob references and byte total current;
+        # returns the digest of a replaced blob no other URL references
+        replaced = self._remove(url)
+        self._index[url] = entry
+        references = self._references.get(entry['digest'], 0)
+        if references == 0:
+            self._total_bytes += entry['size']
+        self._references[entry['digest']] = references + 1
+        return replaced
+
+    def _remove(self, url):
+        # Drop the entry for a URL; returns the digest if no other URL references its blob
+        entry = self._index.pop(url, None)
+        if entry is None:
+            return None
+        references = self._references[entry['digest']] - 1
+        if references:
+            self._references[entry['digest']] = references
+            return None
+        del self._references[entry['digest']]
+        self._total_bytes -= entry['size']
+        return entry['digest']
+
+    def _evict(self):
+        # Drop least recently used URLs until the unique blobs fit the budget with some headroom,
+        # so a full cache does not sort the index on every put; returns the blobs to delete
+        if self._total_bytes <= self.max_bytes:
+            return []
+        target = self.max_bytes * EVICT_TO
+        evicted = []
+        for url, entry in sorted(self._index.items(), key=lambda kv: kv[1]['accessed_at']):
+            if self._total_bytes <= target:
+                break
+            digest = self._forget(url)
+            if digest:
+                # Only delete the blob once no other URL shares its content
+                evicted.append(digest)
+            logger.info(f"Evicted cached image: {url}")
+        return evicted
+
+    def _delete_blobs(self, digests):
+        for digest in digests:
+            with self._lock:
+                if digest in self._references:
+                    # Stored again by another thread meanwhile
+                    continue
+            self._blob_path(digest).unlink(missing_ok=True)
+            # Derivatives are named after the blob's digest and are not counted against max_bytes
+            derivatives.delete_derivatives(self.derivative_directory, digest)
+
+    def _forget(self, url):
+        digest = self._remove(url)
+        self._removed.add(url)
+        self._dirty = True
+        return digest
+
+    def _touch(self, url):
+        with self._lock:
+            entry = self._index.get(url)
+            if entry:
+                entry['accessed_at'] = time.time()
+                self._dirty = True
+
+    def _blob_path(self, digest):
+        return self.blob_directory / digest[:2] / digest
+
+    def _read_blob(self, entry):
+        try:
+            with open(self._blob_path(entry['digest']), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            logger.warning(f"Image cache index at {self.index_path} is corrupt. Starting empty.")
+            return {}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def cache_from_config(config):
+    """
+    Build an ImageCache from the ``image_cache`` section of the configuration.
+
+    Args:
+        config (dict): The configuration dictionary.
+
+    Returns:
+        ImageCache: The configured cache.
+    """
+    cache_config = config.get('image_cache', {})
+    directory = Path(cache_config.get('directory', 'input/images/items'))
+    if not directory.is_absolute():
+        directory = file_utils.BASE_DIR / directory
+    derivative_directory = cache_config.get('derivative_directory')
+    if derivative_directory:
+        derivative_directory = file_utils.BASE_DIR / derivative_directory
+
+    return ImageCache(
+        directory,
+        max_bytes=int(cache_config.get('max_megabytes', 512) * 1024 * 1024),
+        max_age=cache_config.get('max_age_seconds', 86400),
+        offline=cache_config.get('offline', False),
+        session=http_client.get_default_client(config),
+        timeout=cache_config.get('timeout', 10),
+        derivative_directory=derivative_directory,
+        flush_every=cache_config.get('flush_every', 500),
+    )
+
+
+def get_default_cache(config=None):
+    """
+    Return the process-wide image cache, creating it from the configuration on first use.
+
+    Args:
+        config (dict): The configuration to build the cache from. Defaults to data/config.json.
+
+    Returns:
+        ImageCache: The shared cache.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = cache_from_config(config or file_utils.load_config())
+            # Persist access times recorded by cache hits
+            atexit.register(_default_cache.flush)
+        return _default_cache
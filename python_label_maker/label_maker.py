@@ -1,14 +1,18 @@
 import os
 import json
-from reportlab.lib.pagesizes import letter
+import hashlib
 from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
 from PIL import Image, UnidentifiedImageError
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from textwrap import wrap
-from .db import get_cached_items
-from icecream import ic
+from itertools import islice
+from . import image_cache
+from . import assets
+from . import text_layout
+from . import derivatives
+from . import metrics
+from . import barcodes
+from . import http_client
+from .fonts import register_fonts, cache_directory as font_cache_directory
+from .plan import inches_to_points, get_plan
 from loguru import logger
 import requests
 from io import BytesIO
@@ -23,30 +27,7 @@ def load_config():
     with open('data/config.json', 'r') as f:
         return json.load(f)
 
-def inches_to_points(inches):
-    """
-    Convert inches to points.
-
-    Args:
-        inches (float): The value in inches.
-
-    Returns:
-        float: The value in points.
-    """
-    return inches * 72
-
-def register_fonts(fonts):
-    """
-    Register custom fonts for use in the PDF.
-
-    Args:
-        fonts (dict): A dictionary of font configurations.
-    """
-    for font in fonts.values():
-        font_path = os.path.join(os.path.dirname(__file__), '..', font['file'])
-        pdfmetrics.registerFont(TTFont(font['name'], font_path))
-
-def draw_label_border(c, x, y, width, height, config):
+def draw_label_border(c, x, y, plan):
     """
     Draw a border around the label.
 
@@ -54,17 +35,15 @@ def draw_label_border(c, x, y, width, height, config):
         c (canvas.Canvas): The ReportLab canvas object.
         x (float): The x-coordinate of the label.
         y (float): The y-coordinate of the label.
-        width (float): The width of the label.
-        height (float): The height of the label.
-        config (dict): The configuration dictionary.
+        plan (LabelPlan): The compiled label plan.
     """
-    c.setStrokeColorRGB(*config['debug']['border_color'])
-    c.setLineWidth(config['debug']['border_width'])
-    c.rect(x, y, width, height, stroke=1, fill=0)
+    c.setStrokeColorRGB(*plan.border.color)
+    c.setLineWidth(plan.border.width)
+    c.rect(x, y, plan.label_width, plan.label_height, stroke=1, fill=0)
     c.setStrokeColorRGB(0, 0, 0)
     c.setFillColorRGB(0, 0, 0)
 
-def draw_product_code(c, x, y, label_width, label_height, config, item):
+def draw_product_code(c, x, y, plan, item):
     """
     Draw the product code on the label.
 
@@ -72,19 +51,18 @@ def draw_product_code(c, x, y, label_width, label_height, config, item):
         c (canvas.Canvas): The ReportLab canvas object.
         x (float): The x-coordinate of the label.
         y (float): The y-coordinate of the label.
-        label_width (float): The width of the label.
-        label_height (float): The height of the label.
-        config (dict): The configuration dictionary.
+        plan (LabelPlan): The compiled label plan.
         item (dict): The item dictionary containing the product information.
     """
-    product_code_config = config['content']['product_code']
-    c.setFont(product_code_config['font'], product_code_config['size'])
+    product_code_plan = plan.product_code
+    c.setFont(product_code_plan.font, product_code_plan.size)
+    c.setFillColorRGB(*product_code_plan.color)
     product_code = item['name']
-    text_width = c.stringWidth(product_code, product_code_config['font'], product_code_config['size'])
-    text_x = x + (label_width - text_width) / 2
-    c.drawString(text_x, y + label_height - product_code_config['size'] - 5, product_code)
+    text_width = c.stringWidth(product_code, product_code_plan.font, product_code_plan.size)
+    text_x = x + (plan.label_width - text_width) / 2
+    c.drawString(text_x, y + product_code_plan.baseline_offset, product_code)
 
-def draw_label(c, x, y, label_width, label_height, config, item):
+def draw_label(c, x, y, plan, item, images=None):
     """
     Draw a complete label with background image and centered description.
 
@@ -92,59 +70,91 @@ def draw_label(c, x, y, label_width, label_height, config, item):
         c (canvas.Canvas): The ReportLab canvas object.
         x (float): The x-coordinate of the label.
         y (float): The y-coordinate of the label.
-        label_width (float): The width of the label.
-        label_height (float): The height of the label.
-        config (dict): The configuration dictionary.
+        plan (LabelPlan): The compiled label plan.
         item (dict): The item dictionary containing the product information.
+        images (dict): Optional prefetched images keyed by URL.
     """
     # Draw background image
-    draw_background_image(c, x, y, label_width, label_height, config, item)
+    draw_background_image(c, x, y, plan, item, images)
     
     # Draw product code
-    draw_product_code(c, x, y, label_width, label_height, config, item)
-    
-    # Calculate the space left for the description
-    image_height = label_height * config['content']['image']['height_percentage']
-    product_code_height = config['content']['product_code']['size'] + 5
-    description_space = label_height - image_height - product_code_height - inches_to_points(0.2)  # 0.2 inches padding
+    draw_product_code(c, x, y, plan, item)
     
     # Draw centered description
-    draw_centered_description(c, x, y, label_width, label_height, config, item)
+    draw_centered_description(c, x, y, plan, item)
+
+    # Draw barcode if enabled
+    if plan.barcode.enabled:
+        draw_item_barcode(c, x, y, plan, item)
     
     # Draw label border if debug is enabled
-    if config['debug']['draw_borders']:
-        draw_label_border(c, x, y, label_width, label_height, config)
+    if plan.border.enabled:
+        draw_label_border(c, x, y, plan)
+
+@metrics.timed('draw.barcode')
+def draw_item_barcode(c, x, y, plan, item):
+    """
+    Draw the barcode of the item's configured field on the label.
+
+    Args:
+        c (canvas.Canvas): The ReportLab canvas object.
+        x (float): The x-coordinate of the label.
+        y (float): The y-coordinate of the label.
+        plan (LabelPlan): The compiled label plan.
+        item (dict): The item dictionary containing the product information.
+    """
+    barcode_plan = plan.barcode
+    value = barcodes.barcode_value(item, barcode_plan.field)
+    if value is None:
+        return
+    c.setFillColorRGB(0, 0, 0)
+    barcodes.draw_barcode(
+        c, barcode_plan.symbology, value, x + barcode_plan.x_offset, y + barcode_plan.y_offset,
+        barcode_plan.width, barcode_plan.height,
+    )
 
-def process_image(image_url, max_width, max_height):
+@metrics.timed('image.prepare')
+def process_image(image_url, max_width, max_height, cache=None, dpi=300, jpeg_quality=85):
     """
-    Process an image from a URL, resizing it to fit within the given dimensions.
+    Prepare an image from a URL for printing within the given dimensions.
+
+    The image bytes are served from the on-disk image cache, which only goes to
+    the network for new URLs or when a cached entry needs revalidation. The image
+    is scaled once to the pixel size it prints at for ``dpi`` and stored as a
+    derivative next to the cache; later calls reuse the prepared file.
 
     Args:
         image_url (str): The URL of the image.
         max_width (float): The maximum width in points.
         max_height (float): The maximum height in points.
+        cache (ImageCache): The image cache to read from. Defaults to the shared cache.
+        dpi (int): The print resolution in dots per inch.
+        jpeg_quality (int): The JPEG quality for photographic images.
 
     Returns:
-        tuple: A tuple containing the processed image and its dimensions (img, width, height),
-               or None if the image couldn't be processed.
+        tuple: A tuple containing the path to the prepared image and its drawn size
+               in points (path, width, height), or (None, 0, 0) if the image couldn't
+               be processed.
     """
+    cache = cache or image_cache.get_default_cache()
     try:
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        img = Image.open(BytesIO(response.content))
-        img_width, img_height = img.size
-        aspect = img_height / float(img_width)
-
-        new_width = min(max_width, img_width)
-        new_height = new_width * aspect
-
-        if new_height > max_height:
-            new_height = max_height
-            new_width = new_height / aspect
-
-        img = img.resize((int(new_width), int(new_height)), Image.LANCZOS)
-        return img, new_width, new_height
+        image_data = cache.get(image_url)
+        if image_data is None:
+            logger.warning(f"Image not cached and offline mode is enabled: {image_url}")
+            return None, 0, 0
+
+        # Opening an image only reads its header; pixels are decoded when a derivative is written
+        img = Image.open(BytesIO(image_data))
+        new_width, new_height = derivatives.display_size(img.size, max_width, max_height)
+        size = derivatives.pixel_size(img.size, new_width, new_height, dpi)
+
+        entry = cache.entry(image_url)
+        digest = entry['digest'] if entry else hashlib.sha256(image_data).hexdigest()
+        path = derivatives.find_derivative(cache.derivative_directory, digest, size)
+        if path is None:
+            path = derivatives.write_derivative(img, cache.derivative_directory, digest, size, jpeg_quality)
+            metrics.increment('image.derivatives_written')
+        return path, new_width, new_height
     except requests.RequestException as e:
         logger.error(f"Error fetching image from {image_url}: {str(e)}")
     except UnidentifiedImageError:
@@ -152,9 +162,11 @@ def process_image(image_url, max_width, max_height):
     except Exception as e:
         logger.error(f"Error processing image from {image_url}: {str(e)}")
     
+    metrics.increment('image.failed')
     return None, 0, 0
 
-def draw_background_image(c, x, y, label_width, label_height, config, item):
+@metrics.timed('draw.images')
+def draw_background_image(c, x, y, plan, item, images=None):
     """
     Draw the company logo aligned to the bottom-right of the label with padding and the product image aligned to the far-left middle of the label.
 
@@ -162,158 +174,168 @@ def draw_background_image(c, x, y, label_width, label_height, config, item):
         c (canvas.Canvas): The ReportLab canvas object.
         x (float): The x-coordinate of the label.
         y (float): The y-coordinate of the label.
-        label_width (float): The width of the label.
-        label_height (float): The height of the label.
-        config (dict): The configuration dictionary.
+        plan (LabelPlan): The compiled label plan.
         item (dict): The item dictionary containing the product information.
+        images (dict): Optional prefetched images keyed by URL, as returned by prefetch_images.
     """
     # Draw company logo as background
-    company_img_path = os.path.join('input', 'images', 'companies', 'lumien.jpg')
-    if os.path.exists(company_img_path):
+    company_img_path = assets.logo_path(item, plan.logo.directory, plan.logo.default)
+    if company_img_path:
         try:
-            company_img = Image.open(company_img_path)
-            
-            # Add padding (in inches)
-            padding = inches_to_points(0.1)  # 0.1 inches of padding, adjust as needed
-            
-            # Calculate the target width (2.5 inches or 60% of label width, whichever is smaller)
-            target_width = min(inches_to_points(2), label_width * 0.6) - (2 * padding)
-            
-            # Calculate the aspect ratio of the original image
-            aspect_ratio = company_img.height / company_img.width
-            
-            # Calculate the new dimensions
-            new_width = target_width
-            new_height = new_width * aspect_ratio
-            
-            # Resize the image
-            company_img = company_img.resize((int(new_width), int(new_height)), Image.LANCZOS)
-            
-            # Align the background image to the bottom-right with padding
-            bg_x = x + label_width - new_width - padding
-            bg_y = y + padding
-            
-            # Draw the background image with reduced opacity
+            # Draw the background image with reduced opacity. The logo is decoded,
+            # resized and embedded once per document and reused by every label.
             c.saveState()
             c.setFillAlpha(1)  # Adjust this value to change the background opacity
-            c.drawImage(ImageReader(company_img), bg_x, bg_y, width=new_width, height=new_height)
+            assets.draw_logo(c, company_img_path, x + plan.logo.x_offset, y + plan.logo.y_offset, plan.logo.width)
             c.restoreState()
         except Exception as e:
             logger.error(f"Error processing company image: {str(e)}")
     else:
-        logger.warning(f"Company image not found at {company_img_path}")
+        logger.warning(f"Company image not found for manufacturer: {item.get('manufacturer', 'Unknown')}")
 
     # Draw product image
     product_img_url = item.get('item_img')
     if product_img_url:
-        product_img, img_width, img_height = process_image(
-            product_img_url,
-            inches_to_points(config['content']['image']['max_width']),
-            label_height * config['content']['image']['height_percentage']
-        )
+        if images is not None and product_img_url in images:
+            product_img, img_width, img_height = images[product_img_url]
+        else:
+            product_img, img_width, img_height = process_image(
+                product_img_url,
+                plan.image.max_width,
+                plan.image.max_height,
+                dpi=plan.image.dpi,
+                jpeg_quality=plan.image.jpeg_quality
+            )
         
         if product_img:
             # Align the product image to the far-left
-            img_x = x + config['content']['image']['padding']
+            img_x = x + plan.image.x_offset
             
             # Center the product image vertically
-            img_y = y + (label_height - img_height) / 2
+            img_y = y + (plan.label_height - img_height) / 2
             
-            c.drawImage(ImageReader(product_img), img_x, img_y, width=img_width, height=img_height)
+            c.drawImage(product_img, img_x, img_y, width=img_width, height=img_height)
         else:
             logger.warning(f"Failed to process product image for item: {item.get('name', 'Unknown')}")
     else:
         logger.warning(f"No product image URL provided for item: {item.get('name', 'Unknown')}")
 
-def draw_centered_description(c, x, y, label_width, label_height, config, item):
-    desc_config = config['content']['description']
-    c.setFont(desc_config['font'], desc_config['size'])
-    description = item.get('description', '')  # Use an empty string as default if description is None
+@metrics.timed('draw.description')
+def draw_centered_description(c, x, y, plan, item):
+    """
+    Draw the item description as a block of lines centered on the label.
 
-    # Set the width to 2.5 inches
-    desc_width = inches_to_points(2.5)
-    
-    # Add horizontal padding
-    horizontal_padding = inches_to_points(desc_config['horizontal_padding'])
-    
-    # Calculate the starting x-coordinate to center the description container
-    container_start_x = x + (label_width - desc_width) / 2
+    The text is wrapped with the font's real metrics and shrunk down to
+    ``description.min_size`` if it does not fit between the product code and
+    the bottom of the label.
+
+    Args:
+        c (canvas.Canvas): The ReportLab canvas object.
+        x (float): The x-coordinate of the label.
+        y (float): The y-coordinate of the label.
+        plan (LabelPlan): The compiled label plan.
+        item (dict): The item dictionary containing the product information.
+    """
+    desc_plan = plan.description
+    description = item.get('description', '')  # Use an empty string as default if description is None
 
     if description:  # Only wrap and draw if description is not empty
-        # Wrap the text to fit the new width (accounting for padding)
-        wrapped_desc = wrap(description, width=int((desc_width - 2 * horizontal_padding) / (desc_config['size'] / 2)))
+        # Wrap the text to fit the container width, shrinking it if needed
+        font_size, wrapped_desc = text_layout.fit_text(
+            description,
+            desc_plan.font,
+            desc_plan.size,
+            desc_plan.width,
+            desc_plan.height,
+            desc_plan.min_size,
+            desc_plan.line_spacing,
+        )
+        c.setFont(desc_plan.font, font_size)
+        c.setFillColorRGB(*desc_plan.color)
 
         # Calculate the total height of the wrapped text
-        line_height = desc_config['size'] + 2  # Add 2 for line spacing
+        line_height = font_size + desc_plan.line_spacing
         text_height = len(wrapped_desc) * line_height
 
-        # Calculate the vertical center of the label
-        label_center_y = y + label_height / 2
-
-        # Calculate the starting y-coordinate to vertically center the text container
-        start_y = label_center_y + text_height / 2
+        # Place the first baseline so the block of lines is vertically centered
+        start_y = y + desc_plan.center_offset + text_height / 2 - font_size
 
-        # Draw each line of the wrapped description
+        # Draw each line of the wrapped description, left-aligned within the container
+        line_x = x + desc_plan.x_offset
         for i, line in enumerate(wrapped_desc):
-            line_x = container_start_x + horizontal_padding  # Left-align within the container
             c.drawString(line_x, start_y - i * line_height, line)
     else:
         logger.warning(f"No description available for item: {item.get('name', 'Unknown')}")
 
-def get_image_dimensions(image_url):
+def get_image_dimensions(image_url, timeout=10):
     """
     Fetch an image from a URL and return its dimensions.
 
     Args:
         image_url (str): The URL of the image.
+        timeout (float): Request timeout in seconds.
 
     Returns:
         tuple: A tuple containing the width and height of the image.
     """
-    response = requests.get(image_url)
+    response = http_client.get_default_client().get(image_url, timeout=timeout)
+    response.raise_for_status()
     img = Image.open(BytesIO(response.content))
     return img.size
 
-def create_label_pdf(config, items):
+@metrics.timed('pdf.create')
+def create_label_pdf(config, items, images=None, out=None):
     """
     Create a PDF file with labels based on the provided configuration and items.
 
+    Items are consumed one page at a time, so ``items`` can be a generator that
+    streams a whole catalog into a single document. Fonts and logos are embedded
+    once and shared by every page.
+
     Args:
         config (dict): The configuration dictionary.
-        items (list): A list of item dictionaries to create labels for.
+        items (iterable): The item dictionaries to create labels for.
+        images (dict | callable): Optional prefetched images keyed by URL, or a callable
+            that takes the items of one page and returns such a mapping. Images missing
+            from the mapping are fetched while drawing.
+        out (file): Optional binary file object, e.g. BytesIO, to write the PDF to
+            instead of ``output.filename``.
 
     Returns:
-        str: The path to the created PDF file.
+        str | file: The path to the created PDF file, or ``out``.
     """
-    page_width, page_height = letter
-    label_width = inches_to_points(config['label']['width'])
-    label_height = inches_to_points(config['label']['height'])
-    
-    x_margin = inches_to_points(config['layout']['left_margin'])
-    y_margin = inches_to_points(config['layout']['top_margin'])
-    x_gap = inches_to_points(config['layout']['horizontal_spacing'])
-    y_gap = inches_to_points(config['layout']['vertical_spacing'])
+    # Geometry is compiled once; drawing only fills in per-item data
+    plan = get_plan(config)
     
-    columns, rows = config['layout']['columns'], config['layout']['rows']
+    register_fonts(config['fonts'], font_cache_directory(config))
     
-    register_fonts(config['fonts'])
+    target = config['output']['filename'] if out is None else out
+    c = canvas.Canvas(target, pagesize=plan.page_size)
     
-    c = canvas.Canvas(config['output']['filename'], pagesize=letter)
-    
-    for index, item in enumerate(items):
-        row = index // columns
-        col = index % columns
-        
-        x = x_margin + col * (label_width + x_gap)
-        y = page_height - y_margin - (row + 1) * (label_height + y_gap)
-        
-        draw_label(c, x, y, label_width, label_height, config, item)
-        
-        if (index + 1) % (columns * rows) == 0:
+    iterator = iter(items)
+    while True:
+        page_items = list(islice(iterator, plan.labels_per_page))
+        if not page_items:
+            break
+
+        # Only the images of the current page are held in memory
+        page_images = images(page_items) if callable(images) else images
+
+        with metrics.span('pdf.draw_page'):
+            for (x, y), item in zip(plan.slots, page_items):
+                draw_label(c, x, y, plan, item, page_images)
+            
             c.showPage()  # Start a new page
+        metrics.increment('labels.drawn', len(page_items))
+        metrics.increment('pdf.pages')
 
-    c.save()
-    return config['output']['filename']
+    with metrics.span('pdf.save'):
+        c.save()
+    if out is None:
+        metrics.increment('pdf.bytes_written', os.path.getsize(target))
+    else:
+        metrics.increment('pdf.bytes_written', out.tell())
+    return target
 
 if __name__ == "__main__":
     config = load_config()
@@ -1,47 +1,187 @@
+import argparse
 import asyncio
+import itertools
+import os
 from . import file_utils  # Module to handle file operations, including loading configurations
-from . import label_maker  # Module responsible for creating label PDFs
-from . import get_items  # Module to retrieve items from an external source (NetSuite)
-from icecream import ic  # Debugging tool for printing values with context
 from loguru import logger  # Logging library for structured logging
 from . import db  # Module to handle database operations for caching items
+from . import formats  # Registry of label stock formats
+from . import metrics  # Per-stage timings and counters for the run report
 
-async def main():
+# The renderer (ReportLab, PIL) and the NetSuite client are imported when a run
+# needs them, so a sync-only run never loads ReportLab and a render-only run
+# never loads NetSuite or needs its credentials.
+
+def read_skus(options):
+    """
+    Collect the SKUs selected with --sku and --sku-file.
+
+    Args:
+        options (argparse.Namespace): Command line options, see parse_args.
+
+    Returns:
+        list: The SKUs, or None if no SKU was selected.
+    """
+    skus = list(options.skus or [])
+    if options.sku_file:
+        with open(options.sku_file, 'r') as f:
+            # Blank lines and # comments are skipped
+            skus += [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    return skus if options.skus or options.sku_file else None
+
+def parse_args(argv=None):
+    """
+    Parse the command line options.
+
+    Args:
+        argv (list): The arguments to parse. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed options.
+    """
+    parser = argparse.ArgumentParser(description="Create label PDFs for NetSuite items.")
+    parser.add_argument('--format', dest='formats', action='append', metavar='FORMAT', help="Label format to render; repeat to render several formats in one run (default: label_format from the config)")
+    parser.add_argument('--list-formats', action='store_true', help="List the available label formats and exit")
+    parser.add_argument('--workers', type=int, help="Number of processes used to render sheets (overrides render.workers)")
+    parser.add_argument('--full-sync', action='store_true', help="Fetch every NetSuite item instead of only those changed since the last sync")
+    parser.add_argument('--offline', action='store_true', help="Render only from cached images without network access")
+    parser.add_argument('--manufacturer', help="Only render items from this manufacturer")
+    parser.add_argument('--name-from', help="Only render items whose name sorts at or after this value")
+    parser.add_argument('--name-to', help="Only render items whose name sorts at or before this value")
+    parser.add_argument('--search', help="Only render items whose name or description contains every word of this text")
+    parser.add_argument('--sku', dest='skus', action='append', metavar='SKU', help="Only render this item; repeat for several items")
+    parser.add_argument('--sku-file', help="Only render the items listed in this file, one SKU per line")
+    parser.add_argument('--snapshot', metavar='PATH', help="Export the selected items to a memory-mapped snapshot at PATH and render from it; render workers share the snapshot instead of receiving copies of the items")
+    parser.add_argument('--force', action='store_true', help="Render every sheet even if its fingerprint is unchanged")
+    parser.add_argument('--output-mode', choices=['per_sheet', 'single'], help="Write one PDF per sheet or the whole catalog into one PDF (overrides output.mode)")
+    parser.add_argument('--profile-sheet', type=int, metavar='N', help="Profile the Nth sheet with cProfile (overrides metrics.profile_sheet)")
+    parser.add_argument('--backend', choices=['pdf', 'zpl'], help="Write PDFs or a ZPL job for thermal printers (overrides output.backend)")
+    stage = parser.add_mutually_exclusive_group()
+    stage.add_argument('--render-only', action='store_true', help="Render from the item cache without syncing from NetSuite")
+    stage.add_argument('--sync-only', action='store_true', help="Sync the item cache from NetSuite without rendering")
+    return parser.parse_args(argv)
+
+async def main(options=None):
     """
     Main asynchronous function that orchestrates the label PDF generation process:
     1. Loads the configuration settings.
-    2. Retrieves and caches items from NetSuite.
-    3. Processes items in chunks to generate PDFs with specific layout settings.
+    2. Retrieves and caches items from NetSuite, unless ``--render-only`` is set.
+    3. Unless ``--sync-only`` is set, renders the items either into one PDF per sheet, in parallel when more than
+       one worker is configured, streams them all into a single PDF, or writes
+       them as a ZPL job for a thermal printer.
+    4. Writes the run report with per-stage timings and counters.
+
+    Args:
+        options (argparse.Namespace): Command line options, see parse_args.
     """    
-    
+    options = options or parse_args([])
+    skus = read_skus(options)
+    if options.list_formats:
+        for label_format in formats.FORMATS.values():
+            print(f"{label_format.name:<12} {label_format.description}")
+        return
+
     config = file_utils.load_config()  # Dictionary containing layout and output settings
+    metrics.reset()
+    if options.offline:
+        config['image_cache']['offline'] = True
+    if options.output_mode:
+        config['output']['mode'] = options.output_mode
+    if options.backend:
+        config['output']['backend'] = options.backend
+    if options.profile_sheet:
+        config.setdefault('metrics', {})['profile_sheet'] = options.profile_sheet
     
-    # Retrieve items from Netsuite and cache it locally
-    await get_items.get_items()
-    
-    # Retrieve items from cache
-    items = db.get_cached_items()
-
-    if items and len(items) > 0:
-        # Determine the number of items per PDF page based on layout settings
-        items_per_pdf = config['layout']['columns'] * config['layout']['rows']
-        
-        # Process items in batches to fit the defined layout per PDF
-        for i in range(0, len(items), items_per_pdf):
-            sublist = items[i:i + items_per_pdf]
-            
-            # Set the pdf file name
-            first_item_name = sublist[0]['name'].replace(' ', '_').lower()
-            last_item_name = sublist[-1]['name'].replace(' ', '_').lower()
-            pdf_filename = f"{first_item_name}_to_{last_item_name}.pdf"            
-            config['output']['filename'] = f"output/pdfs/{pdf_filename}"
-    
-            # Generate a PDF with labels for the items in the current set
-            label_maker.create_label_pdf(config, sublist)
-            
-            # Log the creation of the new PDF
-            logger.info(f"Created PDF: {pdf_filename}")
+    try:
+        if not options.render_only:
+            # Retrieve items from Netsuite and cache it locally
+            from . import get_items
+            await get_items.get_items(full=options.full_sync)
+        if options.sync_only:
+            return
+
+        from . import render
+
+        filters = {
+            'manufacturer': options.manufacturer,
+            'name_from': options.name_from,
+            'name_to': options.name_to,
+            'search': options.search,
+            'names': skus,
+        }
+        item_snapshot = None
+        if options.snapshot:
+            from . import snapshot
+            snapshot.write_snapshot(options.snapshot, **filters)
+            item_snapshot = snapshot.open_snapshot(options.snapshot)
+
+        # Without --format the page, label and layout sections of the config are used as-is
+        format_names = options.formats or [None]
+        for format_name in format_names:
+            format_config = config
+            if format_name:
+                format_config = formats.apply_format(config, format_name)
+                if len(format_names) > 1:
+                    # Keep the sheets of each format apart
+                    output = format_config['output']
+                    output['directory'] = os.path.join(output['directory'], format_config['label_format'].lower())
+
+            if item_snapshot is not None:
+                # Lightweight views over the shared snapshot instead of a dict per row
+                items = iter(item_snapshot)
+            else:
+                # Stream items from cache one page of rows at a time
+                items = db.iter_items(page_size=config['db']['page_size'], **filters)
+            first_item = next(items, None)
+            if first_item is None:
+                logger.warning("No cached items to render")
+                return
+            items = itertools.chain([first_item], items)
+
+            if format_config['output'].get('backend', 'pdf') == 'zpl':
+                # Print natively on a thermal printer
+                render.render_zpl(format_config, items)
+            elif format_config['output'].get('mode', 'per_sheet') == 'single':
+                # Write every label into one document
+                render.render_document(format_config, items)
+            else:
+                # Process items in batches to fit the defined layout per PDF
+                render.render_sheets(format_config, items, workers=options.workers, force=options.force)
+    finally:
+        # Timings and counters of every stage, also for runs that fail part-way
+        metrics.write_report(config)
+
+def run(argv=None):
+    """
+    Console entry point: sync from NetSuite, then render.
+
+    Args:
+        argv (list): The arguments to parse. Defaults to sys.argv.
+    """
+    asyncio.run(main(parse_args(argv)))
+
+def run_render(argv=None):
+    """
+    Console entry point: render from the item cache without touching NetSuite.
+
+    Args:
+        argv (list): The arguments to parse. Defaults to sys.argv.
+    """
+    options = parse_args(argv)
+    options.render_only = True
+    asyncio.run(main(options))
+
+def run_sync(argv=None):
+    """
+    Console entry point: sync the item cache from NetSuite without rendering.
+
+    Args:
+        argv (list): The arguments to parse. Defaults to sys.argv.
+    """
+    options = parse_args(argv)
+    options.sync_only = True
+    asyncio.run(main(options))
 
 # Run the main function asynchronously if the script is executed as the main program
 if __name__ == "__main__":
-    asyncio.run(main())
+    run()
@@ -0,0 +1,119 @@
+"""
+Content fingerprints for rendered sheets.
+
+Every sheet written in per-sheet mode is recorded in a JSON manifest together
+with a fingerprint of everything that affects its output: the items' names,
+descriptions, barcode values and image validators, the logos, the barcode
+plan, and the layout-related configuration sections. A sheet whose
+fingerprint matches an existing file is not rendered again.
+"""
+import hashlib
+import json
+import os
+
+from loguru import logger
+
+from . import assets
+from . import barcodes
+from .plan import get_plan
+
+# Configuration sections that change how a sheet looks
+FINGERPRINT_SECTIONS = ('label_format', 'page', 'label', 'layout', 'fonts', 'content', 'debug')
+
+
+def sheet_fingerprint(config, sublist, cache):
+    """
+    Compute the content fingerprint of one sheet.
+
+    Args:
+        config (dict): The configuration dictionary.
+        sublist (list): The items on the sheet.
+        cache (ImageCache): The image cache holding the validators of the product images.
+
+    Returns:
+        str: The hex digest of the sheet's inputs.
+    """
+    plan = get_plan(config)
+    logo_plan = plan.logo
+    barcode_plan = plan.barcode
+    items = []
+    for item in sublist:
+        image_url = item.get('item_img')
+        entry = cache.entry(image_url) if image_url else None
+        logo = assets.logo_path(item, logo_plan.directory, logo_plan.default)
+        items.append({
+            'name': item.get('name'),
+            'description': item.get('description'),
+            'item_img': image_url,
+            # Prefer the server's ETag, fall back to the cached content hash
+            'image_version': entry and (entry.get('etag') or entry.get('last_modified') or entry['digest']),
+            'logo': logo and [logo, os.path.getmtime(logo)],
+            'barcode': barcode_plan.enabled and barcodes.barcode_value(item, barcode_plan.field),
+        })
+    payload = {
+        'config': {section: config.get(section) for section in FINGERPRINT_SECTIONS},
+        'barcode': [barcode_plan.enabled, barcode_plan.symbology, barcode_plan.field],
+        'items': items,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Manifest:
+    """
+    Fingerprints of the sheets written to an output directory.
+
+    Args:
+        path (str): The path to the manifest JSON file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'r') as f:
+                self.fingerprints = json.load(f)
+        except FileNotFoundError:
+            self.fingerprints = {}
+        except json.JSONDecodeError:
+            logger.warning(f"Manifest at {path} is corrupt. Rendering every sheet.")
+            self.fingerprints = {}
+
+    def is_current(self, filename, fingerprint):
+        """
+        Return True if a sheet was already written with the same fingerprint.
+
+        Args:
+            filename (str): The path to the sheet's PDF.
+            fingerprint (str): The sheet's current fingerprint.
+        """
+        return self.fingerprints.get(os.path.basename(filename)) == fingerprint and os.path.exists(filename)
+
+    def record(self, filename, fingerprint):
+        """
+        Remember the fingerprint a sheet was written with.
+
+        Args:
+            filename (str): The path to the sheet's PDF.
+            fingerprint (str): The fingerprint of the rendered sheet.
+        """
+        self.fingerprints[os.path.basename(filename)] = fingerprint
+
+    def forget(self, filename):
+        """
+        Drop a sheet from the manifest so it is rendered again on the next run.
+
+        Args:
+            filename (str): The path to the sheet's PDF.
+        """
+        self.fingerprints.pop(os.path.basename(filename), None)
+
+    def save(self):
+        """
+        Write the manifest to disk atomically.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.fingerprints, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,258 @@
+"""
+Per-stage timings and counters for a print run.
+
+Stages are timed with ``span`` and events are counted with ``increment``; both
+are cheap enough to wrap every label. Render workers send a ``snapshot`` of
+their metrics back with each sheet and the parent ``merge``s it, so the report
+written at the end of a run covers every process. The report is written both
+as JSON and as a Prometheus textfile for the node exporter's textfile collector.
+``profile`` runs a block under cProfile when profiling is enabled.
+"""
+import cProfile
+import functools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+
+_lock = threading.Lock()
+# Span name -> [count, total seconds, longest seconds]
+_spans = {}
+# Counter name -> value
+_counters = {}
+_started = time.time()
+
+
+def record(name, seconds):
+    """
+    Record one timing of a stage.
+
+    Args:
+        name (str): The stage name, e.g. 'image.prepare'.
+        seconds (float): The time the stage took.
+    """
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            _spans[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+
+@contextmanager
+def span(name):
+    """
+    Time the enclosed block as one occurrence of a stage.
+
+    Args:
+        name (str): The stage name.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """
+    Decorate a function so that every call is timed as one occurrence of a stage.
+
+    Args:
+        name (str): The stage name.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def increment(name, value=1):
+    """
+    Add to a counter.
+
+    Args:
+        name (str): The counter name, e.g. 'image_cache.hits'.
+        value (float): The amount to add.
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot(reset=False):
+    """
+    Return the metrics recorded so far.
+
+    Args:
+        reset (bool): Clear the metrics after taking the snapshot.
+
+    Returns:
+        dict: The spans and counters, suitable for merge and for pickling across processes.
+    """
+    global _spans, _counters
+    with _lock:
+        data = {
+            'spans': {name: list(stats) for name, stats in _spans.items()},
+            'counters': dict(_counters),
+        }
+        if reset:
+            _spans, _counters = {}, {}
+    return data
+
+
+def merge(data):
+    """
+    Add a snapshot taken in another process to this process's metrics.
+
+    Args:
+        data (dict): A snapshot as returned by snapshot.
+    """
+    with _lock:
+        for name, (count, seconds, longest) in data['spans'].items():
+            stats = _spans.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += count
+            stats[1] += seconds
+            stats[2] = max(stats[2], longest)
+        for name, value in data['counters'].items():
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def reset():
+    """
+    Clear all metrics and restart the run clock.
+    """
+    global _started
+    snapshot(reset=True)
+    _started = time.time()
+
+
+def report():
+    """
+    Build the run report.
+
+    Returns:
+        dict: The run duration, labels per second, and every span and counter.
+    """
+    data = snapshot()
+    duration = time.time() - _started
+    labels = data['counters'].get('labels.drawn', 0)
+    return {
+        'started_at': _started,
+        'duration_seconds': round(duration, 3),
+        'labels_per_second': round(labels / duration, 2) if duration else 0,
+        'spans': {
+            name: {'count': count, 'seconds': round(seconds, 6), 'max_seconds': round(longest, 6)}
+            for name, (count, seconds, longest) in sorted(data['spans'].items())
+        },
+        'counters': dict(sorted(data['counters'].items())),
+    }
+
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def prometheus_text(run_report, prefix='label_maker'):
+    """
+    Format a run report in the Prometheus text exposition format.
+
+    Args:
+        run_report (dict): A report as returned by report.
+        prefix (str): The prefix of every metric name.
+
+    Returns:
+        str: The metrics.
+    """
+    lines = [
+        f"# HELP {prefix}_run_duration_seconds Wall-clock duration of the last run.",
+        f"# TYPE {prefix}_run_duration_seconds gauge",
+        f"{prefix}_run_duration_seconds {run_report['duration_seconds']}",
+        f"# HELP {prefix}_labels_per_second Labels drawn per second in the last run.",
+        f"# TYPE {prefix}_labels_per_second gauge",
+        f"{prefix}_labels_per_second {run_report['labels_per_second']}",
+        f"# HELP {prefix}_stage_seconds Time spent per pipeline stage in the last run.",
+        f"# TYPE {prefix}_stage_seconds gauge",
+    ]
+    for name, stats in run_report['spans'].items():
+        lines.append(f'{prefix}_stage_seconds{{stage="{name}"}} {stats["seconds"]}')
+    lines += [
+        f"# HELP {prefix}_stage_calls Occurrences of each pipeline stage in the last run.",
+        f"# TYPE {prefix}_stage_calls gauge",
+    ]
+    for name, stats in run_report['spans'].items():
+        lines.append(f'{prefix}_stage_calls{{stage="{name}"}} {stats["count"]}')
+    for name, value in run_report['counters'].items():
+        metric = f"{prefix}_{_metric_name(name)}"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+    return '\n'.join(lines) + '\n'
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_report(config):
+    """
+    Write the run report as JSON and as a Prometheus textfile to ``metrics.directory``.
+
+    Args:
+        config (dict): The configuration dictionary.
+
+    Returns:
+        dict: The report that was written.
+    """
+    metrics_config = config.get('metrics', {})
+    directory = metrics_config.get('directory', os.path.join('output', 'metrics'))
+    os.makedirs(directory, exist_ok=True)
+    run_report = report()
+    _write_atomic(os.path.join(directory, 'run_report.json'), json.dumps(run_report, indent=2))
+    _write_atomic(os.path.join(directory, 'label_maker.prom'), prometheus_text(run_report))
+
+    slowest = sorted(run_report['spans'].items(), key=lambda item: item[1]['seconds'], reverse=True)[:5]
+    summary = ', '.join(f"{name} {stats['seconds']:.2f}s" for name, stats in slowest)
+    logger.info(f"Run took {run_report['duration_seconds']:.2f}s ({run_report['labels_per_second']} labels/s); slowest stages: {summary}")
+    return run_report
+
+
+@contextmanager
+def profile(path):
+    """
+    Run the enclosed block under cProfile and write the statistics next to ``path``.
+
+    ``path`` receives the raw statistics (for snakeviz or pstats) and ``path.txt``
+    the 30 functions with the highest cumulative time. Without a path the block
+    runs unprofiled.
+
+    Args:
+        path (str): The file to write the profile to, or None.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+        with open(f"{path}.txt", 'w') as f:
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(30)
+        logger.info(f"Wrote profile to {path}")
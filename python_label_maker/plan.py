@@ -0,0 +1,281 @@
+"""
+Compiled label plans.
+
+``compile_plan`` turns the label, layout, content, fonts and debug sections of
+the configuration into a frozen plan: page size, the origin of every label slot
+on the sheet, and the offsets and sizes of every element within a label, all
+converted to points once. The renderer only fills in per-item data.
+"""
+import json
+import os
+from dataclasses import dataclass
+
+from loguru import logger
+from reportlab.lib import pagesizes
+
+from . import file_utils
+
+# Configuration sections a plan is compiled from
+PLAN_SECTIONS = ('page', 'label', 'layout', 'fonts', 'content', 'debug')
+
+# Narrowest barcode box worth printing; a box squeezed below this is dropped, in points
+MIN_BARCODE_WIDTH = 36
+
+
+def inches_to_points(inches):
+    """
+    Convert inches to points.
+
+    Args:
+        inches (float): The value in inches.
+
+    Returns:
+        float: The value in points.
+    """
+    return inches * 72
+
+
+def page_size(page_config):
+    """
+    Return the page size in points for the ``page`` configuration section.
+
+    Explicit ``width`` and ``height`` in inches win; otherwise ``size`` is looked up
+    among ReportLab's named page sizes (e.g. 'letter', 'A4').
+
+    Args:
+        page_config (dict): The page configuration section.
+
+    Returns:
+        tuple: The page width and height in points.
+    """
+    if 'width' in page_config and 'height' in page_config:
+        return inches_to_points(page_config['width']), inches_to_points(page_config['height'])
+    return getattr(pagesizes, page_config.get('size', 'letter').upper())
+
+
+@dataclass(frozen=True, slots=True)
+class ProductCodePlan:
+    """Product code centered at the top of the label."""
+    font: str
+    size: float
+    color: tuple
+    baseline_offset: float
+
+
+@dataclass(frozen=True, slots=True)
+class DescriptionPlan:
+    """Description block centered on the label, shrunk to fit its box."""
+    font: str
+    size: float
+    min_size: float
+    line_spacing: float
+    color: tuple
+    x_offset: float
+    width: float
+    height: float
+    center_offset: float
+
+
+@dataclass(frozen=True, slots=True)
+class ImagePlan:
+    """Product image at the far left, centered vertically, printed at ``dpi``."""
+    x_offset: float
+    max_width: float
+    max_height: float
+    dpi: int
+    jpeg_quality: int
+
+
+@dataclass(frozen=True, slots=True)
+class LogoPlan:
+    """Manufacturer logo aligned to the bottom-right corner."""
+    directory: str
+    default: str
+    x_offset: float
+    y_offset: float
+    width: float
+
+
+@dataclass(frozen=True, slots=True)
+class BarcodePlan:
+    """
+    Code 128 or QR code of an item field, in a box anchored at the label's bottom-left corner.
+
+    The box is narrowed to end where the logo starts and to stay inside the label.
+    """
+    enabled: bool
+    symbology: str
+    field: str
+    x_offset: float
+    y_offset: float
+    width: float
+    height: float
+
+
+@dataclass(frozen=True, slots=True)
+class BorderPlan:
+    """Debug border around every label."""
+    enabled: bool
+    color: tuple
+    width: float
+
+
+@dataclass(frozen=True, slots=True)
+class LabelPlan:
+    """Everything needed to place and draw labels on a sheet, in points."""
+    page_size: tuple
+    label_width: float
+    label_height: float
+    slots: tuple
+    fonts: tuple
+    product_code: ProductCodePlan
+    description: DescriptionPlan
+    image: ImagePlan
+    logo: LogoPlan
+    barcode: BarcodePlan
+    border: BorderPlan
+
+    @property
+    def labels_per_page(self):
+        return len(self.slots)
+
+
+def compile_plan(config):
+    """
+    Compile the configuration into a LabelPlan.
+
+    Args:
+        config (dict): The configuration dictionary.
+
+    Returns:
+        LabelPlan: The compiled plan.
+    """
+    page_width, page_height = page_size(config['page'])
+    label_width = inches_to_points(config['label']['width'])
+    label_height = inches_to_points(config['label']['height'])
+
+    layout = config['layout']
+    x_margin = inches_to_points(layout['left_margin'])
+    y_margin = inches_to_points(layout['top_margin'])
+    x_gap = inches_to_points(layout['horizontal_spacing'])
+    y_gap = inches_to_points(layout['vertical_spacing'])
+    columns, rows = layout['columns'], layout['rows']
+
+    # Bottom-left corner of every label on the sheet, filled row by row
+    slots = tuple(
+        (x_margin + col * (label_width + x_gap), page_height - y_margin - (row + 1) * (label_height + y_gap))
+        for row in range(rows)
+        for col in range(columns)
+    )
+
+    content = config['content']
+    product_code_config = content['product_code']
+    product_code_height = product_code_config['size'] + 5
+    product_code = ProductCodePlan(
+        font=product_code_config['font'],
+        size=product_code_config['size'],
+        color=tuple(product_code_config.get('color', (0, 0, 0))),
+        baseline_offset=label_height - product_code_height,
+    )
+
+    desc_config = content['description']
+    # The description container is 2.5 inches wide (or the label width) and centered on the label
+    desc_width = min(inches_to_points(2.5), label_width)
+    horizontal_padding = inches_to_points(desc_config['horizontal_padding'])
+    description = DescriptionPlan(
+        font=desc_config['font'],
+        size=desc_config['size'],
+        min_size=desc_config.get('min_size', desc_config['size']),
+        line_spacing=desc_config.get('line_spacing', 2),
+        color=tuple(desc_config.get('color', (0, 0, 0))),
+        x_offset=(label_width - desc_width) / 2 + horizontal_padding,
+        width=desc_width - 2 * horizontal_padding,
+        # The block is centered, so it may extend as far below the center as the product code allows above it
+        height=label_height - 2 * product_code_height - 2 * inches_to_points(desc_config['vertical_padding']),
+        center_offset=label_height / 2,
+    )
+
+    image_config = content['image']
+    image = ImagePlan(
+        x_offset=image_config['padding'],
+        max_width=inches_to_points(image_config['max_width']),
+        max_height=label_height * image_config['height_percentage'],
+        dpi=image_config.get('dpi', 300),
+        jpeg_quality=image_config.get('jpeg_quality', 85),
+    )
+
+    # 0.1 inches of padding; the logo is 2 inches or 60% of the label wide, whichever is smaller
+    logo_padding = inches_to_points(0.1)
+    logo_width = min(inches_to_points(2), label_width * 0.6) - 2 * logo_padding
+    logo_config = content.get('logo', {})
+    logo = LogoPlan(
+        directory=os.path.join(file_utils.BASE_DIR, logo_config.get('directory', 'input/images/companies')),
+        default=logo_config.get('default', 'lumien.jpg'),
+        x_offset=label_width - logo_width - logo_padding,
+        y_offset=logo_padding,
+        width=logo_width,
+    )
+
+    barcode_config = content.get('barcode', {})
+    barcode_enabled = barcode_config.get('enabled', False)
+    barcode_x = inches_to_points(barcode_config.get('x', 0))
+    barcode_y = inches_to_points(barcode_config.get('y', 0))
+    # The logo spans the label's bottom-right corner, so the box must end before it
+    barcode_width = min(inches_to_points(barcode_config.get('width', 1)), logo.x_offset - barcode_x, label_width - barcode_x)
+    barcode_height = min(inches_to_points(barcode_config.get('height', 0.3)), label_height - barcode_y)
+    if barcode_enabled and (barcode_width < MIN_BARCODE_WIDTH or barcode_height <= 0):
+        logger.warning(
+            f"No room for a barcode on a {config['label']['width']}\" x {config['label']['height']}\" label "
+            f"beside the logo. Barcodes are not drawn."
+        )
+        barcode_enabled = False
+    barcode = BarcodePlan(
+        enabled=barcode_enabled,
+        symbology=barcode_config.get('symbology', 'code128'),
+        field=barcode_config.get('field', 'netsuite_id'),
+        x_offset=barcode_x,
+        y_offset=barcode_y,
+        width=barcode_width,
+        height=barcode_height,
+    )
+
+    debug = config['debug']
+    border = BorderPlan(
+        enabled=debug['draw_borders'],
+        color=tuple(debug['border_color']),
+        width=debug.get('border_width', 1),
+    )
+
+    return LabelPlan(
+        page_size=(page_width, page_height),
+        label_width=label_width,
+        label_height=label_height,
+        slots=slots,
+        fonts=tuple((font['name'], font['file']) for font in config['fonts'].values()),
+        product_code=product_code,
+        description=description,
+        image=image,
+        logo=logo,
+        barcode=barcode,
+        border=border,
+    )
+
+
+_plans = {}
+
+
+def get_plan(config):
+    """
+    Return the compiled plan for a configuration, compiling it only once per process.
+
+    Args:
+        config (dict): The configuration dictionary.
+
+    Returns:
+        LabelPlan: The compiled plan.
+    """
+    key = json.dumps({section: config.get(section) for section in PLAN_SECTIONS}, sort_keys=True)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = compile_plan(config)
+    return plan
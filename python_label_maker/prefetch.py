@@ -0,0 +1,53 @@
+"""
+Concurrent image prefetch stage that runs before any label is drawn.
+
+Product images for a batch of items are downloaded (through the image cache)
+and prepared for printing on a bounded thread pool, so a sheet waits roughly as long as its
+slowest image instead of the sum of every round-trip.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from . import image_cache
+from . import metrics
+from .label_maker import process_image
+from .plan import get_plan
+
+
+@metrics.timed('image.prefetch')
+def prefetch_images(items, config, cache=None, max_workers=None):
+    """
+    Download the product images for a batch of items and prepare their print derivatives concurrently.
+
+    Args:
+        items (list): A list of item dictionaries.
+        config (dict): The configuration dictionary.
+        cache (ImageCache): The image cache to read from. Defaults to the shared cache.
+        max_workers (int): Size of the thread pool. Defaults to ``prefetch.max_workers``.
+
+    Returns:
+        dict: A mapping of image URL to the (path, width, height) tuple returned by process_image.
+    """
+    cache = cache or image_cache.get_default_cache(config)
+    max_workers = max_workers or config.get('prefetch', {}).get('max_workers', 8)
+    image_plan = get_plan(config).image
+
+    # Several items can share an image, only fetch each URL once
+    urls = list(dict.fromkeys(item['item_img'] for item in items if item.get('item_img')))
+    if not urls:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        results = executor.map(
+            lambda url: process_image(
+                url, image_plan.max_width, image_plan.max_height, cache=cache,
+                dpi=image_plan.dpi, jpeg_quality=image_plan.jpeg_quality,
+            ),
+            urls,
+        )
+        images = dict(zip(urls, results))
+
+    failed = sum(1 for path, _, _ in images.values() if path is None)
+    logger.info(f"Prefetched {len(images) - failed}/{len(images)} images")
+    return images
@@ -0,0 +1,282 @@
+"""
+Sheet-level rendering, either in-process or spread across a process pool.
+
+In ``per_sheet`` output mode each sheet-sized chunk of items becomes one PDF.
+With more than one worker the chunks are rendered by a ProcessPoolExecutor whose
+workers register the fonts once at start-up, and the results are collected in
+submission order. In ``single`` mode the whole catalog is streamed into one
+document. With the ``zpl`` backend the catalog is written as one thermal
+printer job instead.
+"""
+import copy
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from loguru import logger
+
+from . import image_cache
+from . import label_maker
+from . import manifest
+from . import metrics
+from . import prefetch
+from . import zpl
+
+
+def chunked(items, size):
+    """
+    Split an iterable into lists of at most ``size`` items.
+
+    Args:
+        items (iterable): The items to split.
+        size (int): The maximum number of items per chunk.
+
+    Yields:
+        list: The next chunk of items.
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def sheet_filename(sublist):
+    """
+    Build the PDF file name for a sheet from its first and last item names.
+
+    Args:
+        sublist (list): The items on the sheet.
+
+    Returns:
+        str: The PDF file name.
+    """
+    first_item_name = sublist[0]['name'].replace(' ', '_').lower()
+    last_item_name = sublist[-1]['name'].replace(' ', '_').lower()
+    return f"{first_item_name}_to_{last_item_name}.pdf"
+
+
+def sheet_path(config, sublist):
+    """
+    Return the output path of a sheet's PDF.
+
+    Args:
+        config (dict): The configuration dictionary; sheets go to ``output.directory``.
+        sublist (list): The items on the sheet.
+
+    Returns:
+        str: The path to the sheet's PDF.
+    """
+    return os.path.join(config['output'].get('directory', os.path.join('output', 'pdfs')), sheet_filename(sublist))
+
+
+def render_sheet(config, sublist, profile_path=None):
+    """
+    Prefetch the images for one sheet and write its PDF.
+
+    Args:
+        config (dict): The configuration dictionary.
+        sublist (list): The items on the sheet.
+        profile_path (str): Profile the sheet with cProfile and write the statistics here.
+
+    Returns:
+        tuple: The path to the created PDF file and the sheet's fingerprint, computed
+               after rendering so it includes the validators of freshly downloaded images.
+               The fingerprint is None if an image could not be drawn, so the sheet
+               is not considered current on the next run.
+    """
+    filename = sheet_path(config, sublist)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    sheet_config = copy.copy(config)
+    sheet_config['output'] = dict(config['output'], filename=filename)
+
+    with metrics.profile(profile_path):
+        # Download and prepare every image of the set before drawing starts
+        images = prefetch.prefetch_images(sublist, sheet_config)
+
+        # Generate a PDF with labels for the items in the current set
+        filename = label_maker.create_label_pdf(sheet_config, sublist, images)
+    if any(path is None for path, _, _ in images.values()):
+        return filename, None
+    return filename, manifest.sheet_fingerprint(config, sublist, image_cache.get_default_cache(config))
+
+
+def render_document(config, items):
+    """
+    Stream a whole catalog into a single multi-page PDF.
+
+    Images are prefetched one page at a time while the document is written, so
+    only the current page's images are held in memory.
+
+    Args:
+        config (dict): The configuration dictionary; ``output.filename`` is the target file.
+        items (iterable): The item dictionaries to create labels for, e.g. a generator.
+
+    Returns:
+        str: The path to the created PDF file.
+    """
+    directory = os.path.dirname(config['output']['filename'])
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    filename = label_maker.create_label_pdf(
+        config, items, images=lambda page_items: prefetch.prefetch_images(page_items, config)
+    )
+    image_cache.get_default_cache(config).flush()
+    logger.info(f"Created PDF: {filename}")
+    return filename
+
+
+def render_zpl(config, items):
+    """
+    Write a whole catalog as one ZPL job for a thermal printer.
+
+    Args:
+        config (dict): The configuration dictionary; the job is written next to
+            ``output.filename`` with a ``.zpl`` extension.
+        items (iterable): The item dictionaries to create labels for, e.g. a generator.
+
+    Returns:
+        str: The path to the created ZPL file.
+    """
+    filename = os.path.splitext(config['output']['filename'])[0] + '.zpl'
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    zpl.create_label_zpl(config, items, filename)
+    image_cache.get_default_cache(config).flush()
+    logger.info(f"Created ZPL: {filename}")
+    return filename
+
+
+def _init_worker(fonts, font_cache_directory):
+    # Fonts are registered once per worker process instead of once per sheet
+    label_maker.register_fonts(fonts, font_cache_directory)
+    # Forked workers inherit the parent's metrics, which must not be reported twice
+    metrics.reset()
+
+
+def _render_sheet_in_worker(config, sublist, profile_path=None):
+    # Send the sheet's metrics back with its result, the parent merges them
+    result = render_sheet(config, sublist, profile_path)
+    # Pool workers exit without running atexit handlers, so persist the sheet's cache entries now
+    image_cache.get_default_cache(config).flush()
+    return result, metrics.snapshot(reset=True)
+
+
+def profile_path(config, sheet_number):
+    """
+    Return where the profile of a sheet is written when ``metrics.profile_sheet`` selects it.
+
+    Args:
+        config (dict): The configuration dictionary.
+        sheet_number (int): The 1-based number of the sheet in the run.
+
+    Returns:
+        str: The path of the profile, or None if the sheet is not profiled.
+    """
+    metrics_config = config.get('metrics', {})
+    if metrics_config.get('profile_sheet') != sheet_number:
+        return None
+    return os.path.join(metrics_config.get('directory', os.path.join('output', 'metrics')), f"sheet_{sheet_number}.prof")
+
+
+def render_sheets(config, items, workers=None, force=False):
+    """
+    Render every sheet of a catalog, optionally in parallel.
+
+    Sheets whose fingerprint matches the manifest entry of an existing PDF are
+    skipped unless ``force`` is set or ``output.skip_unchanged`` is false. A sheet
+    with an image that is not cached or is older than the cache's ``max_age`` is
+    rendered again, which revalidates the image, and a sheet drawn with a missing
+    image is left out of the manifest.
+    Failures are reported per sheet and do not stop the remaining sheets.
+
+    Args:
+        config (dict): The configuration dictionary.
+        items (iterable): The item dictionaries to create labels for.
+        workers (int): Number of worker processes. Defaults to ``render.workers``;
+            1 renders in the current process.
+        force (bool): Render every sheet even if it is unchanged.
+
+    Returns:
+        list: One (filename, error) tuple per sheet in catalog order, where error is
+              None for sheets that were written successfully or skipped.
+    """
+    workers = workers or config.get('render', {}).get('workers', 1)
+    items_per_pdf = config['layout']['columns'] * config['layout']['rows']
+    sheets = chunked(items, items_per_pdf)
+    skip_unchanged = config['output'].get('skip_unchanged', True) and not force
+    output_directory = config['output'].get('directory', os.path.join('output', 'pdfs'))
+    sheet_manifest = manifest.Manifest(os.path.join(output_directory, 'manifest.json'))
+    cache = image_cache.get_default_cache(config)
+    results = []
+    skipped = 0
+
+    def unchanged(sublist):
+        # An image that is missing or due for revalidation may have changed upstream
+        return skip_unchanged and all(
+            cache.is_fresh(item['item_img']) for item in sublist if item.get('item_img')
+        ) and sheet_manifest.is_current(
+            sheet_path(config, sublist), manifest.sheet_fingerprint(config, sublist, cache)
+        )
+
+    def worker_result(future):
+        result, worker_metrics = future.result()
+        metrics.merge(worker_metrics)
+        return result
+
+    def record(sublist, outcome):
+        nonlocal skipped
+        filename = sheet_filename(sublist)
+        if outcome is None:
+            logger.info(f"Unchanged PDF skipped: {filename}")
+            results.append((filename, None))
+            skipped += 1
+            metrics.increment('sheets.skipped')
+            return
+        try:
+            path, fingerprint = outcome()
+            if fingerprint is None:
+                logger.warning(f"Created PDF with missing images, it will be rendered again: {path}")
+                sheet_manifest.forget(path)
+            else:
+                sheet_manifest.record(path, fingerprint)
+                logger.info(f"Created PDF: {path}")
+            results.append((filename, None))
+            metrics.increment('sheets.rendered')
+        except Exception as e:
+            logger.error(f"Failed to render sheet {filename}: {str(e)}")
+            results.append((filename, e))
+            metrics.increment('sheets.failed')
+
+    try:
+        if workers <= 1:
+            for number, sublist in enumerate(sheets, 1):
+                record(sublist, None if unchanged(sublist) else lambda: render_sheet(config, sublist, profile_path(config, number)))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config['fonts'], label_maker.font_cache_directory(config))) as executor:
+                # Keep a bounded window of sheets in flight and collect them in order
+                pending = deque()
+                for number, sublist in enumerate(sheets, 1):
+                    future = None if unchanged(sublist) else executor.submit(
+                        _render_sheet_in_worker, config, sublist, profile_path(config, number)
+                    )
+                    pending.append((sublist, future))
+                    if len(pending) >= workers * 2:
+                        done, future = pending.popleft()
+                        record(done, future and (lambda: worker_result(future)))
+                while pending:
+                    done, future = pending.popleft()
+                    record(done, future and (lambda: worker_result(future)))
+    finally:
+        sheet_manifest.save()
+        cache.flush()
+
+    failed = sum(1 for _, error in results if error)
+    logger.info(
+        f"Rendered {len(results) - failed - skipped}/{len(results)} sheets with {workers} worker(s), "
+        f"{skipped} unchanged"
+    )
+    return results
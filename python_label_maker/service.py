@@ -0,0 +1,425 @@
+"""
+Long-running label rendering service.
+
+Starting ``python -m python_label_maker.main`` for every print request pays for
+importing ReportLab, PIL and the NetSuite client, opening the database,
+registering fonts and decoding logos each time. The service does that once:
+fonts are registered and logos, compiled plans and prepared product images
+stay in memory between requests, so a request only draws its labels.
+
+Requests are JSON posted to ``/labels`` over TCP or a Unix socket::
+
+    {"ids": [1234, 5678]}                   cached items by NetSuite id
+    {"items": [{"name": ..., ...}]}         item payloads rendered as given
+    {"format": "AVERY5163", ...}            optional label format
+
+and the response is the PDF. Jobs run on a bounded thread pool, so concurrent
+requests share the warm caches without overloading the machine. ``GET /health``
+reports the service's state.
+"""
+import argparse
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+from . import assets
+from . import db
+from . import file_utils
+from . import formats
+from . import image_cache
+from . import label_maker
+from . import metrics
+from . import prefetch
+from .plan import get_plan
+
+# Largest request body accepted, in bytes
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+class RequestError(ValueError):
+    """Raised for requests the service cannot render; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def netsuite_id_of(value):
+    """
+    Return a NetSuite id from a request as the integer stored in the item cache.
+
+    Args:
+        value: The id as sent, e.g. 1234 or "1234".
+
+    Returns:
+        int: The NetSuite id.
+
+    Raises:
+        RequestError: If the value is not an integer id.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    raise RequestError(f"Invalid NetSuite id {value!r}")
+
+
+# Item fields drawn as text or fetched, which must be strings when present
+TEXT_FIELDS = ('description', 'manufacturer', 'item_img')
+
+
+def check_item(item):
+    """
+    Check that an item sent with a request can be drawn.
+
+    Args:
+        item: The item as sent.
+
+    Returns:
+        dict: The item.
+
+    Raises:
+        RequestError: If the item is not an object with a string 'name', or one of
+            its text fields is not a string.
+    """
+    if not isinstance(item, dict) or not isinstance(item.get('name'), str) or not item['name']:
+        raise RequestError("Every item needs at least a 'name'")
+    for field in TEXT_FIELDS:
+        if item.get(field) is not None and not isinstance(item[field], str):
+            raise RequestError(f"Item '{item['name']}' has a non-string '{field}'")
+    return item
+
+
+class LabelService:
+    """
+    Renders label PDFs from warm in-memory state on a bounded worker pool.
+
+    Args:
+        config (dict): The configuration dictionary.
+        workers (int): Number of jobs rendered at the same time.
+        image_memo_size (int): Prepared product images kept in memory.
+    """
+
+    def __init__(self, config, workers=4, image_memo_size=4096):
+        self.config = config
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='label-render')
+        self.image_memo_size = image_memo_size
+        # Image URL -> (prepared image, time prepared); expires with the image cache's max_age
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_age = config.get('image_cache', {}).get('max_age_seconds', 86400)
+        self.started = time.time()
+        self.jobs = 0
+
+    def warm(self):
+        """
+        Register the fonts, compile the plans of every format, and decode the logos.
+        """
+        with metrics.span('service.warm'):
+            label_maker.register_fonts(self.config['fonts'], label_maker.font_cache_directory(self.config))
+            image_cache.get_default_cache(self.config)
+            plans = [get_plan(self.config)] + [
+                get_plan(formats.apply_format(self.config, name)) for name in formats.FORMATS
+            ]
+            logos = 0
+            for plan in plans:
+                if not os.path.isdir(plan.logo.directory):
+                    continue
+                for filename in os.listdir(plan.logo.directory):
+                    path = os.path.join(plan.logo.directory, filename)
+                    if os.path.splitext(filename)[1].lower() in ('.png', '.jpg', '.jpeg'):
+                        assets.load_logo(path, os.path.getmtime(path), plan.logo.width)
+                        logos += 1
+        logger.info(f"Service warmed up: {len(plans)} plans, {logos} logo sizes")
+
+    def config_for(self, format_name):
+        """
+        Return the configuration for a request's label format.
+
+        Args:
+            format_name (str): The label format, or None for the configured one.
+
+        Returns:
+            dict: The configuration to render with.
+
+        Raises:
+            RequestError: If the format is unknown.
+        """
+        if not format_name:
+            return self.config
+        if not isinstance(format_name, str):
+            raise RequestError(f"Invalid label format {format_name!r}")
+        try:
+            # Format names are case-insensitive, as on the command line
+            return formats.apply_format(self.config, formats.get_format(format_name).name)
+        except ValueError as e:
+            raise RequestError(str(e)) from None
+
+    def images(self, items, config):
+        """
+        Return the prepared product images for a job, preparing only those not in memory.
+
+        Args:
+            items (list): The item dictionaries of the job.
+            config (dict): The configuration to render with.
+
+        Returns:
+            dict: A mapping of image URL to the (path, width, height) tuple returned by process_image.
+        """
+        plan = get_plan(config).image
+        urls = list(dict.fromkeys(item['item_img'] for item in items if item.get('item_img')))
+        now = time.time()
+        images, missing = {}, []
+        with self._lock:
+            for url in urls:
+                entry = self._images.get((url, plan))
+                if entry and now - entry[1] < self.max_age:
+                    self._images.move_to_end((url, plan))
+                    images[url] = entry[0]
+                else:
+                    missing.append({'item_img': url})
+        metrics.increment('service.image_hits', len(images))
+        if missing:
+            prepared = prefetch.prefetch_images(missing, config)
+            images.update(prepared)
+            with self._lock:
+                for url, image in prepared.items():
+                    if image[0] is not None:
+                        self._images[(url, plan)] = (image, now)
+                while len(self._images) > self.image_memo_size:
+                    self._images.popitem(last=False)
+        return images
+
+    def resolve_items(self, request):
+        """
+        Return the items a request asks for.
+
+        Args:
+            request (dict): The decoded request body.
+
+        Returns:
+            list: The item dictionaries to render.
+
+        Raises:
+            RequestError: If the request names no items, an item cannot be drawn, an id
+                is not an integer, or none of its ids is cached.
+        """
+        if request.get('items'):
+            items = request['items']
+            if not isinstance(items, list):
+                raise RequestError("'items' must be a list of items")
+            return [check_item(item) for item in items]
+        if request.get('ids'):
+            if not isinstance(request['ids'], list):
+                raise RequestError("'ids' must be a list of NetSuite ids")
+            items = db.get_items_by_netsuite_ids([netsuite_id_of(value) for value in request['ids']])
+            if not items:
+                raise RequestError("None of the requested ids is cached", status=404)
+            return items
+        raise RequestError("The request needs 'items' or 'ids'")
+
+    def render(self, request):
+        """
+        Render the labels of a request to PDF bytes on the worker pool.
+
+        Args:
+            request (dict): The decoded request body.
+
+        Returns:
+            bytes: The PDF.
+
+        Raises:
+            RequestError: If the request is invalid.
+        """
+        config = self.config_for(request.get('format'))
+        items = self.resolve_items(request)
+        return self.executor.submit(self._render, config, items).result()
+
+    def _render(self, config, items):
+        with metrics.span('service.render'):
+            out = io.BytesIO()
+            label_maker.create_label_pdf(config, items, self.images(items, config), out=out)
+        with self._lock:
+            self.jobs += 1
+        metrics.increment('service.jobs')
+        return out.getvalue()
+
+    def health(self):
+        return {
+            'status': 'ok',
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'workers': self.workers,
+            'jobs': self.jobs,
+            'images_in_memory': len(self._images),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class LabelRequestHandler(BaseHTTPRequestHandler):
+    """Answers ``POST /labels`` with a PDF and ``GET /health`` with JSON."""
+
+    server_version = 'LabelMaker'
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data):
+        self.send_body(status, json.dumps(data).encode(), 'application/json')
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, self.server.service.health())
+        else:
+            self.send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/labels':
+            self.send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                length = -1
+            if length < 0:
+                raise RequestError("Invalid Content-Length")
+            if length > MAX_REQUEST_BYTES:
+                raise RequestError("Request body too large", status=413)
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except json.JSONDecodeError as e:
+                raise RequestError(f"Invalid JSON: {e}")
+            if not isinstance(request, dict):
+                raise RequestError("The request body must be a JSON object")
+            pdf = self.server.service.render(request)
+        except RequestError as e:
+            metrics.increment('service.rejected')
+            self.send_json(e.status, {'error': str(e)})
+            return
+        except Exception as e:
+            logger.exception(f"Failed to render labels: {e}")
+            metrics.increment('service.failed')
+            self.send_json(500, {'error': str(e)})
+            return
+        self.send_body(200, pdf, 'application/pdf')
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ThreadingHTTPServer's counterpart on a Unix socket."""
+    daemon_threads = True
+
+
+def make_server(service, host='127.0.0.1', port=8080, socket_path=None):
+    """
+    Create an HTTP server for the service on a TCP port or a Unix socket.
+
+    Args:
+        service (LabelService): The service that renders the requests.
+        host (str): The address to listen on.
+        port (int): The TCP port to listen on; 0 picks a free port.
+        socket_path (str): Listen on this Unix socket instead of TCP.
+
+    Returns:
+        socketserver.BaseServer: The server, not yet serving.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, LabelRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), LabelRequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line options.
+
+    Args:
+        argv (list): The arguments to parse. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed options.
+    """
+    parser = argparse.ArgumentParser(description="Serve label PDFs over HTTP from warm caches.")
+    parser.add_argument('--host', help="Address to listen on (overrides service.host)")
+    parser.add_argument('--port', type=int, help="TCP port to listen on (overrides service.port)")
+    parser.add_argument('--socket', help="Listen on this Unix socket instead of TCP (overrides service.socket)")
+    parser.add_argument('--workers', type=int, help="Number of jobs rendered at the same time (overrides service.workers)")
+    return parser.parse_args(argv)
+
+
+def main(options=None):
+    """
+    Warm the caches and serve label requests until interrupted.
+
+    Args:
+        options (argparse.Namespace): Command line options, see parse_args.
+    """
+    options = options or parse_args([])
+    config = file_utils.load_config()
+    service_config = config.get('service', {})
+    service = LabelService(config, workers=options.workers or service_config.get('workers', 4))
+    service.warm()
+
+    socket_path = options.socket or service_config.get('socket')
+    server = make_server(
+        service,
+        host=options.host or service_config.get('host', '127.0.0.1'),
+        port=options.port if options.port is not None else service_config.get('port', 8080),
+        socket_path=socket_path,
+    )
+    if server.address_family == socket.AF_UNIX:
+        logger.info(f"Serving labels on {socket_path}")
+    else:
+        logger.info(f"Serving labels on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        metrics.write_report(config)
+
+
+def run(argv=None):
+    """
+    Console entry point for the service.
+
+    Args:
+        argv (list): The arguments to parse. Defaults to sys.argv.
+    """
+    main(parse_args(argv))
+
+
+if __name__ == "__main__":
+    run()
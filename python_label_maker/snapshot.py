@@ -0,0 +1,331 @@
+"""
+Memory-mapped columnar snapshot of the item cache.
+
+Building a dict per row is most of the cost of reading a large catalog out of
+SQLite, and every render worker holds its own copy of what it was sent. A
+snapshot stores the items table once, as a structure of arrays:
+
+* every distinct string goes into one UTF-8 string pool, so repeated values
+  such as manufacturers and logo URLs are stored and decoded only once;
+* text columns are arrays of int32 pool indexes and integer columns are
+  arrays of int64, with -1 and ``INT_NULL`` standing for NULL.
+
+The file is read through ``mmap`` and the arrays are cast memoryviews over
+it, so nothing is copied when a snapshot is opened. Rows are ``ItemView``
+objects of two slots that read their fields on access and behave like the
+item dicts the renderer expects. A view pickles as its file and row number, so process
+pool workers reopen the snapshot once and share its pages through the OS page
+cache instead of receiving copies of every item.
+
+Layout: the magic bytes, the length of a JSON header, the header (a random
+version, row and string counts, and the kind and offset of every column), then
+the 8-byte aligned pool offsets, column arrays and pool data.
+"""
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+from functools import lru_cache
+
+from loguru import logger
+
+from . import db
+from . import metrics
+
+MAGIC = b'LMSNAP02'
+
+# NULL in integer columns
+INT_NULL = -2 ** 63
+
+# Array typecodes per column kind: text columns hold string pool indexes
+TYPECODES = {'text': 'i', 'int': 'q'}
+
+
+def column_kind(name):
+    """
+    Return how a column of the items table is stored in a snapshot.
+
+    Args:
+        name (str): The column name.
+
+    Returns:
+        str: 'int' or 'text'.
+    """
+    if name == 'id' or db.ITEM_COLUMNS.get(name, '').startswith('INTEGER'):
+        return 'int'
+    return 'text'
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def write_snapshot(path, page_size=5000, **filters):
+    """
+    Write the cached items to a snapshot file.
+
+    Rows are streamed from SQLite as tuples, so no dict is built per row.
+
+    Args:
+        path (str): The snapshot file to write.
+        page_size (int): Number of rows read from SQLite per query.
+        **filters: Filters selecting the items, see db.iter_item_pages.
+
+    Returns:
+        int: The number of items written.
+    """
+    columns = None
+    arrays = []
+    pool = {}
+    with metrics.span('snapshot.write'):
+        for column_names, rows in db.iter_item_pages(page_size, **filters):
+            if columns is None:
+                columns = [(name, column_kind(name)) for name in column_names]
+                arrays = [array(TYPECODES[kind]) for _, kind in columns]
+            for (name, kind), values, column in zip(columns, arrays, zip(*rows)):
+                if kind == 'int':
+                    values.extend(INT_NULL if value is None else value for value in column)
+                else:
+                    # setdefault interns each distinct string at the next free index
+                    values.extend(-1 if value is None else pool.setdefault(value, len(pool)) for value in column)
+
+        columns = columns or [(name, column_kind(name)) for name in ('id', 'name', *db.ITEM_COLUMNS)]
+        arrays = arrays or [array(TYPECODES[kind]) for _, kind in columns]
+        rows = len(arrays[0])
+        data = [string.encode('utf-8') for string in pool]
+        string_offsets = array('q', [0])
+        for encoded in data:
+            string_offsets.append(string_offsets[-1] + len(encoded))
+
+        # Sections are laid out after the header, each 8-byte aligned
+        sections = [string_offsets, *arrays]
+        # Identifies this write of the file, even if a rewrite keeps its mtime
+        header = {'version': os.urandom(8).hex(), 'rows': rows, 'strings': len(data), 'columns': []}
+        header_length = 0
+        while True:
+            # The header holds the offsets, which depend on the header's own length
+            offset = _align(len(MAGIC) + 8 + header_length)
+            offsets = []
+            for section in sections:
+                offsets.append(offset)
+                offset = _align(offset + len(section) * section.itemsize)
+            header['string_offsets'] = offsets[0]
+            header['columns'] = [
+                {'name': name, 'kind': kind, 'offset': column_offset}
+                for (name, kind), column_offset in zip(columns, offsets[1:])
+            ]
+            header['string_data'] = offset
+            header_bytes = json.dumps(header).encode('utf-8')
+            if len(header_bytes) <= header_length:
+                header_bytes = header_bytes.ljust(header_length)
+                break
+            header_length = len(header_bytes) + 64
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for section, section_offset in zip(sections, offsets):
+                f.write(b'\0' * (section_offset - f.tell()))
+                section.tofile(f)
+            f.write(b'\0' * (header['string_data'] - f.tell()))
+            for encoded in data:
+                f.write(encoded)
+        os.replace(tmp_path, path)
+
+    metrics.increment('snapshot.rows_written', rows)
+    logger.info(f"Wrote snapshot of {rows} items with {len(data)} distinct strings to {path}")
+    return rows
+
+
+class Snapshot:
+    """
+    A read-only, memory-mapped item snapshot.
+
+    Indexing and iteration yield ItemView rows. Strings are decoded on first
+    access and kept, so each distinct string exists once per process.
+
+    Args:
+        path (str): The snapshot file written by write_snapshot.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not an item snapshot")
+        header_length, = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(self._mmap[start:start + header_length])
+        # Identifies this write of the file, see ItemView.__reduce__
+        self.version = header['version']
+
+        view = memoryview(self._mmap)
+        self._view = view
+        self.rows = header['rows']
+        string_count = header['strings']
+        offset = header['string_offsets']
+        self._string_offsets = view[offset:offset + (string_count + 1) * 8].cast('q')
+        self._string_data = view[header['string_data']:]
+        self._strings = [None] * string_count
+        self.columns = {}
+        for column in header['columns']:
+            typecode = TYPECODES[column['kind']]
+            size = array(typecode).itemsize
+            values = view[column['offset']:column['offset'] + self.rows * size].cast(typecode)
+            self.columns[column['name']] = (column['kind'], values)
+        self.column_names = tuple(self.columns)
+
+    def string(self, index):
+        """
+        Return a string of the pool, decoding it on first use.
+
+        Args:
+            index (int): The pool index.
+
+        Returns:
+            str: The string.
+        """
+        string = self._strings[index]
+        if string is None:
+            string = self._strings[index] = str(
+                self._string_data[self._string_offsets[index]:self._string_offsets[index + 1]], 'utf-8'
+            )
+        return string
+
+    def value(self, name, row):
+        """
+        Return one field of one row.
+
+        Args:
+            name (str): The column name.
+            row (int): The row number.
+
+        Returns:
+            The value, or None for NULL.
+
+        Raises:
+            KeyError: If there is no such column.
+        """
+        kind, values = self.columns[name]
+        value = values[row]
+        if kind == 'int':
+            return None if value == INT_NULL else value
+        return None if value < 0 else self.string(value)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if not -self.rows <= row < self.rows:
+            raise IndexError(row)
+        return ItemView(self, row % self.rows)
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield ItemView(self, row)
+
+    def close(self):
+        """
+        Release the memory map. Views of the snapshot must not be used afterwards.
+        """
+        for _, values in self.columns.values():
+            values.release()
+        self._string_offsets.release()
+        self._string_data.release()
+        self._view.release()
+        self._mmap.close()
+
+
+class ItemView(Mapping):
+    """
+    One row of a snapshot, read like an item dict without holding its values.
+    """
+
+    __slots__ = ('snapshot', 'row')
+
+    def __init__(self, snapshot, row):
+        self.snapshot = snapshot
+        self.row = row
+
+    def __getitem__(self, key):
+        return self.snapshot.value(key, self.row)
+
+    def get(self, key, default=None):
+        # Faster than Mapping.get, which goes through KeyError
+        if key in self.snapshot.columns:
+            return self.snapshot.value(key, self.row)
+        return default
+
+    def __contains__(self, key):
+        return key in self.snapshot.columns
+
+    def __iter__(self):
+        return iter(self.snapshot.column_names)
+
+    def __len__(self):
+        return len(self.snapshot.column_names)
+
+    def __reduce__(self):
+        # Workers reopen the snapshot by path and share its pages instead of unpickling a copy of the row
+        return _view_at, (self.snapshot.path, self.snapshot.version, self.row)
+
+    def __repr__(self):
+        return f"ItemView({self.snapshot.path!r}, {self.row}, name={self.get('name')!r})"
+
+
+@lru_cache(maxsize=8)
+def _open_version(path, version):
+    snapshot = Snapshot(path)
+    if snapshot.version != version:
+        # The file was rewritten since the view was pickled, its row numbers refer to other items
+        snapshot.close()
+        raise ValueError(f"Snapshot {path} was rewritten, expected version {version} but found {snapshot.version}")
+    return snapshot
+
+
+def read_version(path):
+    """
+    Return the version a snapshot was written with, reading only its header.
+
+    Args:
+        path (str): The snapshot file.
+
+    Returns:
+        str: The random version stored in the header.
+
+    Raises:
+        ValueError: If the file is not an item snapshot.
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + 8)
+        if len(prefix) < len(MAGIC) + 8 or not prefix.startswith(MAGIC):
+            raise ValueError(f"{path} is not an item snapshot")
+        header_length, = struct.unpack_from('<Q', prefix, len(MAGIC))
+        return json.loads(f.read(header_length))['version']
+
+
+def open_snapshot(path):
+    """
+    Open a snapshot once per process, or again after the file was rewritten.
+
+    Args:
+        path (str): The snapshot file.
+
+    Returns:
+        Snapshot: The shared snapshot.
+    """
+    path = os.path.abspath(path)
+    return _open_version(path, read_version(path))
+
+
+def _view_at(path, version, row):
+    return ItemView(_open_version(path, version), row)
@@ -0,0 +1,79 @@
+"""
+Text layout measured with real font metrics.
+
+Lines are wrapped by the rendered width of the text in the registered font
+instead of a guessed character count, and blocks that do not fit their box are
+shrunk down to a minimum font size. Results are memoized per
+(text, font, size, box), so repeated descriptions are laid out once.
+"""
+from functools import lru_cache
+
+from reportlab.pdfbase import pdfmetrics
+
+
+@lru_cache(maxsize=4096)
+def wrap_text(text, font_name, font_size, max_width):
+    """
+    Wrap text so that every line fits within a width in points.
+
+    Words wider than the line on their own are broken between characters.
+
+    Args:
+        text (str): The text to wrap.
+        font_name (str): The name of a registered font.
+        font_size (float): The font size in points.
+        max_width (float): The maximum line width in points.
+
+    Returns:
+        tuple: The wrapped lines.
+    """
+    def width(s):
+        return pdfmetrics.stringWidth(s, font_name, font_size)
+
+    lines = []
+    current = ''
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if width(candidate) <= max_width:
+            current = candidate
+            continue
+        if current:
+            lines.append(current)
+        # Break words that cannot fit on a line by themselves
+        while width(word) > max_width and len(word) > 1:
+            cut = len(word) - 1
+            while cut > 1 and width(word[:cut]) > max_width:
+                cut -= 1
+            lines.append(word[:cut])
+            word = word[cut:]
+        current = word
+    if current:
+        lines.append(current)
+    return tuple(lines)
+
+
+@lru_cache(maxsize=4096)
+def fit_text(text, font_name, font_size, max_width, max_height, min_size=None, line_spacing=2):
+    """
+    Wrap text into a box, shrinking the font until the block fits its height.
+
+    Args:
+        text (str): The text to lay out.
+        font_name (str): The name of a registered font.
+        font_size (float): The preferred font size in points.
+        max_width (float): The width of the box in points.
+        max_height (float): The height of the box in points.
+        min_size (float): The smallest font size to shrink to. Defaults to font_size.
+        line_spacing (float): Extra space between lines in points.
+
+    Returns:
+        tuple: The chosen font size and the wrapped lines. If the text does not fit
+               even at min_size, the lines at min_size are returned.
+    """
+    min_size = font_size if min_size is None else min_size
+    size = font_size
+    while True:
+        lines = wrap_text(text, font_name, size, max_width)
+        if len(lines) * (size + line_spacing) <= max_height or size <= min_size:
+            return size, lines
+        size = max(min_size, size - 0.5)
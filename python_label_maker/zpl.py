@@ -0,0 +1,284 @@
+"""
+ZPL output for Zebra thermal printers.
+
+Labels are laid out from the same compiled plan as the PDF renderer but emitted
+as ZPL: text uses the printer-resident scalable font, and images are dithered
+to 1-bit graphics once. A graphic is sent inline with ``^GF`` the first time
+it is used; once it repeats it is downloaded to printer memory with ``~DG`` and
+recalled with ``^XG``, and stored graphics are deleted again with ``^ID`` when
+they outgrow ``zpl.graphic_memory_kilobytes``. Barcodes use the printer's own
+``^BC``/``^BQ`` symbologies. Jobs are a few KB per label and print at the
+printer's native speed.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from functools import lru_cache
+
+from PIL import Image
+from loguru import logger
+
+from . import assets
+from . import barcodes
+from . import image_cache
+from . import metrics
+from . import text_layout
+from .plan import get_plan
+
+# Line break inside a ^FB field block
+LINE_BREAK = '\\&'
+
+
+def points_to_dots(points, dpi):
+    """
+    Convert points to printer dots.
+
+    Args:
+        points (float): The value in points.
+        dpi (int): The printer resolution in dots per inch.
+
+    Returns:
+        int: The value in dots.
+    """
+    return int(round(points / 72 * dpi))
+
+
+def escape(text):
+    """
+    Escape text for a ``^FH``-prefixed ZPL field.
+
+    Args:
+        text (str): The text to escape.
+
+    Returns:
+        str: The text with ZPL control characters hex-escaped.
+    """
+    return text.replace('_', '_5F').replace('^', '_5E').replace('~', '_7E')
+
+
+@lru_cache(maxsize=512)
+def graphic_field(path, mtime, width, height):
+    """
+    Dither an image to fit within a box of dots and encode it for ZPL, once per (file, size).
+
+    Args:
+        path (str): The path to the image file, e.g. a cached image blob or a logo.
+        mtime (float): The file's modification time, so a replaced file is encoded again.
+        width (int): The maximum width in dots.
+        height (int): The maximum height in dots.
+
+    Returns:
+        tuple: The graphic's object name, total bytes, bytes per row, hex data and
+               its width and height in dots.
+    """
+    img = Image.open(path)
+    img.thumbnail((width, height), Image.LANCZOS)
+
+    # Flatten transparency onto white and pad rows to whole bytes with white
+    bytes_per_row = (img.width + 7) // 8
+    flattened = Image.new('L', (bytes_per_row * 8, img.height), 255)
+    rgba = img.convert('RGBA')
+    flattened.paste(rgba.convert('L'), (0, 0), rgba)
+
+    # Floyd-Steinberg dithering; PIL uses 1 for white while ZPL uses 1 for black
+    data = bytes(b ^ 0xFF for b in flattened.convert('1').tobytes())
+    name = hashlib.sha1(data).hexdigest()[:8].upper()
+    return name, len(data), bytes_per_row, data.hex().upper(), img.width, img.height
+
+
+class ZplJob:
+    """
+    Writes a ZPL job, keeping only repeated graphics in printer memory.
+
+    Args:
+        config (dict): The configuration dictionary.
+        out (file): A text file object the ZPL is written to.
+        cache (ImageCache): The image cache to read product images from.
+    """
+
+    def __init__(self, config, out, cache=None):
+        self.plan = get_plan(config)
+        zpl_config = config.get('zpl', {})
+        self.dpi = zpl_config.get('dpi', 203)
+        self.font = zpl_config.get('font', '0')
+        self.memory_budget = zpl_config.get('graphic_memory_kilobytes', 1024) * 1024
+        self.out = out
+        self.cache = cache or image_cache.get_default_cache(config)
+        # Names of the graphics used so far; only these are worth storing on a repeat
+        self.seen = set()
+        # Graphics stored in printer memory and their sizes, least recently used first
+        self.stored = OrderedDict()
+        self.stored_bytes = 0
+        self.downloads = 0
+        # Cached file per product image URL, so each image is looked up once per job
+        self.images = {}
+
+    def dots(self, points):
+        return points_to_dots(points, self.dpi)
+
+    def graphic(self, path, max_width, max_height):
+        # Return the field data drawing a graphic and its size: inline the first
+        # time, then downloaded once with ~DG and recalled with ^XG
+        name, total, row, data, width, height = graphic_field(
+            str(path), os.path.getmtime(path), self.dots(max_width), self.dots(max_height)
+        )
+        if name in self.stored:
+            self.stored.move_to_end(name)
+        elif name in self.seen:
+            self.out.write(f"~DGR:{name}.GRF,{total},{row},{data}\n")
+            self.stored[name] = total
+            self.stored_bytes += total
+            self.downloads += 1
+        else:
+            self.seen.add(name)
+            return f"^GFA,{total},{total},{row},{data}", width, height
+        return f"^XGR:{name}.GRF,1,1", width, height
+
+    def trim(self):
+        # Delete least recently used graphics until the stored ones fit the budget;
+        # runs before a label, so no graphic the label recalls is deleted
+        while self.stored_bytes > self.memory_budget and self.stored:
+            name, total = self.stored.popitem(last=False)
+            self.stored_bytes -= total
+            self.out.write(f"^XA^IDR:{name}.GRF^FS^XZ\n")
+            metrics.increment('zpl.graphics_deleted')
+
+    def barcode(self, item, label_height):
+        # Module width from the encoded symbol, so the printed barcode fits the configured box
+        barcode_plan = self.plan.barcode
+        value = barcodes.barcode_value(item, barcode_plan.field)
+        if value is None:
+            return None
+        try:
+            symbol = barcodes.encode(barcode_plan.symbology, value)
+        except ValueError as e:
+            logger.warning(f"Skipping barcode for '{value}': {e}")
+            metrics.increment('barcodes.failed')
+            return None
+        quiet = barcodes.QUIET_MODULES[barcode_plan.symbology]
+        width = self.dots(barcode_plan.width)
+        height = self.dots(barcode_plan.height)
+        x = self.dots(barcode_plan.x_offset)
+        bottom = label_height - self.dots(barcode_plan.y_offset)
+        if barcode_plan.symbology == 'qr':
+            magnification = max(1, min(10, min(width, height) // symbol.width))
+            size = symbol.modules * magnification
+            return (
+                f"^FO{x + quiet * magnification},{bottom - quiet * magnification - size}"
+                f"^BQN,2,{magnification}^FH^FDLA,{escape(value)}^FS"
+            )
+        module = max(1, width // symbol.width)
+        return f"^FO{x + quiet * module},{bottom - height}^BY{module}^BCN,{height},N,N,N,A^FH^FD{escape(value)}^FS"
+
+    def write_label(self, item):
+        """
+        Write one label for an item.
+
+        Args:
+            item (dict): The item dictionary containing the product information.
+        """
+        plan = self.plan
+        label_width = self.dots(plan.label_width)
+        label_height = self.dots(plan.label_height)
+        commands = []
+
+        self.trim()
+
+        # Product image, far left and centered vertically
+        image_url = item.get('item_img')
+        if image_url and image_url not in self.images:
+            self.images[image_url] = None
+            try:
+                if self.cache.get(image_url) is None:
+                    logger.warning(f"Image not cached and offline mode is enabled: {image_url}")
+                else:
+                    self.images[image_url] = self.cache.path(image_url)
+            except Exception as e:
+                logger.error(f"Error processing image from {image_url}: {str(e)}")
+        if image_url and self.images[image_url]:
+            try:
+                field, _, height = self.graphic(self.images[image_url], plan.image.max_width, plan.image.max_height)
+                commands.append(f"^FO{self.dots(plan.image.x_offset)},{(label_height - height) // 2}{field}^FS")
+            except Exception as e:
+                logger.error(f"Error processing image from {image_url}: {str(e)}")
+
+        # Logo, bottom-right
+        logo = assets.logo_path(item, plan.logo.directory, plan.logo.default)
+        if logo:
+            field, width, height = self.graphic(logo, plan.logo.width, plan.label_height)
+            x = self.dots(plan.logo.x_offset)
+            y = label_height - self.dots(plan.logo.y_offset) - height
+            commands.append(f"^FO{x},{y}{field}^FS")
+
+        # Product code, centered at the top
+        code = plan.product_code
+        code_height = self.dots(code.size)
+        code_top = label_height - self.dots(code.baseline_offset) - code_height
+        commands.append(
+            f"^FO0,{max(code_top, 0)}^A{self.font}N,{code_height},{code_height}"
+            f"^FB{label_width},1,0,C^FH^FD{escape(item['name'])}^FS"
+        )
+
+        # Description, wrapped here and broken with \& so the printer keeps the same lines
+        description = item.get('description')
+        if description:
+            desc = plan.description
+            # Resident font metrics are close to Helvetica's, which is good enough to size the block
+            size, lines = text_layout.fit_text(
+                description, 'Helvetica', desc.size, desc.width, desc.height, desc.min_size, desc.line_spacing
+            )
+            text = LINE_BREAK.join(escape(line) for line in lines)
+            line_height = size + desc.line_spacing
+            block_top = desc.center_offset + len(lines) * line_height / 2
+            commands.append(
+                f"^FO{self.dots(desc.x_offset)},{max(label_height - self.dots(block_top), 0)}"
+                f"^A{self.font}N,{self.dots(size)},{self.dots(size)}"
+                f"^FB{self.dots(desc.width)},{len(lines)},{self.dots(desc.line_spacing)},L"
+                f"^FH^FD{text}^FS"
+            )
+
+        # Barcode, native printer symbology sized from the same encoding as the PDF renderer
+        if plan.barcode.enabled:
+            command = self.barcode(item, label_height)
+            if command:
+                commands.append(command)
+
+        if plan.border.enabled:
+            commands.append(f"^FO0,0^GB{label_width},{label_height},{max(1, self.dots(plan.border.width))}^FS")
+
+        self.out.write(f"^XA^CI28^PW{label_width}^LL{label_height}\n")
+        self.out.write('\n'.join(commands))
+        self.out.write("\n^XZ\n")
+        metrics.increment('labels.drawn')
+
+    def finish(self):
+        """
+        Delete the graphics this job still has stored in printer memory.
+        """
+        for name in sorted(self.stored):
+            self.out.write(f"^XA^IDR:{name}.GRF^FS^XZ\n")
+        self.stored.clear()
+        self.stored_bytes = 0
+
+
+def create_label_zpl(config, items, filename):
+    """
+    Write a ZPL job with one label per item.
+
+    Args:
+        config (dict): The configuration dictionary.
+        items (iterable): The item dictionaries to create labels for.
+        filename (str): The path to the ZPL file to write.
+
+    Returns:
+        str: The path to the created ZPL file.
+    """
+    with open(filename, 'w', encoding='utf-8') as out:
+        job = ZplJob(config, out)
+        count = 0
+        for item in items:
+            job.write_label(item)
+            count += 1
+        job.finish()
+    logger.info(f"Wrote {count} ZPL labels with {job.downloads} stored graphics")
+    return filename
@@ -8,6 +8,9 @@ setup(
         "reportlab",
         "Pillow",
     ],
+    extras_require={
+        "scripts": ["numpy"],
+    },
     author="Andrew Logan",
     author_email="drewthomaslogan5201@gmail.com",
     description="A label maker for Netsuite item records",
@@ -16,7 +19,10 @@ setup(
     url="https://github.com/alogan5201/python_label_maker",
     entry_points={
         'console_scripts': [
-            'python_label_maker=python_label_maker.main:main',
+            'python_label_maker=python_label_maker.main:run',
+            'python_label_maker_render=python_label_maker.main:run_render',
+            'python_label_maker_sync=python_label_maker.main:run_sync',
+            'python_label_maker_service=python_label_maker.service:run',
         ],
     },
 )
\ No newline at end of file
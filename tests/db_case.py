@@ -0,0 +1,25 @@
+import os
+import tempfile
+import unittest
+
+from python_label_maker import db
+
+
+class TempDatabaseTestCase(unittest.TestCase):
+    """
+    Runs each test against an empty item cache in a temporary directory.
+
+    Subclasses that need to prepare the database file before the schema exists
+    set ``create_tables`` to False and call ``db.create_database_and_table`` themselves.
+    """
+
+    create_tables = True
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(setattr, db, 'db_file', db.db_file)
+        db.db_file = os.path.join(self.tmp.name, 'db.sqlite')
+        self.addCleanup(db.close_connection)
+        if self.create_tables:
+            db.create_database_and_table()
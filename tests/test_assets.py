@@ -0,0 +1,59 @@
+import io
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+from reportlab.pdfgen import canvas
+
+from python_label_maker import assets
+
+
+def logo_forms(c):
+    return [name for name in c._doc.idToObject if 'logo_' in name]
+
+
+class TestAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'wac.png')
+        Image.new('RGB', (200, 50), 'black').save(self.path)
+        assets.load_logo.cache_clear()
+        self.addCleanup(assets.load_logo.cache_clear)
+
+    def test_logo_form_is_reused_within_a_document(self):
+        c = canvas.Canvas(io.BytesIO())
+        for y in (0, 100, 200):
+            self.assertEqual(assets.draw_logo(c, self.path, 10, y, 100), (100, 25))
+        c.showPage()
+        assets.draw_logo(c, self.path, 10, 0, 100)
+        self.assertEqual(len(logo_forms(c)), 1)
+        self.assertEqual(assets.load_logo.cache_info().misses, 1)
+
+    def test_each_document_defines_its_own_form(self):
+        for _ in range(2):
+            c = canvas.Canvas(io.BytesIO())
+            assets.draw_logo(c, self.path, 0, 0, 100)
+            self.assertEqual(len(logo_forms(c)), 1)
+        # The decoded logo is shared across documents
+        self.assertEqual(assets.load_logo.cache_info().misses, 1)
+
+    def test_other_width_gets_its_own_form(self):
+        c = canvas.Canvas(io.BytesIO())
+        assets.draw_logo(c, self.path, 0, 0, 100)
+        assets.draw_logo(c, self.path, 0, 0, 50)
+        self.assertEqual(len(logo_forms(c)), 2)
+
+    def test_logo_path_falls_back_to_default(self):
+        Image.new('RGB', (10, 10)).save(os.path.join(self.tmp.name, 'default.jpg'))
+        self.assertEqual(assets.logo_path({'manufacturer': 'WAC Lighting'}, self.tmp.name, 'default.jpg'), self.path)
+        self.assertEqual(
+            assets.logo_path({'manufacturer': 'Tech'}, self.tmp.name, 'default.jpg'),
+            os.path.join(self.tmp.name, 'default.jpg'),
+        )
+        self.assertIsNone(assets.logo_path({}, self.tmp.name, 'missing.jpg'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import io
+import unittest
+
+from reportlab.pdfgen import canvas
+
+from python_label_maker import barcodes
+from python_label_maker import file_utils
+from python_label_maker import formats
+from python_label_maker import manifest
+from python_label_maker import zpl
+
+from tests.test_zpl import FakeCache
+
+
+class TestBarcodes(unittest.TestCase):
+    def test_symbols_are_encoded_once(self):
+        barcodes.encode.cache_clear()
+        symbol = barcodes.encode('code128', '12345')
+        self.assertIs(barcodes.encode('code128', '12345'), symbol)
+        self.assertEqual(barcodes.encode.cache_info().misses, 1)
+        # Start, 12, 34, code B, 5, check and stop symbols of 11 modules, a 2 module stop bar and the quiet zones
+        self.assertEqual(symbol.width, 7 * 11 + 2 + 2 * barcodes.QUIET_MODULES['code128'])
+
+        qr = barcodes.encode('qr', '12345')
+        self.assertEqual(qr.modules, 21)
+        self.assertEqual(qr.width, qr.height)
+
+    def test_unencodable_values_are_skipped(self):
+        with self.assertRaises(ValueError):
+            barcodes.encode('code128', 'é')
+        c = canvas.Canvas(io.BytesIO())
+        self.assertFalse(barcodes.draw_barcode(c, 'code128', 'é', 0, 0, 72, 20))
+
+    def test_repeated_barcodes_share_one_form(self):
+        c = canvas.Canvas(io.BytesIO())
+        for x in (0, 100):
+            self.assertTrue(barcodes.draw_barcode(c, 'qr', 'A-1', x, 0, 72, 72))
+        self.assertEqual(len([name for name in c._doc.idToObject if 'barcode_' in name]), 1)
+
+    def test_barcode_value(self):
+        self.assertEqual(barcodes.barcode_value({'netsuite_id': 42}, 'netsuite_id'), '42')
+        self.assertIsNone(barcodes.barcode_value({'netsuite_id': None}, 'netsuite_id'))
+
+    def test_zpl_uses_printer_symbologies(self):
+        config = formats.apply_format(file_utils.load_config(), 'ZEBRA_4X2')
+        config['content']['barcode'] = dict(config['content']['barcode'], enabled=True, symbology='code128')
+        out = io.StringIO()
+        zpl.ZplJob(config, out, FakeCache(None)).write_label({'name': 'A-1', 'netsuite_id': 12345})
+        self.assertIn('^BCN,61,N,N,N,A^FH^FD12345^FS', out.getvalue())
+
+    def test_fingerprint_covers_barcode(self):
+        config = file_utils.load_config()
+        config['content']['barcode'] = dict(config['content']['barcode'], enabled=True, symbology='code128')
+        fingerprint = manifest.sheet_fingerprint(config, [{'name': 'A-1', 'netsuite_id': 1}], None)
+
+        # The value filled in by a sync, a changed id, and a different symbology all redraw the sheet
+        self.assertNotEqual(manifest.sheet_fingerprint(config, [{'name': 'A-1', 'netsuite_id': None}], None), fingerprint)
+        self.assertNotEqual(manifest.sheet_fingerprint(config, [{'name': 'A-1', 'netsuite_id': 2}], None), fingerprint)
+        config['content']['barcode']['symbology'] = 'qr'
+        self.assertNotEqual(manifest.sheet_fingerprint(config, [{'name': 'A-1', 'netsuite_id': 1}], None), fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import unittest
+
+from python_label_maker import db
+
+from tests.db_case import TempDatabaseTestCase
+
+
+class TestIterItems(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        conn = sqlite3.connect(db.db_file)
+        conn.executemany(
+            'INSERT INTO items (name, description, manufacturer) VALUES (?, ?, ?)',
+            [(f"ITEM {i:02d}", f"Item number {i}", 'WAC' if i % 2 else 'LUMIEN LIGHTING') for i in range(25)],
+        )
+        conn.commit()
+        conn.close()
+
+    def test_yields_every_item_across_pages(self):
+        names = [item['name'] for item in db.iter_items(page_size=4)]
+        self.assertEqual(names, [f"ITEM {i:02d}" for i in range(25)])
+
+    def test_filters_by_manufacturer_and_name_range(self):
+        items = list(db.iter_items(page_size=3, manufacturer='WAC', name_from='ITEM 05', name_to='ITEM 11'))
+        self.assertEqual([item['name'] for item in items], ['ITEM 05', 'ITEM 07', 'ITEM 09', 'ITEM 11'])
+
+    def test_is_lazy(self):
+        items = db.iter_items(page_size=2)
+        self.assertEqual(next(items)['name'], 'ITEM 00')
+        items.close()
+
+    def test_database_error_ends_the_stream_with_an_error(self):
+        items = db.iter_items(page_size=10)
+        self.assertEqual(next(items)['name'], 'ITEM 00')
+        db.get_connection().execute('ALTER TABLE items RENAME TO moved_items')
+        with self.assertRaises(sqlite3.Error):
+            list(items)
+
+
+class TestUpsertItems(TempDatabaseTestCase):
+    def test_inserts_and_updates_by_name(self):
+        db.upsert_items([
+            {'name': 'A', 'description': 'first', 'manufacturer': 'WAC'},
+            {'name': 'B', 'description': 'second', 'manufacturer': 'WAC'},
+        ])
+        written = db.upsert_items([{'name': 'A', 'description': 'changed', 'manufacturer': 'WAC'}, {'name': ''}])
+        self.assertEqual(written, 1)
+        items = {item['name']: item for item in db.get_cached_items()}
+        self.assertEqual(len(items), 2)
+        self.assertEqual(items['A']['description'], 'changed')
+
+    def test_insert_item_uses_upsert(self):
+        db.insert_item('A', 'desc', 'http://logo', 'http://img', 'WAC')
+        db.insert_item('A', 'desc', 'http://logo', 'http://img', 'WAC')
+        self.assertEqual(len(db.get_cached_items()), 1)
+
+    def test_migrates_old_schema(self):
+        db.close_connection()
+        os.remove(db.db_file)
+        conn = sqlite3.connect(db.db_file)
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL, description TEXT, company TEXT, item_img TEXT)')
+        conn.executemany('INSERT INTO items (name) VALUES (?)', [('A',), ('A',)])
+        conn.commit()
+        conn.close()
+
+        db.create_database_and_table()
+        db.upsert_items([{'name': 'A', 'manufacturer': 'WAC', 'company_img': 'http://logo'}])
+        items = db.get_cached_items()
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['manufacturer'], 'WAC')
+
+    def test_deduplicates_names_only_once(self):
+        db.close_connection()
+        statements = []
+        conn = db.get_connection()
+        conn.set_trace_callback(statements.append)
+        db._create_schema(conn)
+        self.assertFalse([statement for statement in statements if statement.startswith('DELETE')])
+
+
+class TestSyncState(TempDatabaseTestCase):
+    def test_watermarks_are_per_manufacturer(self):
+        self.assertIsNone(db.get_watermark('WAC'))
+        db.set_watermark('WAC', '2026-01-01 00:00:00')
+        db.set_watermark('WAC', '2026-02-01 00:00:00')
+        self.assertEqual(db.get_watermark('WAC'), '2026-02-01 00:00:00')
+        self.assertIsNone(db.get_watermark('LUMIEN LIGHTING'))
+
+    def test_stale_items_are_skipped_until_upserted_again(self):
+        db.upsert_items([
+            {'name': 'A', 'manufacturer': 'WAC', 'netsuite_id': 1},
+            {'name': 'B', 'manufacturer': 'WAC', 'netsuite_id': 2},
+        ])
+        self.assertEqual(db.mark_stale([2]), 1)
+        self.assertEqual([item['name'] for item in db.iter_items()], ['A'])
+        self.assertEqual(len(list(db.iter_items(include_stale=True))), 2)
+
+        db.upsert_items([{'name': 'B', 'manufacturer': 'WAC'}])
+        self.assertEqual([item['name'] for item in db.iter_items()], ['A', 'B'])
+        self.assertEqual(db.get_netsuite_ids('WAC'), [1, 2])
+
+
+
+class TestSearch(TempDatabaseTestCase):
+    create_tables = False
+
+    def setUp(self):
+        super().setUp()
+        # Rows written before the full-text index existed are indexed when it is created
+        conn = sqlite3.connect(db.db_file)
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL, description TEXT)')
+        conn.execute("INSERT INTO items (name, description) VALUES ('WAC-DL-01', 'Recessed LED downlight')")
+        conn.commit()
+        conn.close()
+        db.create_database_and_table()
+        db.upsert_items([
+            {'name': 'WAC-DL-02', 'description': 'Surface downlight, black', 'manufacturer': 'WAC'},
+            {'name': 'LUM-PD-01', 'description': 'Downlight style pendant', 'manufacturer': 'LUMIEN LIGHTING'},
+            {'name': 'WAC-TR-01', 'description': 'Track head', 'manufacturer': 'WAC'},
+        ])
+
+    def names(self, **filters):
+        return [item['name'] for item in db.iter_items(page_size=2, **filters)]
+
+    def test_search_matches_every_word_as_prefix(self):
+        self.assertEqual(self.names(search='downlight'), ['WAC-DL-01', 'WAC-DL-02', 'LUM-PD-01'])
+        self.assertEqual(self.names(search='down black', manufacturer='WAC'), ['WAC-DL-02'])
+        self.assertEqual(self.names(search='WAC-TR'), ['WAC-TR-01'])
+
+    def test_index_follows_updates(self):
+        db.upsert_items([{'name': 'WAC-TR-01', 'description': 'Track downlight', 'manufacturer': 'WAC'}])
+        self.assertIn('WAC-TR-01', self.names(search='downlight'))
+        db.upsert_items([{'name': 'WAC-DL-02', 'description': 'Surface cylinder', 'manufacturer': 'WAC'}])
+        self.assertNotIn('WAC-DL-02', self.names(search='downlight'))
+
+    def test_search_items_ranks_name_matches_first(self):
+        db.upsert_items([{'name': 'PENDANT-1', 'description': 'Glass', 'manufacturer': 'WAC'}])
+        items = db.search_items('pendant')
+        self.assertEqual([item['name'] for item in items], ['PENDANT-1', 'LUM-PD-01'])
+
+    def test_selects_skus(self):
+        self.assertEqual(self.names(names=['WAC-TR-01', 'WAC-DL-01', 'MISSING']), ['WAC-DL-01', 'WAC-TR-01'])
+        self.assertEqual(self.names(names=[]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from python_label_maker import derivatives
+from python_label_maker.image_cache import ImageCache
+from python_label_maker.label_maker import process_image
+from tests.test_image_cache import FakeResponse, FakeSession
+
+
+def encode(img, format='PNG'):
+    buffer = io.BytesIO()
+    img.save(buffer, format)
+    return buffer.getvalue()
+
+
+def photo(size=(800, 600)):
+    return Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+
+
+class TestDerivatives(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_pixel_size_matches_dpi_without_upscaling(self):
+        self.assertEqual(derivatives.pixel_size((800, 600), 72, 54, 300), (300, 225))
+        self.assertEqual(derivatives.pixel_size((100, 75), 72, 54, 300), (100, 75))
+
+    def test_flat_artwork_is_png_and_alpha_is_flattened(self):
+        img = Image.new('RGBA', (40, 20), (0, 0, 0, 0))
+        img.paste((200, 0, 0, 255), (0, 0, 20, 20))
+        path = derivatives.write_derivative(img, self.tmp.name, 'ab' * 32, (40, 20))
+        self.assertTrue(path.endswith('.png'))
+        prepared = Image.open(path)
+        self.assertEqual(prepared.mode, 'RGB')
+        self.assertEqual(prepared.getpixel((30, 10)), (255, 255, 255))
+        self.assertEqual(derivatives.find_derivative(self.tmp.name, 'ab' * 32, (40, 20)), path)
+
+    def test_process_image_prepares_each_image_once(self):
+        url = 'http://x/a.png'
+        cache = ImageCache(os.path.join(self.tmp.name, 'items'), session=FakeSession({url: FakeResponse(200, encode(photo()))}))
+        path, width, height = process_image(url, 72, 72, cache=cache, dpi=300)
+        self.assertTrue(path.endswith('.jpg'))
+        self.assertEqual(Image.open(path).size, (300, 225))
+        self.assertEqual((width, height), (72, 54))
+
+        with mock.patch.object(derivatives, 'write_derivative') as write:
+            self.assertEqual(process_image(url, 72, 72, cache=cache, dpi=300)[0], path)
+            write.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from reportlab.pdfbase import pdfmetrics
+
+from python_label_maker import fonts
+
+FONT_FILE = 'input/fonts/arial_black.ttf'
+
+
+class TestFonts(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def test_cached_font_matches_parsed_font(self):
+        path = os.path.join(fonts.file_utils.BASE_DIR, FONT_FILE)
+        parsed = fonts.load_font('Test-Cached', path, self.cache_dir.name)
+        self.assertEqual(len(os.listdir(self.cache_dir.name)), 1)
+
+        # The font file must not be parsed again
+        with mock.patch.object(fonts.TTFontFace, '__init__', side_effect=AssertionError('parsed')):
+            cached = fonts.load_font('Test-Cached', path, self.cache_dir.name)
+        self.assertEqual(cached.stringWidth('Label Maker', 10), parsed.stringWidth('Label Maker', 10))
+        self.assertEqual(cached.face.makeSubset([65, 66]), parsed.face.makeSubset([65, 66]))
+
+    def test_fonts_are_registered_once(self):
+        config_fonts = {'primary': {'name': 'Test-Once', 'file': FONT_FILE}}
+        with mock.patch.object(fonts.pdfmetrics, 'registerFont', wraps=pdfmetrics.registerFont) as register:
+            fonts.register_fonts(config_fonts, self.cache_dir.name)
+            fonts.register_fonts(config_fonts, self.cache_dir.name)
+            fonts.register_fonts(dict(config_fonts), None)
+        self.assertEqual(register.call_count, 1)
+        self.assertIn('Test-Once', pdfmetrics.getRegisteredFontNames())
+
+
+if __name__ == '__main__':
+    unittest.main()
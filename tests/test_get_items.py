@@ -0,0 +1,143 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+from python_label_maker import db
+from python_label_maker import get_items
+
+from tests.db_case import TempDatabaseTestCase
+
+
+def record(netsuite_id, name, last_modified, is_inactive='F'):
+    return {
+        'id': netsuite_id,
+        'name': name,
+        'display_name': name,
+        'description': f"{name} description",
+        'manufacturer': 'LUMIEN LIGHTING',
+        'item_img': f"/core/media/media.nl?id={netsuite_id}",
+        'is_inactive': is_inactive,
+        'last_modified': last_modified,
+    }
+
+
+class TestSyncManufacturer(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.queries = []
+
+        # No logo downloads, and logos are written to the temporary directory
+        self.logo_directory = os.path.join(self.tmp.name, 'companies')
+        patcher = mock.patch.object(get_items, 'download_logo', return_value=True)
+        self.download_logo = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(get_items.get_config()['content']['logo'], directory=self.logo_directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sync(self, records, deleted=(), full=False, on_page=None):
+        def changed(query):
+            # Applies the watermark comparison the query asks for
+            if 'item.lastmodifieddate >' not in query['query']:
+                return records
+            since = query['params'][1]
+            if 'item.lastmodifieddate >=' in query['query']:
+                return [record for record in records if record['last_modified'] >= since]
+            return [record for record in records if record['last_modified'] > since]
+
+        async def fake_process_data(query):
+            self.queries.append(query)
+            if 'COUNT(*)' in query['query']:
+                ids = [record['id'] for record in changed(query)]
+                return {'records': [{'total': len(ids), 'first_id': min(ids, default=None), 'last_id': max(ids, default=None)}]}
+            if 'deletedrecord' in query['query']:
+                # None is what process_data returns for a failed RESTlet call
+                return None if deleted is None else {'records': [{'id': netsuite_id} for netsuite_id in deleted]}
+            after_id, last_id, limit = query['params'][-3:]
+            page = sorted((record for record in changed(query) if after_id < record['id'] <= last_id), key=lambda record: record['id'])
+            if on_page:
+                on_page(records)
+            return {'records': page[:limit]}
+
+        with mock.patch.object(get_items, 'process_data', fake_process_data):
+            asyncio.run(get_items.sync_manufacturer('LUMIEN LIGHTING', full=full))
+
+    def pages(self):
+        return sorted(query['params'][-3:-1] for query in self.queries if 'ROWNUM' in query['query'])
+
+    def test_incremental_sync_uses_watermark_and_marks_deletions(self):
+        self.sync([
+            record(1, 'A', '2026-01-01 10:00:00'),
+            record(2, 'B', '2026-01-02 10:00:00'),
+            record(3, 'C', '2026-01-03 10:00:00'),
+        ])
+        self.assertEqual(db.get_watermark('LUMIEN LIGHTING'), '2026-01-03 10:00:00')
+
+        self.queries.clear()
+        self.sync([record(2, 'B', '2026-01-04 10:00:00', is_inactive='T')], deleted=[3])
+        self.assertEqual(self.queries[0]['params'], ['LUMIEN LIGHTING', '2026-01-03 10:00:00'])
+        self.assertEqual(self.queries[-1]['params'], ['2026-01-03 10:00:00'])
+        self.assertEqual([item['name'] for item in db.iter_items()], ['A'])
+        self.assertEqual(db.get_watermark('LUMIEN LIGHTING'), '2026-01-04 10:00:00')
+
+    def test_items_modified_in_the_watermark_second_are_synced(self):
+        self.sync([record(1, 'A', '2026-01-01 10:00:00')])
+        # B was modified in the same second as A but committed after the first sync read
+        self.sync([record(1, 'A', '2026-01-01 10:00:00'), record(2, 'B', '2026-01-01 10:00:00')])
+        self.assertEqual([item['name'] for item in db.iter_items()], ['A', 'B'])
+        self.assertEqual(db.get_watermark('LUMIEN LIGHTING'), '2026-01-01 10:00:00')
+
+    def test_failed_upsert_keeps_watermark(self):
+        self.sync([record(1, 'A', '2026-01-01 10:00:00')])
+        with mock.patch.object(get_items, 'upsert_items', return_value=0):
+            with self.assertRaises(get_items.SyncError):
+                self.sync([record(2, 'B', '2026-01-02 10:00:00')])
+        self.assertEqual(db.get_watermark('LUMIEN LIGHTING'), '2026-01-01 10:00:00')
+
+    def test_failed_deletion_query_keeps_watermark(self):
+        self.sync([record(1, 'A', '2026-01-01 10:00:00')])
+        with self.assertRaises(get_items.SyncError):
+            self.sync([record(2, 'B', '2026-01-02 10:00:00')], deleted=None)
+        self.assertEqual(db.get_watermark('LUMIEN LIGHTING'), '2026-01-01 10:00:00')
+
+    def test_full_sync_marks_missing_items_stale(self):
+        self.sync([record(1, 'A', '2026-01-01 10:00:00'), record(2, 'B', '2026-01-01 10:00:00')])
+        self.queries.clear()
+        self.sync([record(1, 'A', '2026-01-01 10:00:00')], full=True)
+        self.assertEqual(len(self.queries[0]['params']), 1)
+        self.assertEqual([item['name'] for item in db.iter_items()], ['A'])
+
+    def test_fetches_every_page(self):
+        records = [record(i, f"ITEM {i:03d}", '2026-01-01 10:00:00') for i in range(1, 26)]
+        with mock.patch.dict(get_items.config['netsuite'], page_size=10):
+            self.sync(records)
+        self.assertEqual(self.pages(), [[0, 9], [9, 18], [18, 25]])
+        self.assertEqual(len(list(db.iter_items())), 25)
+        # Once per manufacturer, not once per record
+        self.download_logo.assert_called_once_with(
+            get_items.COMPANY_LOGO_LINKS['lumien'], os.path.join(self.logo_directory, 'lumien.png')
+        )
+
+    def test_dense_ranges_are_paged_by_key(self):
+        records = [record(i, f"ITEM {i:03d}", '2026-01-01 10:00:00') for i in [*range(1, 13), 100]]
+        with mock.patch.dict(get_items.config['netsuite'], page_size=5):
+            self.sync(records)
+        self.assertEqual(self.pages(), [[0, 34], [5, 34], [10, 34], [34, 68], [68, 100]])
+        self.assertEqual(len(list(db.iter_items())), 13)
+
+    def test_items_modified_during_sync_do_not_shift_pages(self):
+        records = [record(i, f"ITEM {i:03d}", '2026-01-01 10:00:00') for i in range(2, 22)]
+
+        def modify(records):
+            # An item with a smaller id starts matching the query while pages are fetched
+            if records[0]['id'] != 1:
+                records.insert(0, record(1, 'ITEM 001', '2026-01-01 10:00:01'))
+
+        with mock.patch.dict(get_items.config['netsuite'], page_size=5):
+            self.sync(records, on_page=modify)
+        names = {item['name'] for item in db.iter_items()}
+        self.assertTrue({f"ITEM {i:03d}" for i in range(2, 22)} <= names)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+import requests
+
+from python_label_maker import metrics
+from python_label_maker.http_client import CircuitOpenError, HttpClient
+
+from tests.test_image_cache import FakeResponse
+
+
+class SequenceSession:
+    """Returns (or raises) the given outcomes in order."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_retries_transient_failures(self):
+        session = SequenceSession([
+            FakeResponse(503), requests.ConnectionError('reset'), FakeResponse(200, b'ok'),
+        ])
+        client = HttpClient(session=session, backoff=0)
+
+        response = client.get('http://x/a.png')
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(session.calls, 3)
+        self.assertEqual(metrics.snapshot()['counters']['http.retries'], 2)
+
+    def test_returns_last_response_after_retries(self):
+        session = SequenceSession([FakeResponse(500)] * 3)
+        client = HttpClient(session=session, retries=2, backoff=0)
+
+        self.assertEqual(client.get('http://x/a.png').status_code, 500)
+        self.assertEqual(session.calls, 3)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        session = SequenceSession([requests.Timeout('slow')] * 2)
+        client = HttpClient(session=session, retries=0, backoff=0, failure_threshold=2)
+
+        for _ in range(2):
+            with self.assertRaises(requests.Timeout):
+                client.get('http://x/a.png')
+        with self.assertRaises(CircuitOpenError):
+            client.get('http://x/b.png')
+        self.assertEqual(session.calls, 2)
+
+    def test_host_limits_match_patterns(self):
+        client = HttpClient(session=SequenceSession([]), per_host_limit=8, host_limits={'*.netsuite.com': 2})
+        semaphore, _ = client._host_state('123.app.netsuite.com')
+        self.assertEqual(semaphore._value, 2)
+        semaphore, _ = client._host_state('i.imgur.com')
+        self.assertEqual(semaphore._value, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
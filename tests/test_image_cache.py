@@ -0,0 +1,164 @@
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+
+import requests
+from PIL import Image
+
+from python_label_maker import derivatives
+from python_label_maker.image_cache import ImageCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.append((url, headers or {}))
+        return self.responses[url]
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_cache(self, session, **kwargs):
+        # Derivatives go next to the cache directory, inside the temporary directory
+        return ImageCache(os.path.join(self.tmp.name, 'items'), session=session, **kwargs)
+
+    def test_hit_skips_network(self):
+        session = FakeSession({'http://x/a.png': FakeResponse(200, b'aaa', {'ETag': '"1"'})})
+        cache = self.make_cache(session)
+        self.assertEqual(cache.get('http://x/a.png'), b'aaa')
+        self.assertEqual(cache.get('http://x/a.png'), b'aaa')
+        self.assertEqual(len(session.calls), 1)
+
+    def test_revalidates_with_etag(self):
+        session = FakeSession({'http://x/a.png': FakeResponse(200, b'aaa', {'ETag': '"1"'})})
+        cache = self.make_cache(session, max_age=0)
+        cache.get('http://x/a.png')
+        session.responses['http://x/a.png'] = FakeResponse(304)
+        self.assertEqual(cache.get('http://x/a.png'), b'aaa')
+        self.assertEqual(session.calls[-1][1]['If-None-Match'], '"1"')
+
+    def test_offline_serves_cached_bytes_only(self):
+        session = FakeSession({'http://x/a.png': FakeResponse(200, b'aaa')})
+        cache = self.make_cache(session)
+        cache.get('http://x/a.png')
+        cache.flush()
+
+        offline = self.make_cache(FakeSession({}), offline=True)
+        self.assertEqual(offline.get('http://x/a.png'), b'aaa')
+        self.assertIsNone(offline.get('http://x/b.png'))
+
+    def test_evicts_least_recently_used(self):
+        session = FakeSession({
+            'http://x/a.png': FakeResponse(200, b'a' * 10),
+            'http://x/b.png': FakeResponse(200, b'b' * 10),
+        })
+        cache = self.make_cache(session, max_bytes=15)
+        cache.get('http://x/a.png')
+        time.sleep(0.01)
+        cache.get('http://x/b.png')
+        self.assertIsNone(cache.entry('http://x/a.png'))
+        self.assertIsNotNone(cache.entry('http://x/b.png'))
+        self.assertEqual(cache.total_bytes(), 10)
+
+    def test_shared_content_is_stored_once(self):
+        session = FakeSession({
+            'http://x/a.png': FakeResponse(200, b'same'),
+            'http://y/a.png': FakeResponse(200, b'same'),
+        })
+        cache = self.make_cache(session)
+        cache.get('http://x/a.png')
+        cache.get('http://y/a.png')
+        self.assertEqual(cache.total_bytes(), 4)
+
+    def test_index_is_written_in_batches(self):
+        session = FakeSession({f'http://x/{n}.png': FakeResponse(200, bytes([n]) * 4) for n in range(5)})
+        cache = self.make_cache(session, flush_every=3)
+        for n in range(2):
+            cache.get(f'http://x/{n}.png')
+        self.assertFalse(cache.index_path.exists())
+
+        cache.get('http://x/2.png')
+        self.assertIsNotNone(self.make_cache(FakeSession({})).entry('http://x/2.png'))
+
+        cache.get('http://x/3.png')
+        cache.flush()
+        reopened = self.make_cache(FakeSession({}))
+        self.assertIsNotNone(reopened.entry('http://x/3.png'))
+        self.assertEqual(reopened.total_bytes(), 16)
+
+    def test_flush_merges_entries_of_other_caches(self):
+        first = self.make_cache(FakeSession({'http://x/a.png': FakeResponse(200, b'aaa')}))
+        second = self.make_cache(FakeSession({'http://x/b.png': FakeResponse(200, b'bb')}))
+        first.get('http://x/a.png')
+        second.get('http://x/b.png')
+        first.flush()
+        second.flush()
+
+        self.assertIsNotNone(second.entry('http://x/a.png'))
+        self.assertEqual(second.total_bytes(), 5)
+        reopened = self.make_cache(FakeSession({}))
+        self.assertEqual(reopened.total_bytes(), 5)
+
+    def test_total_tracks_replaced_and_evicted_entries(self):
+        session = FakeSession({'http://x/a.png': FakeResponse(200, b'a' * 10)})
+        cache = self.make_cache(session, max_age=0, max_bytes=25)
+        cache.get('http://x/a.png')
+        session.responses['http://x/a.png'] = FakeResponse(200, b'c' * 20)
+        cache.get('http://x/a.png')
+        self.assertEqual(cache.total_bytes(), 20)
+
+        cache.put('http://x/b.png', b'b' * 10)
+        self.assertIsNone(cache.entry('http://x/a.png'))
+        self.assertEqual(cache.total_bytes(), 10)
+
+    def test_evicted_and_replaced_blobs_take_their_derivatives(self):
+        session = FakeSession({'http://x/a.png': FakeResponse(200, b'a' * 10)})
+        cache = self.make_cache(session, max_age=0, max_bytes=25)
+        img = Image.new('RGB', (4, 4), 'red')
+
+        def derive(data):
+            digest = hashlib.sha256(data).hexdigest()
+            for size in ((2, 2), (4, 4)):
+                derivatives.write_derivative(img, cache.derivative_directory, digest, size)
+            return digest
+
+        cache.get('http://x/a.png')
+        first = derive(b'a' * 10)
+        cache.put('http://x/b.png', b'b' * 10)
+        second = derive(b'b' * 10)
+        time.sleep(0.01)
+
+        # The content behind a.png changed, so its old blob and derivatives are unreferenced
+        session.responses['http://x/a.png'] = FakeResponse(200, b'c' * 10)
+        cache.get('http://x/a.png')
+        self.assertIsNone(derivatives.find_derivative(cache.derivative_directory, first, (2, 2)))
+        self.assertFalse(cache._blob_path(first).exists())
+
+        # Going over budget evicts b.png, the least recently used entry
+        cache.put('http://x/d.png', b'd' * 10)
+        self.assertIsNone(cache.entry('http://x/b.png'))
+        self.assertEqual(list((cache.derivative_directory / second[:2]).glob(f"{second}_*")), [])
+        self.assertEqual(cache.total_bytes(), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
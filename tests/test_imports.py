@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds the CLI module may take to import; it measured about 0.1s
+IMPORT_BUDGET = 0.5
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import python_label_maker.main
+seconds = time.perf_counter() - start
+import python_label_maker.get_items
+print(json.dumps({
+    "seconds": seconds,
+    "loaded": [name for name in ("netsuite", "reportlab", "PIL", "icecream") if name in sys.modules],
+}))
+'''
+
+
+class TestImports(unittest.TestCase):
+    def test_cli_imports_fast_and_without_side_effects(self):
+        env = {key: value for key, value in os.environ.items() if not key.startswith('NETSUITE_')}
+        env['PYTHONPATH'] = ROOT
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run(
+                [sys.executable, '-c', PROBE], cwd=directory, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            created = os.listdir(directory)
+        result = json.loads(output.splitlines()[-1])
+
+        self.assertEqual(result['loaded'], [])
+        self.assertEqual(created, [])
+        self.assertLess(result['seconds'], IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+import unittest
+
+from python_label_maker import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_spans_and_counters_are_recorded(self):
+        with metrics.span('stage'):
+            pass
+        metrics.timed('stage')(lambda: None)()
+        metrics.increment('labels.drawn', 3)
+
+        data = metrics.snapshot()
+        self.assertEqual(data['spans']['stage'][0], 2)
+        self.assertEqual(data['counters'], {'labels.drawn': 3})
+
+    def test_worker_snapshots_are_merged(self):
+        metrics.increment('labels.drawn', 2)
+        metrics.record('stage', 1.0)
+        worker = metrics.snapshot(reset=True)
+        self.assertEqual(metrics.snapshot(), {'spans': {}, 'counters': {}})
+
+        metrics.record('stage', 3.0)
+        metrics.merge(worker)
+        data = metrics.snapshot()
+        self.assertEqual(data['spans']['stage'], [2, 4.0, 3.0])
+        self.assertEqual(data['counters']['labels.drawn'], 2)
+
+    def test_write_report(self):
+        metrics.increment('image_cache.hits', 5)
+        metrics.record('pdf.save', 0.5)
+        with tempfile.TemporaryDirectory() as directory:
+            metrics.write_report({'metrics': {'directory': directory}})
+            with open(os.path.join(directory, 'run_report.json')) as f:
+                report = json.load(f)
+            with open(os.path.join(directory, 'label_maker.prom')) as f:
+                prometheus = f.read()
+
+        self.assertEqual(report['counters'], {'image_cache.hits': 5})
+        self.assertEqual(report['spans']['pdf.save']['count'], 1)
+        self.assertIn('label_maker_image_cache_hits 5\n', prometheus)
+        self.assertIn('label_maker_stage_seconds{stage="pdf.save"} 0.5\n', prometheus)
+
+
+if __name__ == '__main__':
+    unittest.main()
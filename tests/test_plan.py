@@ -0,0 +1,100 @@
+import dataclasses
+import unittest
+
+from python_label_maker import file_utils
+from python_label_maker import fonts
+from python_label_maker import formats
+from python_label_maker import plan
+from python_label_maker import text_layout
+
+
+class TestCompilePlan(unittest.TestCase):
+    def setUp(self):
+        self.config = file_utils.load_config()
+
+    def test_slots_cover_the_sheet_row_by_row(self):
+        label_plan = plan.compile_plan(self.config)
+        layout = self.config['layout']
+        self.assertEqual(label_plan.labels_per_page, layout['columns'] * layout['rows'])
+        (x0, y0), (x1, y1) = label_plan.slots[:2]
+        self.assertEqual(y0, y1)
+        self.assertAlmostEqual(x1 - x0, label_plan.label_width + plan.inches_to_points(layout['horizontal_spacing']))
+        self.assertLess(label_plan.slots[layout['columns']][1], y0)
+
+    def test_plan_is_frozen(self):
+        label_plan = plan.compile_plan(self.config)
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            label_plan.label_width = 1
+        self.assertFalse(hasattr(label_plan.description, '__dict__'))
+
+    def test_get_plan_compiles_once_per_config(self):
+        self.assertIs(plan.get_plan(self.config), plan.get_plan(dict(self.config)))
+        changed = dict(self.config, label=dict(self.config['label'], width=3))
+        self.assertIsNot(plan.get_plan(changed), plan.get_plan(self.config))
+
+
+class TestFormats(unittest.TestCase):
+    def setUp(self):
+        self.config = file_utils.load_config()
+
+    def test_ol125_matches_the_default_config(self):
+        format_config = formats.apply_format(self.config, 'ol125')
+        self.assertEqual(plan.compile_plan(format_config).slots, plan.compile_plan(self.config).slots)
+
+    def test_every_format_fits_its_page(self):
+        for name, label_format in formats.FORMATS.items():
+            with self.subTest(name):
+                label_plan = plan.compile_plan(formats.apply_format(self.config, name))
+                page_width, page_height = label_plan.page_size
+                self.assertEqual(label_plan.labels_per_page, label_format.columns * label_format.rows)
+                for x, y in label_plan.slots:
+                    self.assertGreaterEqual(x, 0)
+                    self.assertGreaterEqual(y, -0.01)
+                    self.assertLessEqual(x + label_plan.label_width, page_width + 0.01)
+                    self.assertLessEqual(y + label_plan.label_height, page_height + 0.01)
+
+    def test_barcode_stays_clear_of_the_logo(self):
+        for name in formats.FORMATS:
+            with self.subTest(name):
+                label_plan = plan.compile_plan(formats.apply_format(self.config, name))
+                barcode = label_plan.barcode
+                if not barcode.enabled:
+                    continue
+                self.assertGreaterEqual(barcode.width, plan.MIN_BARCODE_WIDTH)
+                self.assertGreaterEqual(barcode.x_offset, 0)
+                self.assertLessEqual(barcode.x_offset + barcode.width, label_plan.logo.x_offset)
+                self.assertLessEqual(barcode.y_offset + barcode.height, label_plan.label_height)
+
+        # A 2.625" label has no room between the product image and the logo
+        self.assertFalse(plan.compile_plan(formats.apply_format(self.config, 'AVERY5160')).barcode.enabled)
+        self.assertTrue(plan.compile_plan(formats.apply_format(self.config, 'OL125')).barcode.enabled)
+
+    def test_typical_description_fits_every_format(self):
+        fonts.register_fonts(self.config['fonts'], None)
+        text = "Recessed LED downlight with adjustable color temperature and dimming"
+        for name in formats.FORMATS:
+            with self.subTest(name):
+                description = plan.compile_plan(formats.apply_format(self.config, name)).description
+                size, lines = text_layout.fit_text(
+                    text, description.font, description.size, description.width, description.height,
+                    description.min_size, description.line_spacing,
+                )
+                self.assertLessEqual(len(lines) * (size + description.line_spacing), description.height)
+
+    def test_format_content_overrides_single_settings(self):
+        format_config = formats.apply_format(self.config, 'AVERY5160')
+        self.assertEqual(format_config['content']['product_code']['size'], 12)
+        self.assertEqual(format_config['content']['product_code']['font'], self.config['content']['product_code']['font'])
+        self.assertEqual(self.config['content']['product_code']['size'], 18)
+
+    def test_apply_format_leaves_config_untouched(self):
+        formats.apply_format(self.config, 'AVERY5160')
+        self.assertEqual(self.config['layout']['columns'], 2)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            formats.get_format('NOPE')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from PIL import Image
+
+from python_label_maker import file_utils
+from python_label_maker import metrics
+from python_label_maker.image_cache import ImageCache
+from python_label_maker.prefetch import prefetch_images
+
+from tests.test_image_cache import FakeResponse
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 20), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class ConcurrentSession:
+    """Serves fixed responses and blocks until ``parties`` requests are in flight at once."""
+
+    def __init__(self, responses, parties):
+        self.responses = responses
+        self.barrier = threading.Barrier(parties, timeout=5)
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None):
+        with self.lock:
+            self.calls.append(url)
+        self.barrier.wait()
+        return self.responses[url]
+
+
+class TestPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # Derivatives are written next to the cache directory, keep both in the temporary directory
+        self.directory = os.path.join(self.tmp.name, 'cache')
+        self.config = file_utils.load_config()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def prefetch(self, items, responses, parties):
+        session = ConcurrentSession(responses, parties)
+        cache = ImageCache(self.directory, session=session)
+        return prefetch_images(items, self.config, cache=cache, max_workers=4), session
+
+    def test_shared_urls_are_fetched_once_concurrently(self):
+        responses = {'http://x/a.png': FakeResponse(200, png_bytes('red')),
+                     'http://x/b.png': FakeResponse(200, png_bytes('blue'))}
+        items = [{'name': f"A-{i}", 'item_img': url} for i in range(3) for url in responses] + [{'name': 'A-9'}]
+
+        # Both downloads must be in flight together for the barrier to release them
+        images, session = self.prefetch(items, responses, parties=2)
+        self.assertEqual(sorted(session.calls), sorted(responses))
+        self.assertEqual(list(images), list(responses))
+        for path, width, height in images.values():
+            self.assertTrue(path.startswith(self.tmp.name))
+            self.assertEqual(width, 2 * height)
+
+    def test_failed_image_does_not_stop_the_batch(self):
+        responses = {'http://x/a.png': FakeResponse(200, png_bytes('red')),
+                     'http://x/missing.png': FakeResponse(404),
+                     'http://x/broken.png': FakeResponse(200, b'not an image')}
+        items = [{'name': f"A-{i}", 'item_img': url} for i, url in enumerate(responses)]
+
+        images, _ = self.prefetch(items, responses, parties=3)
+        self.assertIsNotNone(images['http://x/a.png'][0])
+        self.assertEqual(images['http://x/missing.png'], (None, 0, 0))
+        self.assertEqual(images['http://x/broken.png'], (None, 0, 0))
+        self.assertEqual(metrics.snapshot()['counters']['image.failed'], 2)
+
+    def test_items_without_images(self):
+        self.assertEqual(prefetch_images([{'name': 'A-1'}], self.config, cache=ImageCache(self.directory)), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+from python_label_maker import file_utils
+from python_label_maker import image_cache
+from python_label_maker import metrics
+from python_label_maker import render
+
+from tests.test_image_cache import FakeResponse, FakeSession
+from tests.test_prefetch import png_bytes
+
+
+def catalog(count):
+    return [
+        {'name': f"A-{i:02d}", 'description': f"Desk lamp {i}", 'manufacturer': 'WAC', 'netsuite_id': i}
+        for i in range(count)
+    ]
+
+
+def page_count(path):
+    with open(path, 'rb') as f:
+        return len(re.findall(rb'/Type /Page\b(?!s)', f.read()))
+
+
+class TestRender(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.config = file_utils.load_config()
+        self.directory = os.path.join(self.tmp.name, 'pdfs')
+        self.config['output'] = dict(
+            self.config['output'], directory=self.directory, filename=os.path.join(self.directory, 'labels.pdf')
+        )
+        # The items have no product images; the shared cache is kept out of the repository
+        patcher = mock.patch.object(image_cache, '_default_cache', image_cache.ImageCache(os.path.join(self.tmp.name, 'cache')))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        # 25 items on sheets of 10
+        self.items = catalog(25)
+
+    def render(self, workers):
+        metrics.reset()
+        results = render.render_sheets(self.config, self.items, workers=workers)
+        return results, metrics.snapshot()['counters']
+
+    def mtimes(self):
+        return {
+            name: os.stat(os.path.join(self.directory, name)).st_mtime_ns
+            for name in os.listdir(self.directory) if name.endswith('.pdf')
+        }
+
+    def test_renders_sheets_in_order(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                metrics.reset()
+                results = render.render_sheets(self.config, self.items, workers=workers, force=True)
+                self.assertEqual(results, [
+                    ('a-00_to_a-09.pdf', None), ('a-10_to_a-19.pdf', None), ('a-20_to_a-24.pdf', None),
+                ])
+                self.assertEqual(metrics.snapshot()['counters']['sheets.rendered'], 3)
+                self.assertEqual(page_count(os.path.join(self.directory, 'a-20_to_a-24.pdf')), 1)
+
+    def test_unchanged_sheets_are_skipped(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                self.render(workers)
+                before = self.mtimes()
+                results, counters = self.render(workers)
+                self.assertEqual(counters['sheets.skipped'], 3)
+                self.assertNotIn('sheets.rendered', counters)
+                self.assertEqual([error for _, error in results], [None] * 3)
+                self.assertEqual(self.mtimes(), before)
+
+    def test_changed_item_is_rendered_again(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                self.render(workers)
+                self.items[12] = dict(self.items[12], description=f"Floor lamp {workers}")
+                _, counters = self.render(workers)
+                self.assertEqual((counters['sheets.rendered'], counters['sheets.skipped']), (1, 2))
+
+    def image_cache(self, responses, **kwargs):
+        cache = image_cache.ImageCache(os.path.join(self.tmp.name, 'images', 'cache'), session=FakeSession(responses), **kwargs)
+        patcher = mock.patch.object(image_cache, '_default_cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return cache
+
+    def test_sheet_with_failed_image_is_rendered_again(self):
+        url = 'http://x/a.png'
+        cache = self.image_cache({url: FakeResponse(503)})
+        self.items[3] = dict(self.items[3], item_img=url)
+
+        _, counters = self.render(1)
+        self.assertEqual((counters['image.failed'], counters['sheets.rendered']), (1, 3))
+
+        # The image is reachable again, so its sheet is drawn with it this time
+        cache.session.responses[url] = FakeResponse(200, png_bytes('red'), {'ETag': '"1"'})
+        _, counters = self.render(1)
+        self.assertEqual((counters['sheets.rendered'], counters['sheets.skipped']), (1, 2))
+        self.assertNotIn('image.failed', counters)
+
+        _, counters = self.render(1)
+        self.assertEqual(counters['sheets.skipped'], 3)
+
+    def test_stale_image_is_revalidated(self):
+        url = 'http://x/a.png'
+        cache = self.image_cache({url: FakeResponse(200, png_bytes('red'), {'ETag': '"1"'})}, max_age=0)
+        self.items[3] = dict(self.items[3], item_img=url)
+        self.render(1)
+
+        # The image changed upstream after its cache entry expired
+        cache.session.responses[url] = FakeResponse(200, png_bytes('blue'), {'ETag': '"2"'})
+        _, counters = self.render(1)
+        self.assertEqual((counters['sheets.rendered'], counters['sheets.skipped']), (1, 2))
+        self.assertEqual(cache.session.calls[-1], (url, {'If-None-Match': '"1"'}))
+        self.assertEqual(cache.entry(url)['etag'], '"2"')
+
+    def test_document_holds_every_page(self):
+        filename = render.render_document(self.config, iter(self.items))
+        self.assertEqual(filename, self.config['output']['filename'])
+        self.assertEqual(page_count(filename), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if numpy is not None:
+    from scripts import replace_color
+
+
+@unittest.skipIf(numpy is None, "numpy is only installed with the scripts extra")
+class TestReplaceColor(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def image(self, name, pixels):
+        # One row of RGBA pixels
+        path = os.path.join(self.tmp.name, name)
+        img = Image.new('RGBA', (len(pixels), 1))
+        img.putdata(pixels)
+        img.save(path)
+        return path
+
+    def recolor(self, pixels, tolerance=0):
+        source = self.image('source.png', pixels)
+        output = os.path.join(self.tmp.name, 'output.png')
+        replaced = replace_color.replace_color(source, (255, 255, 255), (0, 0, 255), output, tolerance)
+        img = Image.open(output)
+        return replaced, [img.getpixel((x, 0)) for x in range(img.width)]
+
+    def test_replaces_exact_matches_only(self):
+        replaced, pixels = self.recolor([(255, 255, 255, 255), (250, 250, 250, 255), (0, 0, 0, 255)])
+        self.assertEqual(replaced, 1)
+        self.assertEqual(pixels, [(0, 0, 255, 255), (250, 250, 250, 255), (0, 0, 0, 255)])
+
+    def test_replaces_colors_within_tolerance(self):
+        # (250, 250, 250) is about 8.7 away from white, (240, 255, 255) is 15 away
+        replaced, pixels = self.recolor([(250, 250, 250, 255), (240, 255, 255, 255)], tolerance=10)
+        self.assertEqual(replaced, 1)
+        self.assertEqual(pixels, [(0, 0, 255, 255), (240, 255, 255, 255)])
+
+    def test_alpha_is_preserved(self):
+        replaced, pixels = self.recolor([(255, 255, 255, 0), (255, 255, 255, 128)])
+        self.assertEqual(replaced, 2)
+        self.assertEqual(pixels, [(0, 0, 255, 0), (0, 0, 255, 128)])
+
+    def test_directory_mode(self):
+        source_directory = os.path.join(self.tmp.name, 'source')
+        os.makedirs(source_directory)
+        for name in ('a.png', 'b.png'):
+            img = Image.new('RGBA', (2, 1), (255, 255, 255, 255))
+            img.save(os.path.join(source_directory, name))
+        with open(os.path.join(source_directory, 'notes.txt'), 'w') as f:
+            f.write('not an image')
+
+        output_directory = os.path.join(self.tmp.name, 'output')
+        results = replace_color.replace_color_in_directory(
+            source_directory, (255, 255, 255), (0, 0, 255), output_directory, workers=1
+        )
+        self.assertEqual(results, {os.path.join(output_directory, name): 2 for name in ('a.png', 'b.png')})
+        self.assertEqual(Image.open(os.path.join(output_directory, 'b.png')).getpixel((1, 0)), (0, 0, 255, 255))
+
+
+if __name__ == '__main__':
+    unittest.main()
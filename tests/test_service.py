@@ -0,0 +1,73 @@
+import json
+import threading
+import unittest
+from http.client import HTTPConnection
+
+from python_label_maker import db
+from python_label_maker import file_utils
+from python_label_maker import service
+
+from tests.db_case import TempDatabaseTestCase
+
+
+class TestLabelService(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        db.upsert_items([{'name': 'A-1', 'description': 'Desk lamp', 'manufacturer': 'WAC', 'netsuite_id': 11}])
+
+        self.service = service.LabelService(file_utils.load_config(), workers=2)
+        self.addCleanup(self.service.shutdown)
+        self.server = service.make_server(self.service, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def post(self, body):
+        connection = HTTPConnection(*self.server.server_address)
+        self.addCleanup(connection.close)
+        connection.request('POST', '/labels', body=json.dumps(body), headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, response.getheader('Content-Type'), response.read()
+
+    def test_renders_item_payloads(self):
+        status, content_type, body = self.post({'items': [{'name': 'B-2', 'description': 'Floor lamp'}]})
+        self.assertEqual((status, content_type), (200, 'application/pdf'))
+        self.assertTrue(body.startswith(b'%PDF'))
+
+    def test_renders_cached_items_by_id(self):
+        status, _, body = self.post({'ids': [11]})
+        self.assertEqual(status, 200)
+        self.assertTrue(body.startswith(b'%PDF'))
+
+        status, _, body = self.post({'ids': ['11']})
+        self.assertEqual(status, 200)
+
+        status, _, body = self.post({'ids': [99]})
+        self.assertEqual(status, 404)
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.post({})[0], 400)
+        self.assertEqual(self.post({'items': [{'name': 'A'}], 'format': 'NOPE'})[0], 400)
+        self.assertEqual(self.post({'ids': ['11a']})[0], 400)
+        self.assertEqual(self.post({'ids': [True]})[0], 400)
+        for items in ([{'name': 5}], [{'name': ''}], [{'name': 'A', 'description': 3}], [{'name': 'A', 'item_img': ['x']}], ['A'], {'name': 'A'}):
+            with self.subTest(items=items):
+                self.assertEqual(self.post({'items': items})[0], 400)
+        self.assertEqual(self.post({'items': [{'name': 'A'}], 'format': 5})[0], 400)
+
+    def test_format_names_are_case_insensitive(self):
+        status, _, body = self.post({'items': [{'name': 'A-1', 'description': 'Desk lamp'}], 'format': 'avery5163'})
+        self.assertEqual(status, 200)
+        self.assertTrue(body.startswith(b'%PDF'))
+
+    def test_rejects_negative_content_length(self):
+        connection = HTTPConnection(*self.server.server_address)
+        self.addCleanup(connection.close)
+        connection.putrequest('POST', '/labels')
+        connection.putheader('Content-Length', '-1')
+        connection.endheaders()
+        self.assertEqual(connection.getresponse().status, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
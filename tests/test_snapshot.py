@@ -0,0 +1,82 @@
+import os
+import pickle
+import unittest
+
+from python_label_maker import db
+from python_label_maker import snapshot
+
+from tests.db_case import TempDatabaseTestCase
+
+
+class TestSnapshot(TempDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        db.upsert_items([
+            {'name': f"ITEM {i:02d}", 'description': f"Lamp n°{i}", 'manufacturer': 'WAC' if i % 2 else 'LUMIEN LIGHTING',
+             'item_img': f"http://x/{i % 3}.png", 'netsuite_id': i if i % 4 else None}
+            for i in range(25)
+        ])
+        self.path = os.path.join(self.tmp.name, 'items.snap')
+
+    def test_rows_match_the_cache(self):
+        self.assertEqual(snapshot.write_snapshot(self.path, page_size=7), 25)
+        items = snapshot.Snapshot(self.path)
+        self.addCleanup(items.close)
+
+        self.assertEqual([dict(view) for view in items], list(db.iter_items()))
+        self.assertIsNone(items[0]['netsuite_id'])
+        self.assertIsNone(items[0].get('company_img'))
+        self.assertEqual(items[-1].get('missing', 'default'), 'default')
+        with self.assertRaises(KeyError):
+            items[0]['missing']
+
+    def test_strings_are_stored_and_decoded_once(self):
+        snapshot.write_snapshot(self.path)
+        items = snapshot.Snapshot(self.path)
+        self.addCleanup(items.close)
+
+        # 25 names, 25 descriptions, 2 manufacturers and 3 image URLs
+        self.assertEqual(len(items._strings), 55)
+        self.assertIs(items[1]['manufacturer'], items[3]['manufacturer'])
+
+    def test_filters_select_the_exported_items(self):
+        self.assertEqual(snapshot.write_snapshot(self.path, manufacturer='WAC', names=['ITEM 01', 'ITEM 02']), 1)
+        self.assertEqual(snapshot.write_snapshot(self.path, manufacturer='NONE'), 0)
+        items = snapshot.Snapshot(self.path)
+        self.addCleanup(items.close)
+        self.assertEqual(len(items), 0)
+
+    def test_views_pickle_by_reference(self):
+        snapshot.write_snapshot(self.path)
+        view = snapshot.open_snapshot(self.path)[5]
+        data = pickle.dumps(view)
+
+        self.assertLess(len(data), 200)
+        self.assertEqual(dict(pickle.loads(data)), dict(view))
+
+    def test_open_snapshot_reopens_a_rewritten_file(self):
+        snapshot.write_snapshot(self.path)
+        first = snapshot.open_snapshot(self.path)
+        self.assertIs(snapshot.open_snapshot(self.path), first)
+
+        stat = os.stat(self.path)
+        snapshot.write_snapshot(self.path, manufacturer='WAC')
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(len(snapshot.open_snapshot(self.path)), 12)
+
+    def test_views_of_a_rewritten_snapshot_are_rejected(self):
+        snapshot.write_snapshot(self.path)
+        data = pickle.dumps(snapshot.open_snapshot(self.path)[5])
+
+        # A worker that has not opened the snapshot yet unpickles the view after it was
+        # rewritten within the filesystem's timestamp resolution
+        stat = os.stat(self.path)
+        snapshot.write_snapshot(self.path, manufacturer='WAC')
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        snapshot._open_version.cache_clear()
+        with self.assertRaises(ValueError):
+            pickle.loads(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
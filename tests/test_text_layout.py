@@ -0,0 +1,45 @@
+import unittest
+
+from reportlab.pdfbase import pdfmetrics
+
+from python_label_maker import text_layout
+
+
+class TestWrapText(unittest.TestCase):
+    def test_lines_fit_width(self):
+        text = "Recessed LED downlight with adjustable color temperature and dimming"
+        lines = text_layout.wrap_text(text, 'Helvetica', 10, 100)
+        self.assertGreater(len(lines), 1)
+        self.assertEqual(' '.join(lines), text)
+        for line in lines:
+            self.assertLessEqual(pdfmetrics.stringWidth(line, 'Helvetica', 10), 100)
+
+    def test_breaks_long_words(self):
+        lines = text_layout.wrap_text("X" * 50, 'Helvetica', 10, 40)
+        self.assertEqual(''.join(lines), "X" * 50)
+        for line in lines:
+            self.assertLessEqual(pdfmetrics.stringWidth(line, 'Helvetica', 10), 40)
+
+    def test_is_memoized(self):
+        first = text_layout.wrap_text("same text", 'Helvetica', 10, 100)
+        self.assertIs(text_layout.wrap_text("same text", 'Helvetica', 10, 100), first)
+
+
+class TestFitText(unittest.TestCase):
+    def test_keeps_size_when_text_fits(self):
+        size, lines = text_layout.fit_text("Short", 'Helvetica', 10, 100, 50, min_size=6)
+        self.assertEqual((size, lines), (10, ("Short",)))
+
+    def test_shrinks_to_fit_height(self):
+        text = "word " * 40
+        size, lines = text_layout.fit_text(text, 'Helvetica', 10, 100, 60, min_size=4, line_spacing=2)
+        self.assertLess(size, 10)
+        self.assertLessEqual(len(lines) * (size + 2), 60)
+
+    def test_stops_at_min_size(self):
+        size, _ = text_layout.fit_text("word " * 200, 'Helvetica', 10, 100, 20, min_size=6)
+        self.assertEqual(size, 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import io
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from python_label_maker import file_utils
+from python_label_maker import formats
+from python_label_maker import zpl
+
+
+def png_bytes(size=(40, 20), color=(0, 0, 0)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def png_file(directory, name, size=(40, 20), color=(0, 0, 0)):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(png_bytes(size, color))
+    return path
+
+
+class FakeCache:
+    """Serves one image file for every URL, or nothing when ``path`` is None."""
+
+    def __init__(self, path):
+        self.file = path
+        self.calls = 0
+
+    def get(self, url):
+        self.calls += 1
+        if self.file is None:
+            return None
+        with open(self.file, 'rb') as f:
+            return f.read()
+
+    def path(self, url):
+        return self.file
+
+
+class TestGraphicField(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def graphic_field(self, size, width, height):
+        path = png_file(self.tmp.name, f"{size[0]}x{size[1]}.png", size)
+        return zpl.graphic_field(path, os.path.getmtime(path), width, height)
+
+    def test_black_pixels_are_set_bits_and_padding_is_white(self):
+        name, total, row, data, width, height = self.graphic_field((10, 2), 100, 100)
+        self.assertEqual((width, height, row, total), (10, 2, 2, 4))
+        self.assertEqual(data, 'FFC0FFC0')
+        self.assertEqual(len(name), 8)
+
+    def test_image_is_shrunk_into_the_box(self):
+        _, _, _, _, width, height = self.graphic_field((400, 200), 100, 100)
+        self.assertEqual((width, height), (100, 50))
+
+
+class TestZplJob(unittest.TestCase):
+    def setUp(self):
+        self.config = formats.apply_format(file_utils.load_config(), 'ZEBRA_4X2')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # No logos, so only the product images are graphics
+        self.config['content']['logo'] = dict(self.config['content']['logo'], directory=self.tmp.name)
+
+    def image_name(self, job, path):
+        return zpl.graphic_field(
+            path, os.path.getmtime(path), job.dots(job.plan.image.max_width), job.dots(job.plan.image.max_height)
+        )[0]
+
+    def test_escape(self):
+        self.assertEqual(zpl.escape('A^B~C_D'), 'A_5EB_7EC_5FD')
+
+    def test_single_use_image_is_sent_inline(self):
+        out = io.StringIO()
+        job = zpl.ZplJob(self.config, out, FakeCache(png_file(self.tmp.name, 'a.png')))
+        job.write_label({'name': 'A-1', 'item_img': 'http://x/a.png'})
+        job.finish()
+        text = out.getvalue()
+
+        self.assertIn('^GFA,', text)
+        self.assertNotIn('~DG', text)
+        self.assertNotIn('^ID', text)
+
+    def test_shared_image_is_downloaded_once(self):
+        out = io.StringIO()
+        cache = FakeCache(png_file(self.tmp.name, 'a.png'))
+        job = zpl.ZplJob(self.config, out, cache)
+        for name in ('A-1', 'A-2', 'A-3'):
+            job.write_label({'name': name, 'description': 'Desk lamp', 'item_img': 'http://x/a.png', 'manufacturer': 'LUMIEN'})
+        job.finish()
+        text = out.getvalue()
+
+        self.assertEqual(cache.calls, 1)
+        self.assertEqual(text.count('^XA^CI28'), 3)
+        self.assertEqual(text.count('^PW812^LL406'), 3)
+        image_name = self.image_name(job, cache.file)
+        self.assertEqual(text.count('^GFA,'), 1)
+        self.assertEqual(text.count(f'~DGR:{image_name}.GRF'), 1)
+        self.assertEqual(text.count(f'^XGR:{image_name}.GRF'), 2)
+        self.assertEqual(text.count(f'^IDR:{image_name}.GRF'), 1)
+
+    def test_stored_graphics_are_deleted_over_budget(self):
+        paths = [png_file(self.tmp.name, f"{n}.png", (40 + n, 20)) for n in range(2)]
+        self.config['zpl']['graphic_memory_kilobytes'] = 0
+        out = io.StringIO()
+        job = zpl.ZplJob(self.config, out, FakeCache(None))
+        for path in paths * 2 + paths[:1]:
+            job.images[path] = path
+            job.write_label({'name': 'A-1', 'item_img': path})
+        job.finish()
+        text = out.getvalue()
+
+        first, second = (self.image_name(job, path) for path in paths)
+        # The first graphic is stored on its second use and deleted before the next label
+        self.assertEqual(text.count(f'~DGR:{first}.GRF'), 2)
+        self.assertEqual(text.count(f'^IDR:{first}.GRF'), 2)
+        self.assertLess(text.index(f'^IDR:{first}.GRF'), text.index(f'~DGR:{second}.GRF'))
+        self.assertEqual(job.stored_bytes, 0)
+
+    def test_replaced_logo_is_encoded_again(self):
+        logo = png_file(self.tmp.name, 'lumien.png', (40, 20))
+        out = io.StringIO()
+        job = zpl.ZplJob(self.config, out, FakeCache(None))
+        job.write_label({'name': 'A-1', 'manufacturer': 'LUMIEN'})
+        png_file(self.tmp.name, 'lumien.png', (40, 20), color=(255, 255, 255))
+        os.utime(logo, (0, 0))
+        job.write_label({'name': 'A-2', 'manufacturer': 'LUMIEN'})
+        inline = [line for line in out.getvalue().splitlines() if '^GFA,' in line]
+        self.assertEqual(len(inline), 2)
+        self.assertNotEqual(inline[0].split('^GFA,')[1], inline[1].split('^GFA,')[1])
+
+
+if __name__ == '__main__':
+    unittest.main()